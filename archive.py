@@ -0,0 +1,79 @@
+"""Columnar Parquet archive of candles.
+
+Research jobs read history from here instead of the live SQLite database.
+Files are partitioned per pair, timeframe and calendar month (UTC)::
+
+    <root>/pair=BTC-USDC/timeframe=15m/month=2024-01.parquet
+
+so :func:`load_candles` opens only the months overlapping the requested
+range and reads only the requested columns. Parquet support comes from
+``pyarrow``.
+"""
+
+from __future__ import annotations
+
+import pathlib
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
+
+
+def pair_dir(root: str, pair: str, timeframe: str) -> pathlib.Path:
+    return pathlib.Path(root) / f"pair={pair.replace('/', '-')}" / f"timeframe={timeframe}"
+
+
+def month_of(ts: pd.Series) -> pd.Series:
+    return pd.to_datetime(ts, unit="ms", utc=True).dt.strftime("%Y-%m")
+
+
+def export_candles(df: pd.DataFrame, root: str, pair: str, timeframe: str) -> List[pathlib.Path]:
+    """Write ``df`` into monthly partitions, merging with any existing files."""
+    directory = pair_dir(root, pair, timeframe)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+    for month, part in df[COLUMNS].groupby(month_of(df["ts"]), sort=True):
+        path = directory / f"month={month}.parquet"
+        if path.exists():
+            part = pd.concat([pd.read_parquet(path), part])
+            part = part.drop_duplicates("ts", keep="last")
+        part = part.sort_values("ts").reset_index(drop=True)
+        part.to_parquet(path, index=False)
+        written.append(path)
+    return written
+
+
+def load_candles(
+    root: str,
+    pair: str,
+    timeframe: str,
+    columns: Optional[Sequence[str]] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> pd.DataFrame:
+    """Load candles with ``start <= ts < end`` (millisecond timestamps).
+
+    Only the monthly files overlapping the range are opened, and only
+    ``columns`` (all by default) are read from them.
+    """
+    columns = list(columns or COLUMNS)
+    read = columns if "ts" in columns else ["ts"] + columns
+    first = month_of(pd.Series([start])).iloc[0] if start is not None else None
+    last = month_of(pd.Series([end - 1])).iloc[0] if end is not None else None
+    filters = []
+    if start is not None:
+        filters.append(("ts", ">=", start))
+    if end is not None:
+        filters.append(("ts", "<", end))
+
+    frames = []
+    for path in sorted(pair_dir(root, pair, timeframe).glob("month=*.parquet")):
+        month = path.stem.split("=", 1)[1]
+        if (first and month < first) or (last and month > last):
+            continue
+        frames.append(pd.read_parquet(path, columns=read, filters=filters or None))
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype="int64" if c == "ts" else "float64") for c in columns})
+    df = pd.concat(frames, ignore_index=True)
+    return df[columns]
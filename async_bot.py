@@ -0,0 +1,211 @@
+"""Asyncio variant of the run loop.
+
+Uses ccxt's async client so that the candle request and, in live mode, the
+balance request of a tick are in flight at the same time: tick wall time is
+bounded by the slowest request rather than their sum. Everything after the
+network calls (validation, storage, strategy) is shared with :mod:`bot`.
+
+Usage::
+
+    $ python bot.py --async --paper
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import asdict, replace
+from typing import Optional
+
+import ccxt.async_support as ccxt_async
+
+import bot
+from bot import (
+    BACKFILL_BATCH_PAGES,
+    BACKFILL_PAGE_BARS,
+    BACKFILL_WORKERS,
+    BARS_LOOKBACK,
+    CANDLE_POLICY,
+    DB_FILE,
+    DEFAULT_PARAMS,
+    WINDOW_BARS,
+    BalanceService,
+    Database,
+    StrategyParams,
+    Tick,
+)
+from fills import FillModel
+from indicators import IndicatorCache, RunningATR
+from scheduler import SETTLE_SECONDS, CandleScheduler
+
+
+def make_exchange(rate_limit: bool = True) -> ccxt_async.Exchange:
+    """The async client; pass ``rate_limit=False`` when a :mod:`request_scheduler` paces it."""
+    return ccxt_async.coinbase({
+        "apiKey": bot.API_KEY,
+        "secret": bot.API_SECRET,
+        "password": bot.API_PASSPHRASE,
+        "enableRateLimit": rate_limit,
+    })
+
+
+async def backfill_async(
+    exchange,
+    db: Database,
+    since: int,
+    until: Optional[int] = None,
+    page_bars: int = BACKFILL_PAGE_BARS,
+    concurrency: int = BACKFILL_WORKERS,
+    batch_pages: int = BACKFILL_BATCH_PAGES,
+    policy: str = "drop",
+) -> dict:
+    """:func:`bot.backfill` through the async ``exchange``.
+
+    Up to ``concurrency`` pages are requested at once, paced by the client
+    itself (ccxt's throttle, or a :class:`request_scheduler.ScheduledExchange`).
+    Pages are stored on the event loop once all have arrived, so the
+    database connection never leaves the loop's thread.
+    """
+    timeframe_ms = db.timeframe_ms
+    until = until or exchange.milliseconds() // timeframe_ms * timeframe_ms
+    page_ms = page_bars * timeframe_ms
+    starts = list(range(since, until, page_ms))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_page(start: int) -> list:
+        async with semaphore:
+            bars = await exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=start, limit=page_bars)
+        end = min(start + page_ms, until)
+        return [b for b in bars if start <= b[0] < end]
+
+    started = time.perf_counter()
+    pages = await asyncio.gather(*(fetch_page(start) for start in starts))
+    total, refetch = bot.store_pages(db, pages, batch_pages, policy)
+    for start, end in refetch:
+        try:
+            bars = await exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=start, limit=(end - start) // timeframe_ms)
+        except Exception as exc:
+            logging.error("error refetching candles %s-%s: %s", start, end, exc)
+            continue
+        bot.store_refetched(db, bars, start, end)
+    db.load_window()
+    return bot.backfill_stats(total, len(starts), started)
+
+
+async def run_tick(
+    exchange,
+    db: Database,
+    is_live: bool,
+    risk_pct: float,
+    prev_state: Optional[str] = None,
+    policy: str = CANDLE_POLICY,
+    until: Optional[int] = None,
+    balances: Optional[BalanceService] = None,
+    atr_engine: Optional[RunningATR] = None,
+    indicators: Optional[IndicatorCache] = None,
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
+    fetch_balance: bool = True,
+) -> Optional[Tick]:
+    """Fetch candles and balance concurrently, then evaluate one tick.
+
+    With ``until`` (a candle close), returns ``None`` without evaluating when
+    the bar closing then has not been served yet. Pass ``fetch_balance=False``
+    when ``balances`` was refreshed for this tick already.
+    """
+    last_ts = db.max_ts()
+    if last_ts and exchange.milliseconds() - last_ts > BARS_LOOKBACK * db.timeframe_ms:
+        await backfill_async(exchange, db, last_ts + db.timeframe_ms, until, policy=bot.backfill_policy(policy))
+        last_ts = db.max_ts()
+    since = last_ts + db.timeframe_ms if last_ts else None
+    balances = balances or BalanceService(fetch_async=exchange.fetch_balance)
+    requests = [exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=since, limit=BARS_LOOKBACK)]
+    if is_live and fetch_balance:
+        requests.append(exchange.fetch_balance())
+    results = await asyncio.gather(*requests)
+    bars = results[0]
+    if len(results) > 1:
+        balances.set(results[1])
+    # the writes of the tick are one short transaction, after every await
+    with db.transaction():
+        df = bot.ingest_candles(db, bars, last_ts, policy, until)
+        if until is not None and db.max_ts() < until - db.timeframe_ms:
+            return None
+        return bot.evaluate_tick(db, df, is_live, risk_pct, prev_state, balances, atr_engine, indicators, params, fills)
+
+
+async def run_bot_async(
+    is_live: bool = False,
+    risk_pct: float = 0.01,
+    window_bars: int = WINDOW_BARS,
+    wal: bool = False,
+    candle_policy: str = CANDLE_POLICY,
+    mmap_dir: Optional[str] = None,
+    settle: float = SETTLE_SECONDS,
+    atr_method: str = "simple",
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
+    exchange=None,
+) -> None:
+    exchange = exchange or make_exchange()
+    db = Database(DB_FILE, window_bars, wal=wal, mmap_dir=mmap_dir)
+    params = replace(params, risk_pct=risk_pct)
+    logging.info("starting async bot: live=%s %s", is_live, params)
+    try:
+        # never the blocking client: an order's effect shows from the next tick's fetch
+        balances = BalanceService(fetch_async=exchange.fetch_balance)
+        atr_engine = RunningATR(params.lookback, method=atr_method)
+        indicators = IndicatorCache()
+        if is_live:
+            await balances.refresh()
+        peak_equity = bot.get_equity(is_live, 0, balances, db.pair)
+        prev_state: Optional[str] = None
+        scheduler = CandleScheduler(db.timeframe_ms, settle)
+        sent = scheduler.clock()
+        try:
+            server = await exchange.fetch_time()
+        except Exception as exc:
+            logging.warning("could not read exchange time, using local clock: %s", exc)
+        else:
+            scheduler.set_offset(server, sent, scheduler.clock())
+        close_ts = scheduler.last_close()
+        failures = 0
+        while True:
+            try:
+                deadline = time.monotonic() + scheduler.poll_timeout
+                # the balance comes with the tick's first candle request only
+                fetch_balance = True
+                while True:
+                    tick = await run_tick(
+                        exchange, db, is_live, risk_pct, prev_state, candle_policy, close_ts, balances, atr_engine, indicators, params, fills,
+                        fetch_balance,
+                    )
+                    if tick or time.monotonic() + scheduler.poll_interval > deadline:
+                        break
+                    fetch_balance = False
+                    await asyncio.sleep(scheduler.poll_interval)
+                if tick:
+                    tick.latency_ms = scheduler.latency_ms(close_ts)
+                    prev_state = tick.state
+                    peak_equity = max(peak_equity, tick.equity)
+                    drawdown = (peak_equity - tick.equity) / peak_equity
+                    if params.max_drawdown is not None and drawdown >= params.max_drawdown and is_live:
+                        logging.warning("drawdown exceeded %.0f%% - disabling live trading", params.max_drawdown * 100)
+                        is_live = False
+                    logging.info("decision latency %d ms after candle close", tick.latency_ms)
+                    print(json.dumps(asdict(tick)))
+                else:
+                    logging.warning("candle closing at %s not available, skipping tick", close_ts)
+                failures = 0
+                close_ts = scheduler.next_close()
+                await asyncio.sleep(scheduler.delay_until(close_ts))
+            except Exception as exc:
+                failures += 1
+                delay = scheduler.retry_delay(failures)
+                logging.error("error in main loop: %s (retrying in %.0fs)", exc, delay)
+                await asyncio.sleep(delay)
+                close_ts = scheduler.last_close()
+    finally:
+        await exchange.close()
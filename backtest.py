@@ -0,0 +1,600 @@
+"""Event-driven offline backtester.
+
+Streams stored candles bar by bar through the live strategy rules, with no
+exchange access and no sleeping, and reports the trades, equity curve and
+drawdown. Regimes come from :class:`indicators.StreamingClassifier` (tested
+to match :func:`bot.label_state` bar for bar) and every trading decision
+goes through the same :func:`bot.trail_order`, :func:`bot.exit_signal` and
+:func:`bot.entry_signal` that :func:`bot.trade_logic` uses. Orders are sized
+from the simulated USDC balance as the live bot sizes them from the
+exchange's, and the resulting orders are written to an in-memory
+:class:`bot.Database` so they can be inspected like the live ``orders`` table.
+
+:func:`vectorised_backtest` simulates the same rules over whole-history
+arrays instead, jumping from one trade to the next, for sweeps over many
+configurations; :class:`Backtester` stays the reference it is tested against.
+Both fill at the close for free unless given a :class:`fills.FillModel`.
+
+Usage::
+
+    $ python backtest.py                              # candles in bot_log.db
+    $ python backtest.py --archive archive/ --since 2023-01-01 --risk 0.005
+    $ python backtest.py --vectorised
+    $ python backtest.py --archive archive/ --fills coinbase.json --intrabar 1m
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+import archive
+from bot import (
+    DB_FILE,
+    DEFAULT_PARAMS,
+    PAIR,
+    TIMEFRAME,
+    Database,
+    Order,
+    StrategyParams,
+    entry_signal,
+    exchange,
+    exit_signal,
+    order_pnl,
+    parse_date,
+    position_size,
+    trail_order,
+)
+from fills import FillModel, intrabar_path
+from indicators import RunningATR, StreamingClassifier, atr_series, rolling_max, rolling_min, state_codes
+from result_cache import CACHE_DIR, ResultCache, candle_digest
+
+CAPITAL = 1000.0
+
+
+@dataclass
+class Trade:
+    entry_ts: int
+    exit_ts: int
+    side: str
+    entry_price: float
+    exit_price: float
+    amount: float
+    stop: float
+    target: float
+    pnl: float
+
+
+@dataclass
+class BacktestResult:
+    trades: List[Trade]
+    ts: np.ndarray
+    equity: np.ndarray
+    seconds: float = 0.0
+    halted_at: Optional[int] = None
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        """Fractional drawdown from the running equity peak at every bar."""
+        if not len(self.equity):
+            return self.equity
+        peak = np.maximum.accumulate(self.equity)
+        return (peak - self.equity) / peak
+
+    @property
+    def max_drawdown(self) -> float:
+        return float(self.drawdown.max()) if len(self.equity) else 0.0
+
+    @property
+    def total_pnl(self) -> float:
+        return float(sum(t.pnl for t in self.trades))
+
+    def summary(self) -> dict:
+        wins = sum(1 for t in self.trades if t.pnl > 0)
+        return {
+            "bars": len(self.ts),
+            "trades": len(self.trades),
+            "win_rate": round(wins / len(self.trades), 4) if self.trades else 0.0,
+            "pnl": round(self.total_pnl, 6),
+            "final_equity": round(float(self.equity[-1]), 6) if len(self.equity) else None,
+            "max_drawdown": round(self.max_drawdown, 6),
+            "halted_at": self.halted_at,
+            "seconds": round(self.seconds, 3),
+            "bars_per_sec": round(len(self.ts) / self.seconds) if self.seconds else None,
+        }
+
+
+@dataclass
+class Backtester:
+    """Bar-by-bar simulation of the live strategy.
+
+    :meth:`run` may be called again with a longer history; only bars after
+    the last one processed are simulated, so results extend incrementally.
+    Once drawdown from the equity peak reaches ``params.max_drawdown`` no new
+    positions are opened, mirroring the live bot switching itself off.
+    Without ``fills`` every order fills at the close for free, as in paper
+    mode; with a :class:`fills.FillModel` they pay its fees and slippage.
+    """
+
+    params: StrategyParams = DEFAULT_PARAMS
+    capital: float = CAPITAL
+    atr_method: str = "simple"
+    fills: Optional[FillModel] = None
+    db: Optional[Database] = None
+    cash: float = field(init=False)
+    trades: List[Trade] = field(init=False, default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.cash = self.capital
+        self.classifier = StreamingClassifier(self.params.lookback, self.params.atr_factor)
+        self.atr = RunningATR(self.params.lookback, method=self.atr_method)
+        self.order: Optional[Order] = None
+        self.prev_state: Optional[str] = None
+        self.peak = self.capital
+        self.halted_at: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.seconds = 0.0
+        self._ts: List[np.ndarray] = []
+        self._equity: List[np.ndarray] = []
+
+    def run(self, candles, path: Optional[np.ndarray] = None) -> BacktestResult:
+        """Simulate the bars after the last one seen.
+
+        ``path`` is the optional :func:`fills.intrabar_path` of every candle.
+        """
+        started = time.perf_counter()
+        ts_all = np.asarray(candles["ts"], dtype=np.int64)
+        start = 0 if self.last_ts is None else int(np.searchsorted(ts_all, self.last_ts, side="right"))
+        ts = ts_all[start:]
+        high = np.asarray(candles["high"], dtype=np.float64)[start:].tolist()
+        low = np.asarray(candles["low"], dtype=np.float64)[start:].tolist()
+        close = np.asarray(candles["close"], dtype=np.float64)[start:].tolist()
+        fills = self.fills
+        if fills is not None:
+            open_ = np.asarray(candles["open"], dtype=np.float64)[start:].tolist()
+            volume = np.asarray(candles["volume"], dtype=np.float64)[start:].tolist()
+            hints = [0] * len(ts) if path is None else np.asarray(path)[start:].tolist()
+        equity = np.empty(len(ts))
+        first_trade = len(self.trades)
+
+        params = self.params
+        max_drawdown = params.max_drawdown
+        classify = self.classifier.update
+        update_atr = self.atr.update
+        clf = self.classifier
+        order = self.order
+        prev_state = self.prev_state
+        cash = self.cash
+        peak = self.peak
+        halted = self.halted_at is not None
+        for i, t in enumerate(ts.tolist()):
+            h, l, c = high[i], low[i], close[i]
+            state = classify(h, l, c)
+            atr = update_atr(h, l, c)
+            if order is not None:
+                if exit_signal(order, state, prev_state, h, l):
+                    if fills is None:
+                        price, pnl = c, order_pnl(order, c)
+                    else:
+                        bar = (open_[i], h, l, c, volume[i])
+                        s = 1 if order.side == "buy" else -1
+                        price, pnl = fills.close(s, bar, order.stop, order.target, order.price, order.amount, hints[i])
+                    cash += pnl
+                    self.trades.append(Trade(order.ts, t, order.side, order.price, price, order.amount, order.stop, order.target, pnl))
+                    order = None
+                else:
+                    order = trail_order(order, state, c, atr, params)
+            if order is None and not halted and state != "chaos":
+                signal = entry_signal(state, c, clf.high20, clf.low20, atr, params)
+                if signal is not None:
+                    side, stop, target = signal
+                    amount = position_size(cash, c, params.risk_pct)
+                    price = c if fills is None else fills.market(c, 1 if side == "buy" else -1, amount, volume[i])
+                    order = Order(None, t, side, price, amount, stop, target, "open")
+            value = cash + order_pnl(order, c) if order is not None else cash
+            equity[i] = value
+            if value > peak:
+                peak = value
+            if max_drawdown is not None and not halted and (peak - value) / peak >= max_drawdown:
+                halted = True
+                self.halted_at = t
+            prev_state = state
+
+        self.order, self.prev_state, self.cash, self.peak = order, prev_state, cash, peak
+        if len(ts):
+            self.last_ts = int(ts[-1])
+        self._ts.append(ts)
+        self._equity.append(equity)
+        self._store(self.trades[first_trade:])
+        self.seconds += time.perf_counter() - started
+        return self.result()
+
+    def __getstate__(self) -> dict:
+        # the in-memory orders table is rebuilt from ``trades`` on unpickling
+        return {**self.__dict__, "db": None}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._store(self.trades)
+
+    def _store(self, trades: List[Trade]) -> None:
+        if self.db is None:
+            self.db = Database(":memory:", window_bars=1)
+        with self.db.transaction():
+            for t in trades:
+                self.db.record_order(Order(None, t.exit_ts, t.side, t.entry_price, t.amount, t.stop, t.target, "closed"))
+
+    def result(self) -> BacktestResult:
+        ts = np.concatenate(self._ts) if self._ts else np.empty(0, dtype=np.int64)
+        equity = np.concatenate(self._equity) if self._equity else np.empty(0)
+        return BacktestResult(list(self.trades), ts, equity, self.seconds, self.halted_at)
+
+
+@dataclass
+class Features:
+    """Per-bar arrays the vectorised backtest runs on.
+
+    ``codes`` index :data:`indicators.STATES`; ``high20``/``low20`` are the
+    extremes of the ``lookback`` bars before each bar, as entries use them.
+    ``path`` is the :func:`fills.intrabar_path` of each bar, zero if unknown.
+    Build once per history and regime setting and reuse across runs.
+    """
+
+    ts: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    codes: np.ndarray
+    atr: np.ndarray
+    high20: np.ndarray
+    low20: np.ndarray
+    path: np.ndarray
+
+    @classmethod
+    def from_candles(
+        cls,
+        candles,
+        params: StrategyParams = DEFAULT_PARAMS,
+        atr_method: str = "simple",
+        path: Optional[np.ndarray] = None,
+    ) -> "Features":
+        """Arrays for ``params``; only its ``lookback`` and ``atr_factor`` matter."""
+        lookback = params.lookback
+        high = np.asarray(candles["high"], dtype=np.float64)
+        low = np.asarray(candles["low"], dtype=np.float64)
+        close = np.asarray(candles["close"], dtype=np.float64)
+        return cls(
+            np.asarray(candles["ts"], dtype=np.int64),
+            np.asarray(candles["open"], dtype=np.float64),
+            high,
+            low,
+            close,
+            np.asarray(candles["volume"], dtype=np.float64),
+            state_codes(high, low, close, lookback, params.atr_factor),
+            atr_series(high, low, close, lookback, atr_method),
+            np.concatenate(([np.nan], rolling_max(high, lookback)[:-1])),
+            np.concatenate(([np.nan], rolling_min(low, lookback)[:-1])),
+            np.zeros(len(close), dtype=np.int8) if path is None else np.asarray(path, dtype=np.int8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def window(self, start: int, stop: int) -> "Features":
+        """Bars ``start:stop`` as views, with regimes and ATR still warmed up on earlier history."""
+        return Features(*(getattr(self, f.name)[start:stop] for f in fields(self)))
+
+
+def entry_signals(f: Features, params: StrategyParams = DEFAULT_PARAMS) -> tuple:
+    """Vectorised :func:`bot.entry_signal`: ``(side, stop, target)`` per bar.
+
+    ``side`` is +1 for a buy, -1 for a sell and 0 where there is no entry.
+    """
+    range_mid = (f.high20 + f.low20) / 2
+    range_size = f.high20 - f.low20
+    stop_dist = params.stop_atr * f.atr
+    target_dist = params.target_atr * f.atr
+    consolidation = f.codes == 1
+    buy_range = consolidation & (f.close <= f.low20 + params.entry_band * range_size)
+    sell_range = consolidation & ~buy_range & (f.close >= f.high20 - params.entry_band * range_size)
+    buy_breakout = (f.codes == 2) & (f.close > f.high20)
+    sell_breakout = (f.codes == 3) & (f.close < f.low20)
+
+    side = np.zeros(len(f), dtype=np.int8)
+    side[buy_range | buy_breakout] = 1
+    side[sell_range | sell_breakout] = -1
+    stop = np.select(
+        [buy_range, sell_range, buy_breakout, sell_breakout],
+        [f.low20 - stop_dist, f.high20 + stop_dist, f.high20 - stop_dist, f.low20 + stop_dist],
+        np.nan,
+    )
+    target = np.select(
+        [buy_range | sell_range, buy_breakout, sell_breakout],
+        [range_mid, f.close + target_dist, f.close - target_dist],
+        np.nan,
+    )
+    return side, stop, target
+
+
+def vectorised_backtest(
+    f: Features,
+    params: StrategyParams = DEFAULT_PARAMS,
+    capital: float = CAPITAL,
+    fills: Optional[FillModel] = None,
+) -> BacktestResult:
+    """Whole-history equivalent of :meth:`Backtester.run`.
+
+    Any change of regime closes a position, so a trade lives inside one run
+    of constant state. For each trade taken, the exit is the first bar of the
+    rest of that run where the stop or the target in force at its open is
+    hit, or the run's end; the next trade is the first entry signal from the
+    exit bar on. ``f`` must have been built for the same ``lookback`` and
+    ``atr_factor`` as ``params``. The drawdown halt is applied afterwards by dropping trades
+    opened after the first bar that breaches it, which cannot change
+    anything before that bar. Sizing, fill prices and profits follow in
+    one pass over the trades, as the balance compounds.
+    """
+    started = time.perf_counter()
+    n = len(f)
+    close, high, low, atr = f.close, f.high, f.low, f.atr
+    side, stop, target = entry_signals(f, params)
+    candidates = np.flatnonzero(side)
+
+    # first bar of the next regime run, or n if the run lasts to the end
+    changes = np.flatnonzero(f.codes[1:] != f.codes[:-1]) + 1
+    run_end = np.append(changes, n)[np.searchsorted(changes, np.arange(n), side="right")]
+
+    trending = f.codes >= 2
+    stop_dist = params.stop_atr * atr
+    target_dist = params.target_atr * atr
+    trail = {1: np.where(trending, close - stop_dist, -np.inf), -1: np.where(trending, close + stop_dist, np.inf)}
+    trend_target = {1: close + target_dist, -1: close - target_dist}
+
+    spans = []  # (entry, exit or n, side, stop, target)
+    k = 0
+    while k < len(candidates):
+        i = int(candidates[k])
+        s = int(side[i])
+        end = int(run_end[i])
+        last = min(end, n - 1)
+        seg = slice(i + 1, last + 1)
+        # the levels a bar is tested against were trailed on the closes before it
+        targets = trend_target[s][i:last] if trending[i] else np.full(last - i, target[i])
+        if s > 0:
+            stops = np.append(stop[i], np.maximum.accumulate(np.maximum(stop[i], trail[1][seg])))[:-1]
+            hit = (low[seg] <= stops) | (high[seg] >= targets)
+        else:
+            stops = np.append(stop[i], np.minimum.accumulate(np.minimum(stop[i], trail[-1][seg])))[:-1]
+            hit = (high[seg] >= stops) | (low[seg] <= targets)
+        if end < n:
+            hit[-1] = True
+        hits = np.flatnonzero(hit)
+        if not len(hits):
+            spans.append((i, n, s, None, None))
+            break
+        e = i + 1 + int(hits[0])
+        spans.append((i, e, s, float(stops[e - i - 1]), float(targets[e - i - 1])))
+        k = int(np.searchsorted(candidates, e))
+
+    positions = _size_positions(f, spans, params.risk_pct, capital, fills)
+    equity = _equity_curve(close, positions, capital)
+    halted_at = None
+    max_drawdown = params.max_drawdown
+    if max_drawdown is not None and n:
+        peak = np.maximum.accumulate(np.maximum(equity, capital))
+        breach = np.flatnonzero((peak - equity) / peak >= max_drawdown)
+        if len(breach):
+            halt = int(breach[0])
+            halted_at = int(f.ts[halt])
+            if positions and positions[-1][0] > halt:
+                positions = [p for p in positions if p[0] <= halt]
+                equity = _equity_curve(close, positions, capital)
+
+    trades = [
+        Trade(int(f.ts[i]), int(f.ts[e]), "buy" if s > 0 else "sell", entry, exit_, amount, stop_, target_, pnl)
+        for i, e, s, amount, entry, exit_, pnl, stop_, target_ in positions
+        if e < n
+    ]
+    return BacktestResult(trades, f.ts, equity, time.perf_counter() - started, halted_at)
+
+
+def _size_positions(f: Features, spans: list, risk_pct: float, capital: float, fills: Optional[FillModel]) -> list:
+    """Amount, fill prices and pnl of each span, compounding the balance in order.
+
+    Exit kinds and reference prices come from ``fills`` for all spans at
+    once; what is left per trade is the size and its slippage.
+    """
+    n = len(f)
+    entries = [sp[0] for sp in spans]
+    exits = [min(sp[1], n - 1) for sp in spans]
+    entry_close = f.close[entries].tolist()
+    exit_close = f.close[exits].tolist()
+    if fills is not None:
+        sides = np.array([sp[2] for sp in spans])
+        stops = np.array([np.nan if sp[3] is None else sp[3] for sp in spans])
+        targets = np.array([np.nan if sp[4] is None else sp[4] for sp in spans])
+        reference, kind = fills.exits(sides, f.open[exits], f.high[exits], f.low[exits], f.close[exits], stops, targets, f.path[exits])
+        reference, kind = reference.tolist(), kind.tolist()
+        entry_volume = f.volume[entries].tolist()
+        exit_volume = f.volume[exits].tolist()
+
+    positions = []  # (entry, exit or n, side, amount, entry price, exit price, pnl, stop, target)
+    cash = capital
+    for k, (i, e, s, stop_, target_) in enumerate(spans):
+        amount = position_size(cash, entry_close[k], risk_pct)
+        entry = entry_close[k] if fills is None else fills.market(entry_close[k], s, amount, entry_volume[k])
+        if e == n:
+            positions.append((i, e, s, amount, entry, None, 0.0, stop_, target_))
+            continue
+        if fills is None:
+            exit_ = exit_close[k]
+            pnl = (exit_ - entry) * amount
+            pnl = -pnl if s < 0 else pnl
+        else:
+            exit_ = fills.exit_price(s, kind[k], reference[k], amount, exit_volume[k])
+            pnl = fills.pnl(s, entry, exit_, amount, kind[k])
+        cash += pnl
+        positions.append((i, e, s, amount, entry, exit_, pnl, stop_, target_))
+    return positions
+
+
+def _equity_curve(close: np.ndarray, positions: list, capital: float) -> np.ndarray:
+    """Cash plus the open position marked at each close; fees are paid on exit."""
+    n = len(close)
+    if not positions:
+        return np.full(n, capital)
+    bars = np.arange(n)
+    entries = np.array([p[0] for p in positions], dtype=np.int64)
+    exits = np.array([p[1] for p in positions], dtype=np.int64)
+    signs = np.array([p[2] for p in positions], dtype=np.int8)
+    amounts = np.array([p[3] for p in positions], dtype=np.float64)
+    prices = np.array([p[4] for p in positions], dtype=np.float64)
+    pnls = np.array([p[6] for p in positions], dtype=np.float64)
+    closed = exits < n
+    # sequential sums from the starting balance, as the cash is credited
+    levels = np.cumsum(np.concatenate(([capital], pnls[closed])))
+    cash = levels[np.searchsorted(exits[closed], bars, side="right")]
+
+    owner = np.searchsorted(entries, bars, side="right") - 1
+    holding = owner >= 0
+    owner = np.maximum(owner, 0)
+    holding &= bars < exits[owner]
+    open_pnl = (close - prices[owner]) * amounts[owner]
+    open_pnl = np.where(signs[owner] < 0, -open_pnl, open_pnl)
+    return np.where(holding, cash + open_pnl, cash)
+
+
+def cached_backtest(
+    candles,
+    params: StrategyParams = DEFAULT_PARAMS,
+    capital: float = CAPITAL,
+    atr_method: str = "simple",
+    vectorised: bool = False,
+    cache: Optional[ResultCache] = None,
+    fills: Optional[FillModel] = None,
+    path: Optional[np.ndarray] = None,
+) -> BacktestResult:
+    """Backtest through ``cache``: identical runs are loaded, not simulated.
+
+    Event-driven runs are stored as the :class:`Backtester` itself, so when
+    candles were only appended since a cached run it resumes from there and
+    simulates just the new bars.
+    """
+    if cache is None:
+        return run_backtest(candles, params, capital, atr_method, vectorised, fills, path)
+    config = {
+        "params": asdict(params),
+        "capital": capital,
+        "atr_method": atr_method,
+        "fills": asdict(fills) if fills is not None else None,
+        "path": hashlib.blake2b(np.asarray(path, dtype=np.int8).tobytes()).hexdigest() if path is not None else None,
+    }
+    digest = candle_digest(candles)
+    if vectorised:
+        result = cache.get("vectorised", config, digest)
+        if result is None:
+            result = run_backtest(candles, params, capital, atr_method, True, fills, path)
+            cache.put("vectorised", config, digest, result)
+        return result
+    found = cache.latest("event", config, candles)
+    if found is not None and found[0] == digest[0]:
+        return found[1].result()
+    bt = found[1] if found is not None else Backtester(params, capital, atr_method, fills)
+    result = bt.run(candles, path)
+    cache.put("event", config, digest, bt)
+    return result
+
+
+def run_backtest(
+    candles,
+    params: StrategyParams = DEFAULT_PARAMS,
+    capital: float = CAPITAL,
+    atr_method: str = "simple",
+    vectorised: bool = False,
+    fills: Optional[FillModel] = None,
+    path: Optional[np.ndarray] = None,
+) -> BacktestResult:
+    if vectorised:
+        return vectorised_backtest(Features.from_candles(candles, params, atr_method, path), params, capital, fills)
+    return Backtester(params, capital, atr_method, fills).run(candles, path)
+
+
+def load_candles(
+    db_file: str = DB_FILE,
+    archive_dir: Optional[str] = None,
+    pair: str = PAIR,
+    timeframe: str = TIMEFRAME,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> pd.DataFrame:
+    """Candles for a backtest, from the Parquet archive or the bot's database.
+
+    The database is opened read-only: research jobs never migrate or write
+    to the live bot's file.
+    """
+    if archive_dir:
+        return archive.load_candles(archive_dir, pair, timeframe, start=start, end=end)
+    con = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        return pd.read_sql(
+            "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? AND ts>=? AND ts<? ORDER BY ts",
+            con,
+            params=(pair, timeframe, start or 0, end or 2**62),
+        )
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored candles through the strategy")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database holding candles")
+    parser.add_argument("--archive", metavar="DIR", help="read candles from a Parquet archive instead")
+    parser.add_argument("--pair", default=PAIR)
+    parser.add_argument("--timeframe", default=TIMEFRAME)
+    parser.add_argument("--since", help="first candle, ISO date")
+    parser.add_argument("--until", help="end of the range, ISO date")
+    parser.add_argument("--params", metavar="FILE", help="strategy parameters as a JSON object")
+    parser.add_argument("--risk", type=float, help="risk per trade (overrides --params)")
+    parser.add_argument("--capital", type=float, default=CAPITAL, help="starting USDC balance")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing")
+    parser.add_argument("--max-drawdown", type=float, help="stop opening trades past this drawdown (overrides --params)")
+    parser.add_argument("--vectorised", action="store_true", help="simulate over whole-history arrays")
+    parser.add_argument("--fills", metavar="FILE", help="fees and slippage as a JSON object (default: free fills at the close)")
+    parser.add_argument("--intrabar", metavar="TIMEFRAME", help="order stop and target hits with these lower-timeframe candles")
+    parser.add_argument("--cache", default=CACHE_DIR, metavar="DIR", help="result cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="always simulate")
+    parser.add_argument("--equity-csv", metavar="FILE", help="write the equity curve here")
+    parser.add_argument("--loglevel", default="WARNING", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.WARNING), format="%(asctime)s %(levelname)s %(message)s")
+
+    since = parse_date(args.since) if args.since else None
+    until = parse_date(args.until) if args.until else None
+    candles = load_candles(args.db, args.archive, args.pair, args.timeframe, since, until)
+    params = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    overrides = {"risk_pct": args.risk, "max_drawdown": args.max_drawdown}
+    params = replace(params, **{k: v for k, v in overrides.items() if v is not None})
+    fills = FillModel.load(args.fills) if args.fills else None
+    path = None
+    if fills is not None and args.intrabar:
+        lower = load_candles(args.db, args.archive, args.pair, args.intrabar, since, until)
+        path = intrabar_path(candles["ts"], exchange.parse_timeframe(args.timeframe) * 1000, lower)
+    cache = None if args.no_cache else ResultCache(args.cache)
+    result = cached_backtest(candles, params, args.capital, args.atr, args.vectorised, cache, fills, path)
+    if cache:
+        cache.evict()
+    if args.equity_csv:
+        pd.DataFrame({"ts": result.ts, "equity": result.equity, "drawdown": result.drawdown}).to_csv(args.equity_csv, index=False)
+    print(json.dumps(result.summary()))
@@ -0,0 +1,74 @@
+"""Load time of the Parquet archive versus ``pd.read_sql`` on the candles table.
+
+Fills a throwaway database with synthetic candles, exports it with
+:meth:`bot.Database.export_parquet` and times loading the close column of
+the whole history and of a single quarter both ways::
+
+    $ python benchmarks/bench_archive.py --bars 2000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from archive import load_candles  # noqa: E402
+from bot import Database, PAIR, TIMEFRAME, TIMEFRAME_MS  # noqa: E402
+
+START = 1_577_836_800_000  # 2020-01-01
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, len(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, default=2_000_000, help="candles to generate")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(str(pathlib.Path(directory) / "bench.db"))
+        ts = START + np.arange(args.bars, dtype=np.int64) * TIMEFRAME_MS
+        close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, args.bars))
+        with db.transaction():
+            db.cur.executemany(
+                "INSERT INTO candles VALUES (?,?,?,?,?,?,?,?)",
+                ((int(t), PAIR, TIMEFRAME, c, c + 1, c - 1, c, 1.0) for t, c in zip(ts, close)),
+            )
+        root = str(pathlib.Path(directory) / "archive")
+        db.export_parquet(root)
+        q_start, q_end = int(ts[len(ts) // 2]), int(ts[len(ts) // 2]) + 90 * 86_400_000
+
+        cases = {
+            "read_sql, all columns": lambda: db.candles_dataframe(),
+            "parquet, all columns": lambda: load_candles(root, PAIR, TIMEFRAME),
+            "read_sql, close": lambda: pd.read_sql(
+                "SELECT ts, close FROM candles WHERE pair=? AND timeframe=? ORDER BY ts", db.con, params=(PAIR, TIMEFRAME)
+            ),
+            "parquet, close": lambda: load_candles(root, PAIR, TIMEFRAME, columns=["close"]),
+            "read_sql, close, one quarter": lambda: pd.read_sql(
+                "SELECT ts, close FROM candles WHERE pair=? AND timeframe=? AND ts>=? AND ts<? ORDER BY ts",
+                db.con,
+                params=(PAIR, TIMEFRAME, q_start, q_end),
+            ),
+            "parquet, close, one quarter": lambda: load_candles(
+                root, PAIR, TIMEFRAME, columns=["close"], start=q_start, end=q_end
+            ),
+        }
+        for name, fn in cases.items():
+            seconds, rows = timed(fn)
+            print(f"{name:30s} {rows:9d} rows {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
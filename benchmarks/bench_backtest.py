@@ -0,0 +1,36 @@
+"""Backtest throughput: event-driven vs vectorised.
+
+    $ python benchmarks/bench_backtest.py --bars 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from backtest import Backtester, Features, vectorised_backtest  # noqa: E402
+from bot import StrategyParams  # noqa: E402
+from bench_labels import make_history  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, default=1_000_000, help="bars of history")
+    args = parser.parse_args()
+    df = make_history(args.bars)
+    params = StrategyParams(max_drawdown=None)
+    print("event-driven", json.dumps(Backtester(params).run(df).summary()))
+    started = time.perf_counter()
+    features = Features.from_candles(df)
+    built = time.perf_counter() - started
+    result = vectorised_backtest(features, params)
+    print(f"vectorised   features {built:.3f}s", json.dumps(result.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Per-tick write latency of :class:`bot.Database`.
+
+Simulates the writes of a busy tick (store a candle, trail a stop, close the
+order, log the tick) against a fresh on-disk database and reports latency
+for the original commit-per-write behaviour, a single transaction per tick,
+and a single transaction with WAL journaling::
+
+    $ python benchmarks/bench_db.py --ticks 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from bot import Database, Order, TIMEFRAME_MS  # noqa: E402
+
+
+def tick(db: Database, i: int) -> None:
+    ts = i * TIMEFRAME_MS
+    db.store_candles([[ts, 100.0, 101.0, 99.0, 100.5, 1.0]])
+    order = Order(i + 1, ts, "buy", 100.0, 0.1, 99.0, 101.0, "open")
+    db.record_order(order)
+    db.close_order(order.id, ts)
+    db.log_tick(ts, "up", "close", 0.05, 1000.0)
+
+
+def run(mode: str, ticks: int, directory: str) -> list:
+    db = Database(str(pathlib.Path(directory) / f"{mode}.db"), wal=mode == "wal")
+    samples = []
+    for i in range(ticks):
+        start = time.perf_counter()
+        if mode == "autocommit":
+            tick(db, i)
+        else:
+            with db.transaction():
+                tick(db, i)
+        samples.append((time.perf_counter() - start) * 1000)
+    db.con.close()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=500, help="ticks per mode")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("autocommit", "transaction", "wal"):
+            samples = sorted(run(mode, args.ticks, directory))
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"{mode:12s} median {statistics.median(samples):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
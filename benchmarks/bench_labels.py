@@ -0,0 +1,62 @@
+"""Regime labelling throughput over a long history.
+
+Compares calling :func:`bot.label_state` once per bar (on a small sample,
+extrapolated), the streaming :class:`indicators.StreamingClassifier` and the
+vectorised :func:`indicators.label_states`::
+
+    $ python benchmarks/bench_labels.py --bars 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from bot import label_state  # noqa: E402
+from indicators import StreamingClassifier, label_states  # noqa: E402
+
+
+def make_history(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return pd.DataFrame({
+        "ts": np.arange(n, dtype=np.int64) * 900_000,
+        "open": close,
+        "high": close + rng.exponential(1.0, n),
+        "low": close - rng.exponential(1.0, n),
+        "close": close,
+        "volume": 1.0,
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, default=1_000_000, help="bars of history")
+    parser.add_argument("--sample", type=int, default=2_000, help="bars timed for per-bar label_state")
+    args = parser.parse_args()
+    df = make_history(args.bars)
+
+    start = time.perf_counter()
+    for t in range(args.sample):
+        label_state(df.iloc[:t + 21])
+    per_bar = (time.perf_counter() - start) / args.sample
+    print(f"label_state per bar   {per_bar * args.bars:8.1f} s  (extrapolated from {args.sample} bars)")
+
+    start = time.perf_counter()
+    StreamingClassifier().seed(df)
+    print(f"StreamingClassifier   {time.perf_counter() - start:8.1f} s")
+
+    start = time.perf_counter()
+    label_states(df)
+    print(f"label_states          {time.perf_counter() - start:8.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Candle query latency: original rowid layout versus the clustered key.
+
+Builds two throwaway databases holding the same synthetic candles spread
+over several pairs: one with the original ``UNIQUE (ts, pair, timeframe)``
+rowid table and one opened through :class:`bot.Database`, which migrates to
+the ``(pair, timeframe, ts)`` WITHOUT ROWID layout. It then times the
+queries the bot issues for a single pair::
+
+    $ python benchmarks/bench_schema.py --rows 1200000 --pairs 6
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from bot import Database, PAIR, TIMEFRAME, TIMEFRAME_MS  # noqa: E402
+
+QUERIES = {
+    "max_ts": ("SELECT MAX(ts) FROM candles WHERE pair=? AND timeframe=?", (PAIR, TIMEFRAME)),
+    "window (last 500)": (
+        "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts DESC LIMIT 500",
+        (PAIR, TIMEFRAME),
+    ),
+    "full history": (
+        "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts",
+        (PAIR, TIMEFRAME),
+    ),
+}
+
+
+def build_rowid_db(path: str, rows: int, pairs: int) -> None:
+    con = sqlite3.connect(path)
+    con.execute(
+        """CREATE TABLE candles (
+            ts INTEGER, pair TEXT, timeframe TEXT,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            UNIQUE (ts, pair, timeframe)
+        )"""
+    )
+    names = [PAIR] + [f"ALT{i}/USDC" for i in range(1, pairs)]
+    per_pair = rows // pairs
+    # interleave pairs as live ingestion does
+    con.executemany(
+        "INSERT INTO candles VALUES (?,?,?,?,?,?,?,?)",
+        ((i * TIMEFRAME_MS, name, TIMEFRAME, 1.0, 2.0, 0.5, 1.5, 1.0) for i in range(per_pair) for name in names),
+    )
+    con.commit()
+    con.close()
+
+
+def time_query(con: sqlite3.Connection, sql: str, params: tuple, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        con.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_200_000, help="total candles")
+    parser.add_argument("--pairs", type=int, default=6, help="pairs sharing the table")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        old = str(pathlib.Path(directory) / "rowid.db")
+        new = str(pathlib.Path(directory) / "clustered.db")
+        build_rowid_db(old, args.rows, args.pairs)
+        shutil.copy(old, new)
+        start = time.perf_counter()
+        Database(new, window_bars=1).con.close()
+        print(f"migration of {args.rows} rows: {time.perf_counter() - start:.1f} s")
+        cons = {"rowid": sqlite3.connect(old), "clustered": sqlite3.connect(new)}
+        for name, (sql, params) in QUERIES.items():
+            line = [f"{name:18s}"]
+            for layout, con in cons.items():
+                repeat = max(1, args.repeat // 10) if name == "full history" else args.repeat
+                line.append(f"{layout} {time_query(con, sql, params, repeat):9.3f} ms")
+            print("   ".join(line))
+
+
+if __name__ == "__main__":
+    main()
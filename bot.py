@@ -25,23 +25,43 @@ withdrawal scope.
 from __future__ import annotations
 
 import argparse
+import copy
+import itertools
 import json
 import logging
 import os
 import sqlite3
 import sys
+import threading
 import time
-from dataclasses import dataclass
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Iterable, Iterator, List, Optional
 
 import ccxt
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
+import archive
+from fills import FillModel
+from indicators import ATR_FACTOR, LOOKBACK, IndicatorCache, IndicatorContext, RunningATR
+from mmap_store import MmapCandles
+from scheduler import SETTLE_SECONDS, CandleScheduler
+from validation import POLICIES, check_candles, to_rows
+
 PAIR = "BTC/USDC"
 TIMEFRAME = "15m"
 DB_FILE = "bot_log.db"
 BARS_LOOKBACK = 200
+WINDOW_BARS = 500
+BACKFILL_PAGE_BARS = 300
+BACKFILL_WORKERS = 4
+BACKFILL_BATCH_PAGES = 50
+CANDLE_POLICY = "reject"
+BALANCE_TTL = 60.0
+CANDLE_COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
 
 load_dotenv()
 
@@ -59,6 +79,41 @@ exchange = ccxt.coinbase({
 TIMEFRAME_MS = exchange.parse_timeframe(TIMEFRAME) * 1000
 
 
+@dataclass(frozen=True)
+class StrategyParams:
+    """Tunable numbers of the regime strategy; the defaults are the live settings."""
+
+    # bars in the regime window, the breakout highs/lows and the ATR
+    lookback: int = LOOKBACK
+    # consolidation needs the latest range within this multiple of the median range
+    atr_factor: float = ATR_FACTOR
+    # consolidation entries trigger within this fraction of the range from its edges
+    entry_band: float = 0.1
+    # stop and target distances in ATRs (range trades target the midpoint)
+    stop_atr: float = 1.0
+    target_atr: float = 1.0
+    risk_pct: float = 0.01
+    # stop trading once equity falls this far below its peak; None never stops
+    max_drawdown: Optional[float] = 0.10
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "StrategyParams":
+        names = {f.name for f in fields(cls)}
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"unknown strategy parameters: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: str) -> "StrategyParams":
+        """Read parameters from a JSON object; missing keys keep their defaults."""
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+
+DEFAULT_PARAMS = StrategyParams()
+
+
 @dataclass
 class Order:
     id: int
@@ -71,21 +126,119 @@ class Order:
     status: str
 
 
+# Clustered on (pair, timeframe, ts): every candle query filters on the first
+# two and orders or ranges on the third, so rows come straight off the b-tree.
+CANDLES_SCHEMA = """CREATE TABLE IF NOT EXISTS {name} (
+    ts INTEGER NOT NULL,
+    pair TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (pair, timeframe, ts)
+) WITHOUT ROWID"""
+
+
+class CandleWindow:
+    """Rolling in-memory window of the most recent ``max_bars`` candles.
+
+    Bars live in a preallocated buffer twice the window size; appends write
+    past the end and the live region is compacted only when the buffer fills,
+    so appending ``k`` bars costs amortised ``O(k)`` regardless of history.
+    """
+
+    def __init__(self, max_bars: int = WINDOW_BARS) -> None:
+        if max_bars < 1:
+            raise ValueError("max_bars must be positive")
+        self.max_bars = max_bars
+        self._ts = np.empty(2 * max_bars, dtype=np.int64)
+        self._ohlcv = np.empty((2 * max_bars, 5), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def last_ts(self) -> int:
+        return int(self._ts[self._end - 1]) if len(self) else 0
+
+    def clear(self) -> None:
+        self._start = 0
+        self._end = 0
+
+    def append(self, bars: List[list]) -> int:
+        """Append bars newer than the last one held; return how many were kept."""
+        last = self.last_ts
+        new = [b for b in bars if not len(self) or b[0] > last]
+        if not new:
+            return 0
+        new.sort(key=lambda b: b[0])
+        new = new[-self.max_bars:]
+        k = len(new)
+        if self._end + k > len(self._ts):
+            keep = min(len(self), self.max_bars - k)
+            self._ts[:keep] = self._ts[self._end - keep:self._end]
+            self._ohlcv[:keep] = self._ohlcv[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        arr = np.asarray(new, dtype=np.float64)
+        self._ts[self._end:self._end + k] = [b[0] for b in new]
+        self._ohlcv[self._end:self._end + k] = arr[:, 1:6]
+        self._end += k
+        self._start = max(self._start, self._end - self.max_bars)
+        return k
+
+    def frame(self) -> pd.DataFrame:
+        """Return the window as a DataFrame shaped like ``candles_dataframe``."""
+        ohlcv = self._ohlcv[self._start:self._end]
+        data = {"ts": self._ts[self._start:self._end].copy()}
+        for i, col in enumerate(CANDLE_COLUMNS[1:]):
+            data[col] = ohlcv[:, i].copy()
+        return pd.DataFrame(data, columns=CANDLE_COLUMNS)
+
+
+# orders and logs rows belong to one market; rows written before markets
+# were recorded are the default market's
+MARKET_COLUMNS = f"pair TEXT NOT NULL DEFAULT '{PAIR}', timeframe TEXT NOT NULL DEFAULT '{TIMEFRAME}'"
+ORDER_COLUMNS = "id, ts, side, price, amount, stop, target, status"
+
+
+class _Session:
+    """Transaction state shared by every market view of one connection."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.views: List["Database"] = []
+
+
 class Database:
-    def __init__(self, db_file: str = DB_FILE) -> None:
+    """Candles, orders and tick logs of one market (``pair``, ``timeframe``).
+
+    :meth:`market` returns views of other markets that share this
+    connection and its transactions, so one process can run many markets
+    on one database.
+    """
+
+    def __init__(
+        self,
+        db_file: str = DB_FILE,
+        window_bars: int = WINDOW_BARS,
+        wal: bool = False,
+        mmap_dir: Optional[str] = None,
+        pair: str = PAIR,
+        timeframe: str = TIMEFRAME,
+    ) -> None:
         self.con = sqlite3.connect(db_file, check_same_thread=False)
         self.cur = self.con.cursor()
+        if wal:
+            # WAL keeps readers off the writer's back and with synchronous=NORMAL
+            # only checkpoints fsync; a power cut may lose the last commits but
+            # never corrupts the file.
+            self.cur.execute("PRAGMA journal_mode=WAL")
+            self.cur.execute("PRAGMA synchronous=NORMAL")
+        self._session = _Session()
+        self._migrate_candles()
+        self.cur.execute(CANDLES_SCHEMA.format(name="candles"))
         self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS candles (
-                ts INTEGER,
-                pair TEXT,
-                timeframe TEXT,
-                open REAL, high REAL, low REAL, close REAL, volume REAL,
-                UNIQUE (ts, pair, timeframe)
-            )"""
-        )
-        self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS orders (
+            f"""CREATE TABLE IF NOT EXISTS orders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 ts INTEGER,
                 side TEXT,
@@ -93,37 +246,169 @@ class Database:
                 amount REAL,
                 stop REAL,
                 target REAL,
-                status TEXT
+                status TEXT,
+                {MARKET_COLUMNS}
             )"""
         )
         self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS logs (
+            f"""CREATE TABLE IF NOT EXISTS logs (
                 ts INTEGER,
                 state TEXT,
                 decision TEXT,
                 pnl REAL,
-                equity REAL
+                equity REAL,
+                {MARKET_COLUMNS}
             )"""
         )
+        self._migrate_markets()
         self.con.commit()
+        self._open_market(pair, timeframe, window_bars, mmap_dir)
+
+    def _open_market(self, pair: str, timeframe: str, window_bars: int, mmap_dir: Optional[str]) -> None:
+        self.pair = pair
+        self.timeframe = timeframe
+        self.timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        self.mmap_dir = mmap_dir
+        self.window = CandleWindow(window_bars)
+        self.mmap = MmapCandles(mmap_dir).store(pair, timeframe) if mmap_dir else None
+        self.load_window()
+        self._session.views.append(self)
+
+    def market(self, pair: str, timeframe: str, window_bars: Optional[int] = None) -> "Database":
+        """A view of another market on the same connection.
+
+        Views share transactions: a :meth:`transaction` opened on any of them
+        covers writes made through all of them.
+        """
+        view = copy.copy(self)
+        view._open_market(pair, timeframe, window_bars or self.window.max_bars, self.mmap_dir)
+        return view
+
+    def _migrate_markets(self) -> None:
+        """Add the market columns to ``orders`` and ``logs`` tables that predate them."""
+        for table in ("orders", "logs"):
+            columns = {row[1] for row in self.cur.execute(f"PRAGMA table_info({table})")}
+            for definition in MARKET_COLUMNS.split(", "):
+                name = definition.split()[0]
+                if name not in columns:
+                    logging.info("adding %s column to the %s table", name, table)
+                    self.cur.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+
+    def _migrate_candles(self) -> None:
+        """Rebuild a pre-existing rowid ``candles`` table with the clustered key."""
+        row = self.cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='candles'").fetchone()
+        if not row or "WITHOUT ROWID" in row[0].upper():
+            return
+        logging.info("migrating candles table to a (pair, timeframe, ts) primary key")
+        self.cur.execute("BEGIN")
+        try:
+            self.cur.execute("ALTER TABLE candles RENAME TO candles_rowid")
+            self.cur.execute(CANDLES_SCHEMA.format(name="candles"))
+            self.cur.execute(
+                "INSERT OR IGNORE INTO candles SELECT ts, pair, timeframe, open, high, low, close, volume FROM candles_rowid"
+            )
+            self.cur.execute("DROP TABLE candles_rowid")
+        except BaseException:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator["Database"]:
+        """Group every write made inside the block into a single commit.
+
+        Nested blocks join the outermost one. If the block raises, all of its
+        writes are rolled back and the candle windows are reloaded to match.
+        """
+        session = self._session
+        session.depth += 1
+        try:
+            yield self
+        except BaseException:
+            session.depth -= 1
+            if not session.depth:
+                self.con.rollback()
+                for view in session.views:
+                    view.load_window()
+            raise
+        session.depth -= 1
+        if not session.depth:
+            self.con.commit()
+
+    def _commit(self) -> None:
+        if not self._session.depth:
+            self.con.commit()
+
+    def load_window(self) -> None:
+        """(Re)load the candle window from the most recent stored bars.
+
+        The mmap file, if any, is rebuilt when it no longer matches the table.
+        """
+        rows = self.cur.execute(
+            "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts DESC LIMIT ?",
+            (self.pair, self.timeframe, self.window.max_bars),
+        ).fetchall()
+        self.window.clear()
+        self.window.append([list(r) for r in reversed(rows)])
+        if self.mmap is not None:
+            self._sync_mmap()
+
+    def _sync_mmap(self) -> None:
+        """Re-seed the mmap file from the table unless both hold the same bars.
+
+        The file only ever appends, so it falls out of step when candles are
+        stored without it (a run without ``--mmap-dir``), when older bars are
+        filled in, or when a transaction that appended to it rolls back.
+        Matching bar counts and last timestamps are taken to mean the same bars.
+        """
+        count, last = self.cur.execute(
+            "SELECT COUNT(*), MAX(ts) FROM candles WHERE pair=? AND timeframe=?",
+            (self.pair, self.timeframe),
+        ).fetchone()
+        if len(self.mmap) == count and self.mmap.last_ts == (last or 0):
+            return
+        logging.info("re-seeding the %s %s mmap candles from the database", self.pair, self.timeframe)
+        self.mmap.clear()
+        self.mmap.append(self.cur.execute(
+            "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts",
+            (self.pair, self.timeframe),
+        ).fetchall())
 
     def max_ts(self) -> int:
         row = self.cur.execute(
             "SELECT MAX(ts) FROM candles WHERE pair=? AND timeframe=?",
-            (PAIR, TIMEFRAME),
+            (self.pair, self.timeframe),
         ).fetchone()
         return row[0] if row and row[0] else 0
 
     def store_candles(self, bars: List[list]) -> None:
         self.cur.executemany(
             "INSERT OR IGNORE INTO candles VALUES (?,?,?,?,?,?,?,?)",
-            [(b[0], PAIR, TIMEFRAME, b[1], b[2], b[3], b[4], b[5]) for b in bars],
+            [(b[0], self.pair, self.timeframe, b[1], b[2], b[3], b[4], b[5]) for b in bars],
         )
-        self.con.commit()
+        self._commit()
+        self.window.append(bars)
+        if self.mmap is not None:
+            stored, last = len(self.mmap), self.mmap.last_ts
+            self.mmap.append(bars)
+            # bars at or before the file's end cannot be appended; they may fill holes
+            if stored and any(b[0] <= last for b in bars):
+                self._sync_mmap()
+
+    def recent_candles(self):
+        """Return the last ``window_bars`` candles for the strategy.
+
+        With an mmap backend this is a zero-copy structured array view;
+        otherwise a DataFrame built from the in-memory window.
+        """
+        if self.mmap is not None:
+            return self.mmap.tail(self.window.max_bars)
+        return self.window.frame()
 
     def last_open_order(self) -> Optional[Order]:
         row = self.cur.execute(
-            "SELECT * FROM orders WHERE status='open' ORDER BY id DESC LIMIT 1"
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE status='open' AND pair=? AND timeframe=? ORDER BY id DESC LIMIT 1",
+            (self.pair, self.timeframe),
         ).fetchone()
         if not row:
             return None
@@ -131,7 +416,7 @@ class Database:
 
     def record_order(self, order: Order) -> None:
         self.cur.execute(
-            "INSERT OR REPLACE INTO orders VALUES (?,?,?,?,?,?,?,?)",
+            f"INSERT OR REPLACE INTO orders ({ORDER_COLUMNS}, pair, timeframe) VALUES (?,?,?,?,?,?,?,?,?,?)",
             (
                 order.id,
                 int(order.ts),
@@ -141,76 +426,281 @@ class Database:
                 float(order.stop),
                 float(order.target),
                 order.status,
+                self.pair,
+                self.timeframe,
             ),
         )
-        self.con.commit()
+        self._commit()
 
     def close_order(self, order_id: int, ts: int) -> None:
         self.cur.execute(
             "UPDATE orders SET status='closed', ts=? WHERE id=?",
             (ts, order_id),
         )
-        self.con.commit()
+        self._commit()
 
     def log_tick(self, ts: int, state: str, decision: str, pnl: float, equity: float) -> None:
         """Store a log entry for a completed tick."""
         self.cur.execute(
-            "INSERT INTO logs VALUES (?,?,?,?,?)",
-            (ts, state, decision, pnl, equity),
+            "INSERT INTO logs (ts, state, decision, pnl, equity, pair, timeframe) VALUES (?,?,?,?,?,?,?)",
+            (ts, state, decision, pnl, equity, self.pair, self.timeframe),
         )
-        self.con.commit()
+        self._commit()
 
     def candles_dataframe(self) -> pd.DataFrame:
+        """Return the full candle history; the live loop uses ``window`` instead."""
         df = pd.read_sql(
             "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts",
             self.con,
-            params=(PAIR, TIMEFRAME),
+            params=(self.pair, self.timeframe),
         )
         return df
 
+    def export_parquet(self, root: str, pair: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        """Archive stored candles (of this market by default) into monthly Parquet files under ``root``."""
+        pair, timeframe = pair or self.pair, timeframe or self.timeframe
+        df = pd.read_sql(
+            "SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts",
+            self.con,
+            params=(pair, timeframe),
+        )
+        archive.export_candles(df, root, pair, timeframe)
+        return len(df)
+
+    def import_parquet(
+        self,
+        root: str,
+        pair: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> int:
+        """Load archived candles (of this market by default) from ``root`` into the candles table."""
+        pair, timeframe = pair or self.pair, timeframe or self.timeframe
+        df = archive.load_candles(root, pair, timeframe, start=start, end=end)
+        rows = to_rows(df.to_numpy(dtype=np.float64))
+        with self.transaction():
+            self.cur.executemany(
+                "INSERT OR IGNORE INTO candles VALUES (?,?,?,?,?,?,?,?)",
+                [(r[0], pair, timeframe, r[1], r[2], r[3], r[4], r[5]) for r in rows],
+            )
+        for view in self._session.views:
+            if (view.pair, view.timeframe) == (pair, timeframe):
+                view.load_window()
+        return len(rows)
+
+
+class RateLimiter:
+    """Space request starts at least ``interval`` seconds apart across threads."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def backfill(
+    db: Database,
+    since: int,
+    until: Optional[int] = None,
+    page_bars: int = BACKFILL_PAGE_BARS,
+    workers: int = BACKFILL_WORKERS,
+    batch_pages: int = BACKFILL_BATCH_PAGES,
+    policy: str = "drop",
+) -> dict:
+    """Load candles in ``[since, until)`` and return throughput statistics.
+
+    The range is split into pages of ``page_bars`` candles which are fetched
+    by ``workers`` threads, with request starts spaced by the exchange's
+    ``rateLimit``. Pages are stored in order, ``batch_pages`` per transaction,
+    after each batch passes :func:`validation.check_candles` under ``policy``.
+    """
+    timeframe_ms = db.timeframe_ms
+    # by default up to the last close: the bar still forming is never stored
+    until = until or exchange.milliseconds() // timeframe_ms * timeframe_ms
+    page_ms = page_bars * timeframe_ms
+    starts = list(range(since, until, page_ms))
+    limiter = RateLimiter(exchange.rateLimit / 1000)
+
+    def fetch_page(start: int) -> List[list]:
+        limiter.wait()
+        bars = exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=start, limit=page_bars)
+        end = min(start + page_ms, until)
+        return [b for b in bars if start <= b[0] < end]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        total, refetch = store_pages(db, pool.map(fetch_page, starts), batch_pages, policy)
+    if refetch:
+        refetch_ranges(db, refetch)
+    db.load_window()
+    return backfill_stats(total, len(starts), started)
+
 
-def fetch_new_candles(db: Database) -> pd.DataFrame:
-    """Fetch new candles and enforce data integrity."""
+def backfill_policy(policy: str) -> str:
+    """The policy to backfill under for a live ``policy``.
+
+    A rejected batch is never stored, so the same gap would fail every
+    catch-up after it; ``reject`` drops the bad bars instead, logging them.
+    """
+    return "drop" if policy == "reject" else policy
+
+
+def store_pages(db: Database, pages: Iterable[List[list]], batch_pages: int = BACKFILL_BATCH_PAGES, policy: str = "drop") -> tuple:
+    """Validate and store backfilled ``pages`` in order, ``batch_pages`` per transaction.
+
+    Returns the number of bars stored and the ranges to request again.
+    """
+    total = 0
+    last_ts = 0
+    refetch = []
+    pages = iter(pages)
+    while True:
+        chunk = list(itertools.islice(pages, batch_pages))
+        if not chunk:
+            return total, refetch
+        batch = [bar for page in chunk for bar in page]
+        if not batch:
+            continue
+        clean, report = check_candles(batch, db.timeframe_ms, last_ts, policy)
+        if not report.ok:
+            logging.warning("candle integrity (%s): %s", policy, report.summary())
+        refetch.extend(report.refetch)
+        with db.transaction():
+            db.store_candles(to_rows(clean))
+        total += len(clean)
+        if len(clean):
+            last_ts = int(clean[-1, 0])
+
+
+def backfill_stats(bars: int, pages: int, started: float) -> dict:
+    """Log and return the throughput of a backfill that began at ``started``."""
+    elapsed = time.perf_counter() - started
+    stats = {
+        "bars": bars,
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "bars_per_sec": round(bars / elapsed, 1) if elapsed else 0.0,
+    }
+    logging.info("backfilled %(bars)d bars in %(pages)d pages, %(seconds).1fs (%(bars_per_sec).0f bars/s)", stats)
+    return stats
+
+
+def refetch_ranges(db: Database, ranges: List[tuple]) -> None:
+    """Request ``[start, end)`` ranges again and store whatever valid bars come back."""
+    for start, end in ranges:
+        try:
+            bars = exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=start, limit=(end - start) // db.timeframe_ms)
+        except Exception as exc:
+            logging.error("error refetching candles %s-%s: %s", start, end, exc)
+            continue
+        store_refetched(db, bars, start, end)
+
+
+def store_refetched(db: Database, bars: List[list], start: int, end: int) -> None:
+    """Store the valid bars of a refetched ``[start, end)`` range."""
+    bars = [b for b in bars if start <= b[0] < end]
+    clean, _ = check_candles(bars, db.timeframe_ms, policy="drop")
+    db.store_candles(to_rows(clean))
+
+
+def fetch_new_candles(db: Database, policy: str = CANDLE_POLICY, until: Optional[int] = None) -> pd.DataFrame:
+    """Fetch new candles and enforce data integrity under ``policy``.
+
+    With ``until``, only candles that closed by then are stored, so the bar
+    still forming is never persisted half-built.
+    """
     last_ts = db.max_ts()
-    since = last_ts + TIMEFRAME_MS if last_ts else None
+    if last_ts and exchange.milliseconds() - last_ts > BARS_LOOKBACK * db.timeframe_ms:
+        # after an outage, catch up in one go instead of BARS_LOOKBACK per tick
+        backfill(db, last_ts + db.timeframe_ms, until, policy=backfill_policy(policy))
+        last_ts = db.max_ts()
+    since = last_ts + db.timeframe_ms if last_ts else None
     try:
-        bars = exchange.fetch_ohlcv(PAIR, timeframe=TIMEFRAME, since=since, limit=BARS_LOOKBACK)
+        bars = exchange.fetch_ohlcv(db.pair, timeframe=db.timeframe, since=since, limit=BARS_LOOKBACK)
     except Exception as exc:
         logging.error("error fetching candles via REST: %s", exc)
         raise
+    return ingest_candles(db, bars, last_ts, policy, until)
+
+
+def ingest_candles(
+    db: Database,
+    bars: List[list],
+    last_ts: int,
+    policy: str = CANDLE_POLICY,
+    until: Optional[int] = None,
+) -> pd.DataFrame:
+    """Validate freshly fetched ``bars``, store them and return the recent candles.
+
+    An empty response means the exchange has not served a new bar yet; the
+    stored candles are returned unchanged for the caller to poll again.
+    """
     if not bars:
-        raise ValueError("no candles returned")
-
-    # data integrity: nulls, duplicates and gaps
-    timestamps = []
-    for bar in bars:
-        if None in bar[:6]:
-            raise ValueError("NULL value in candle data")
-        ts = bar[0]
-        if timestamps and ts - timestamps[-1] > TIMEFRAME_MS * 4:
-            raise ValueError("data gap greater than 3 bars")
-        timestamps.append(ts)
-    if len(timestamps) != len(set(timestamps)):
-        raise ValueError("duplicate candle timestamps")
-    if last_ts and timestamps[0] - last_ts > TIMEFRAME_MS * 4:
-        raise ValueError("data gap greater than 3 bars")
-
-    db.store_candles(bars)
-    return db.candles_dataframe()
-
-
-def label_state(df: pd.DataFrame) -> str:
-    if len(df) < 21:
+        return db.recent_candles()
+    if until is not None:
+        bars = [b for b in bars if b[0] + db.timeframe_ms <= until]
+        if not bars:
+            return db.recent_candles()
+
+    clean, report = check_candles(bars, db.timeframe_ms, last_ts, policy)
+    if not report.ok:
+        logging.warning("candle integrity (%s): %s", policy, report.summary())
+    db.store_candles(to_rows(clean))
+    if report.refetch:
+        refetch_ranges(db, report.refetch)
+        db.load_window()
+    return db.recent_candles()
+
+
+def column(candles, name: str) -> np.ndarray:
+    """Return a candle column as a NumPy array.
+
+    The strategy accepts anything indexable by column name: a DataFrame, a
+    structured array from :mod:`mmap_store` or a dict of arrays. Access is
+    positional, like ``.iloc``.
+    """
+    return np.asarray(candles[name])
+
+
+def _max(values: np.ndarray) -> float:
+    return values.max() if len(values) else np.nan
+
+
+def _min(values: np.ndarray) -> float:
+    return values.min() if len(values) else np.nan
+
+
+def cached(ctx: Optional[IndicatorContext], name: str, compute):
+    """``compute()``, memoised in ``ctx`` when one is given."""
+    return ctx.get(name, compute) if ctx is not None else compute()
+
+
+def label_state(df: pd.DataFrame, ctx: Optional[IndicatorContext] = None, params: StrategyParams = DEFAULT_PARAMS) -> str:
+    n = params.lookback
+    if len(df) < n + 1:
         return "chaos"
-    rng = df["high"] - df["low"]
-    atr = rng.iloc[-1]
-    atr_prev = rng.iloc[-2]
-    median_range = rng.tail(20).median()
-    overlap = df["high"].tail(20).max() - df["low"].tail(20).min() <= median_range
-    new_high = df["close"].iloc[-1] > df["high"].iloc[-21:-1].max()
-    new_low = df["close"].iloc[-1] < df["low"].iloc[-21:-1].min()
+    high = column(df, "high")
+    low = column(df, "low")
+    rng = cached(ctx, "ranges", lambda: high[-n - 1:] - low[-n - 1:])
+    atr = rng[-1]
+    atr_prev = rng[-2]
+    median_range = cached(ctx, "median_range", lambda: np.median(rng[-n:]))
+    high_max = cached(ctx, "high_max", lambda: high[-n:].max())
+    low_min = cached(ctx, "low_min", lambda: low[-n:].min())
+    overlap = high_max - low_min <= median_range
+    new_high = column(df, "close")[-1] > cached(ctx, "high20", lambda: _max(high[-n - 1:-1]))
+    new_low = column(df, "close")[-1] < cached(ctx, "low20", lambda: _min(low[-n - 1:-1]))
     atr_expanding = atr > atr_prev
-    if atr <= 1.01 * median_range and overlap:
+    if atr <= params.atr_factor * median_range and overlap:
         return "consolidation"
     if atr_expanding and (new_high or new_low):
         return "up" if new_high else "down"
@@ -224,29 +714,163 @@ def position_size(usdc_balance: float, price: float, risk_pct: float) -> float:
 
 def compute_atr(df: pd.DataFrame, period: int = 20) -> float:
     """Return the Average True Range over the last ``period`` bars."""
-    high = df["high"]
-    low = df["low"]
-    close = df["close"].shift()
-    tr = pd.concat([
-        high - low,
-        (high - close).abs(),
-        (low - close).abs(),
-    ], axis=1).max(axis=1)
-    return tr.tail(period).mean()
-
-
-def get_equity(is_live: bool, last_price: float) -> float:
-    """Return total equity in USDC."""
+    high = column(df, "high")[-period:]
+    low = column(df, "low")[-period:]
+    close = column(df, "close")[-period - 1:-1]
+    if len(close) < len(high):
+        # the very first bar has no previous close
+        close = np.concatenate(([np.nan], close))
+    tr = np.fmax(high - low, np.fmax(np.abs(high - close), np.abs(low - close)))
+    return tr.mean()
+
+
+class BalanceService:
+    """Exchange balance snapshot shared by everything that needs it in a tick.
+
+    A snapshot is reused for ``ttl`` seconds and marked stale explicitly with
+    :meth:`invalidate` whenever an order is placed or closed, so a quiet
+    tick costs at most one authenticated round trip.
+
+    With ``fetch_async`` (an async client's ``fetch_balance``) nothing ever
+    blocks: :meth:`refresh` awaits a new snapshot when the current one is
+    stale, and :meth:`snapshot` serves the latest one in between, so an
+    order's effect on the balance shows from the next refresh.
+    """
+
+    def __init__(self, ttl: float = BALANCE_TTL, fetch=None, clock=time.monotonic, fetch_async=None) -> None:
+        self.ttl = ttl
+        self._fetch = fetch
+        self._fetch_async = fetch_async
+        self._clock = clock
+        self._balance: Optional[dict] = None
+        self._fetched_at = 0.0
+        self._stale = True
+        self.hits = 0
+        self.misses = 0
+
+    def fresh(self) -> bool:
+        return not self._stale and self._clock() - self._fetched_at < self.ttl
+
+    def snapshot(self) -> dict:
+        if self.fresh() or (self._fetch_async is not None and self._balance is not None):
+            self.hits += 1
+            return self._balance
+        if self._fetch_async is not None:
+            raise RuntimeError("no balance fetched yet: await refresh() first")
+        self.misses += 1
+        self.set((self._fetch or exchange.fetch_balance)())
+        return self._balance
+
+    async def refresh(self) -> dict:
+        """Await a new snapshot from ``fetch_async`` unless the current one is fresh."""
+        if not self.fresh():
+            self.misses += 1
+            self.set(await self._fetch_async())
+        return self._balance
+
+    def set(self, balance: dict) -> None:
+        """Install a snapshot fetched elsewhere, e.g. concurrently with candles."""
+        self._balance = balance
+        self._fetched_at = self._clock()
+        self._stale = False
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def total(self, currency: str) -> float:
+        return float(self.snapshot()["total"].get(currency, 0))
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def get_equity(
+    is_live: bool,
+    last_price: float,
+    balances: Optional[BalanceService] = None,
+    pair: str = PAIR,
+    balance: Optional[dict] = None,
+) -> float:
+    """Return total equity in ``pair``'s quote currency (USDC for BTC/USDC).
+
+    ``balance`` marks a snapshot already taken instead of asking ``balances``.
+    """
+    base, quote = pair.split("/")
     if is_live:
-        bal = exchange.fetch_balance()
-        usdc = float(bal["total"].get("USDC", 0))
-        btc = float(bal["total"].get("BTC", 0))
+        if balance is None:
+            balance = (balances or BalanceService()).snapshot()
+        usdc = float(balance["total"].get(quote, 0))
+        btc = float(balance["total"].get(base, 0))
     else:
         usdc = 1000.0
         btc = 0.0
     return usdc + btc * last_price
 
 
+def trail_order(order: Order, state: str, last_close: float, atr: float, params: StrategyParams = DEFAULT_PARAMS) -> Order:
+    """Return ``order`` with stop and target trailed while the market trends."""
+    if state not in ("up", "down"):
+        return order
+    stop_dist = params.stop_atr * atr
+    target_dist = params.target_atr * atr
+    if order.side == "buy":
+        new_stop = max(order.stop, last_close - stop_dist)
+        new_target = last_close + target_dist
+    else:
+        new_stop = min(order.stop, last_close + stop_dist)
+        new_target = last_close - target_dist
+    if new_stop == order.stop and new_target == order.target:
+        return order
+    return Order(order.id, order.ts, order.side, order.price, order.amount, new_stop, new_target, order.status)
+
+
+def exit_signal(order: Order, state: str, prev_state: Optional[str], bar_high: float, bar_low: float) -> bool:
+    """Whether ``order`` closes on this bar: stop, target or a change of regime."""
+    hit_stop = bar_low <= order.stop if order.side == "buy" else bar_high >= order.stop
+    hit_target = bar_high >= order.target if order.side == "buy" else bar_low <= order.target
+    state_flip = (
+        (state == "up" and order.side == "sell")
+        or (state == "down" and order.side == "buy")
+        or state == "chaos"
+        or (prev_state is not None and state != prev_state)
+    )
+    return hit_stop or hit_target or state_flip
+
+
+def entry_signal(
+    state: str,
+    last_close: float,
+    high20: float,
+    low20: float,
+    atr: float,
+    params: StrategyParams = DEFAULT_PARAMS,
+) -> Optional[tuple]:
+    """Return ``(side, stop, target)`` for a new order, or ``None``."""
+    range_mid = (high20 + low20) / 2
+    range_size = high20 - low20
+    stop_dist = params.stop_atr * atr
+    target_dist = params.target_atr * atr
+    if state == "consolidation":
+        bottom_entry = low20 + params.entry_band * range_size
+        top_entry = high20 - params.entry_band * range_size
+        if last_close <= bottom_entry:
+            return "buy", low20 - stop_dist, range_mid
+        if last_close >= top_entry:
+            return "sell", high20 + stop_dist, range_mid
+    elif state == "up":
+        if last_close > high20:
+            return "buy", high20 - stop_dist, last_close + target_dist
+    elif state == "down":
+        if last_close < low20:
+            return "sell", low20 + stop_dist, last_close - target_dist
+    return None
+
+
+def order_pnl(order: Order, price: float) -> float:
+    pnl = (price - order.price) * order.amount
+    return -pnl if order.side == "sell" else pnl
+
+
 def trade_logic(
     db: Database,
     df: pd.DataFrame,
@@ -254,131 +878,262 @@ def trade_logic(
     is_live: bool,
     risk_pct: float,
     prev_state: Optional[str] = None,
+    balances: Optional[BalanceService] = None,
+    atr: Optional[float] = None,
+    ctx: Optional[IndicatorContext] = None,
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
 ) -> tuple[str, float]:
-    last_close = df["close"].iloc[-1]
+    """Exit, trail or enter on the latest candle; returns ``(decision, pnl)``.
+
+    Paper fills happen at ``last_close`` for free unless ``fills`` prices
+    them; live fills are the exchange's.
+    """
+    high = column(df, "high")
+    low = column(df, "low")
+    last_close = column(df, "close")[-1]
+    last_ts = int(column(df, "ts")[-1])
     order = db.last_open_order()
-    atr = compute_atr(df)
-    high20 = df["high"].iloc[-21:-1].max()
-    low20 = df["low"].iloc[-21:-1].min()
-    range_mid = (high20 + low20) / 2
-    range_size = high20 - low20
+    n = params.lookback
+    if atr is None:
+        atr = cached(ctx, "atr", lambda: compute_atr(df, n))
+    high20 = cached(ctx, "high20", lambda: _max(high[-n - 1:-1]))
+    low20 = cached(ctx, "low20", lambda: _min(low[-n - 1:-1]))
+    paper_fills = fills if not is_live else None
 
     decision = "hold"
     pnl = 0.0
 
-    # exit logic and trailing
+    # exit on the levels in force while the bar traded, then trail on its close
     if order:
-        if state in ("up", "down"):
-            if order.side == "buy":
-                new_stop = max(order.stop, last_close - atr)
-                new_target = last_close + atr
-            else:
-                new_stop = min(order.stop, last_close + atr)
-                new_target = last_close - atr
-            if new_stop != order.stop or new_target != order.target:
-                order = Order(order.id, order.ts, order.side, order.price, order.amount, new_stop, new_target, order.status)
-                db.record_order(order)
-
-        hit_stop = df["low"].iloc[-1] <= order.stop if order.side == "buy" else df["high"].iloc[-1] >= order.stop
-        hit_target = df["high"].iloc[-1] >= order.target if order.side == "buy" else df["low"].iloc[-1] <= order.target
-        state_flip = (
-            (state == "up" and order.side == "sell")
-            or (state == "down" and order.side == "buy")
-            or state == "chaos"
-            or (prev_state is not None and state != prev_state)
-        )
-        if hit_stop or hit_target or state_flip:
+        if exit_signal(order, state, prev_state, high[-1], low[-1]):
             logging.info("Closing order %s", order.id)
             if is_live:
                 # real sell/buy to close would go here
-                pass
-            pnl = (last_close - order.price) * order.amount
-            if order.side == "sell":
-                pnl *= -1
-            db.close_order(order.id, int(df["ts"].iloc[-1]))
+                if balances:
+                    balances.invalidate()
+            if paper_fills is None:
+                pnl = order_pnl(order, last_close)
+            else:
+                bar = (column(df, "open")[-1], high[-1], low[-1], last_close, column(df, "volume")[-1])
+                side = 1 if order.side == "buy" else -1
+                _, pnl = paper_fills.close(side, bar, order.stop, order.target, order.price, order.amount)
+            db.close_order(order.id, last_ts)
             decision = "close"
             order = None
+        else:
+            trailed = trail_order(order, state, last_close, atr, params)
+            if trailed is not order:
+                order = trailed
+                db.record_order(order)
 
     if order:
         return decision, pnl
 
     # entry logic
-    usdc = float(exchange.fetch_balance()["total"].get("USDC", 0)) if is_live else 1000.0
-    amount = position_size(usdc, last_close, risk_pct)
-    if state == "consolidation":
-        bottom_entry = low20 + 0.1 * range_size
-        top_entry = high20 - 0.1 * range_size
-        if last_close <= bottom_entry:
-            side = "buy"
-            stop = low20 - atr
-            target = range_mid
-        elif last_close >= top_entry:
-            side = "sell"
-            stop = high20 + atr
-            target = range_mid
-        else:
-            return decision, pnl
-    elif state == "up":
-        if last_close > high20:
-            side = "buy"
-            stop = high20 - atr
-            target = last_close + atr
-        else:
-            return decision, pnl
-    elif state == "down":
-        if last_close < low20:
-            side = "sell"
-            stop = low20 + atr
-            target = last_close - atr
-        else:
-            return decision, pnl
-    else:
+    signal = entry_signal(state, last_close, high20, low20, atr, params)
+    if signal is None:
         return decision, pnl
-    logging.info("Placing %s for %.6f BTC @ %.2f", side, amount, last_close)
+    side, stop, target = signal
+    # size only once there is an entry, so flat ticks need no balance
+    usdc = (balances or BalanceService()).total(db.pair.split("/")[1]) if is_live else 1000.0
+    amount = position_size(usdc, last_close, risk_pct)
+    price = last_close
+    if paper_fills is not None:
+        price = paper_fills.market(last_close, 1 if side == "buy" else -1, amount, column(df, "volume")[-1])
+    logging.info("Placing %s for %.6f %s @ %.2f", side, amount, db.pair.split("/")[0], price)
     if is_live:
         # real market order would go here
-        pass
-    order = Order(id=None, ts=int(df["ts"].iloc[-1]), side=side, price=last_close, amount=amount, stop=stop, target=target, status="open")
+        if balances:
+            balances.invalidate()
+    order = Order(id=None, ts=last_ts, side=side, price=price, amount=amount, stop=stop, target=target, status="open")
     db.record_order(order)
     decision = side
     return decision, pnl
-def run_bot(is_live: bool = False, risk_pct: float = 0.01) -> None:
-    db = Database(DB_FILE)
-    logging.info("starting bot: live=%s risk_pct=%s", is_live, risk_pct)
-    equity = get_equity(is_live, 0)
+
+
+@dataclass
+class Tick:
+    ts: int
+    state: str
+    decision: str
+    pnl: float
+    equity: float
+    latency_ms: Optional[int] = None
+    indicator_cache: Optional[dict] = None
+
+
+def evaluate_tick(
+    db: Database,
+    df: pd.DataFrame,
+    is_live: bool,
+    risk_pct: float,
+    prev_state: Optional[str] = None,
+    balances: Optional[BalanceService] = None,
+    atr_engine: Optional[RunningATR] = None,
+    indicators: Optional[IndicatorCache] = None,
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
+) -> Tick:
+    """Label the latest candle, run the trade logic and log the tick.
+
+    With ``atr_engine``, stops and targets are sized from its running ATR,
+    caught up with any new bars in ``df``, instead of :func:`compute_atr`.
+    With ``indicators``, values derived for this bar are computed once and
+    shared by :func:`label_state` and :func:`trade_logic`. ``fills`` prices
+    paper trades.
+    """
+    ctx = indicators.context(db.pair, db.timeframe, df, params.lookback, params.atr_factor) if indicators else None
+    # one balance per tick: equity is marked on the snapshot taken before
+    # trading, which an order filled at the close leaves unchanged but for fees
+    balance = None
+    if is_live:
+        balances = balances or BalanceService()
+        balance = balances.snapshot()
+    state = label_state(df, ctx, params)
+    last_price = column(df, "close")[-1]
+    last_ts = int(column(df, "ts")[-1])
+    logging.info("state=%s close=%s", state, last_price)
+    atr = atr_engine.extend(df) if atr_engine else None
+    decision, pnl = trade_logic(db, df, state, is_live, risk_pct, prev_state, balances, atr, ctx, params, fills)
+    equity = get_equity(is_live, last_price, balances, db.pair, balance)
+    db.log_tick(last_ts, state, decision, pnl, equity)
+    stats = indicators.stats() if indicators else None
+    return Tick(last_ts, state, decision, float(pnl), float(equity), indicator_cache=stats)
+
+
+def parse_date(value: str) -> int:
+    """Return an ISO date or datetime as a UTC millisecond timestamp."""
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize("UTC")
+    return int(stamp.timestamp() * 1000)
+
+
+def run_bot(
+    is_live: bool = False,
+    risk_pct: float = 0.01,
+    window_bars: int = WINDOW_BARS,
+    wal: bool = False,
+    candle_policy: str = CANDLE_POLICY,
+    mmap_dir: Optional[str] = None,
+    settle: float = SETTLE_SECONDS,
+    atr_method: str = "simple",
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
+) -> None:
+    db = Database(DB_FILE, window_bars, wal=wal, mmap_dir=mmap_dir)
+    params = replace(params, risk_pct=risk_pct)
+    logging.info("starting bot: live=%s %s", is_live, params)
+    balances = BalanceService()
+    atr_engine = RunningATR(params.lookback, method=atr_method)
+    indicators = IndicatorCache()
+    equity = get_equity(is_live, 0, balances, db.pair)
     peak_equity = equity
     prev_state: Optional[str] = None
+    scheduler = CandleScheduler(db.timeframe_ms, settle)
+    scheduler.sync_clock(exchange)
+    # evaluate the latest closed candle right away, then one per close
+    close_ts = scheduler.last_close()
+    failures = 0
     while True:
         try:
-            df = fetch_new_candles(db)
-            state = label_state(df)
-            logging.info("state=%s close=%s", state, df["close"].iloc[-1])
-            decision, pnl = trade_logic(db, df, state, is_live, risk_pct, prev_state)
-            prev_state = state
-            last_price = df["close"].iloc[-1]
-            equity = get_equity(is_live, last_price)
-            peak_equity = max(peak_equity, equity)
-            drawdown = (peak_equity - equity) / peak_equity
-            if drawdown >= 0.10 and is_live:
-                logging.warning("drawdown exceeded 10%% - disabling live trading")
-                is_live = False
-            db.log_tick(int(df["ts"].iloc[-1]), state, decision, pnl, equity)
-            print(json.dumps({"ts": int(df["ts"].iloc[-1]), "state": state, "decision": decision, "pnl": pnl, "equity": equity}))
-            time.sleep(TIMEFRAME_MS / 1000)
+            df, ready = scheduler.poll(
+                lambda: fetch_new_candles(db, candle_policy, until=close_ts),
+                lambda _: db.max_ts() >= close_ts - db.timeframe_ms,
+            )
+            if ready:
+                # requests first, so the tick's writes are one short transaction
+                if is_live:
+                    balances.snapshot()
+                with db.transaction():
+                    tick = evaluate_tick(db, df, is_live, risk_pct, prev_state, balances, atr_engine, indicators, params, fills)
+                tick.latency_ms = scheduler.latency_ms(close_ts)
+                prev_state = tick.state
+                peak_equity = max(peak_equity, tick.equity)
+                drawdown = (peak_equity - tick.equity) / peak_equity
+                if params.max_drawdown is not None and drawdown >= params.max_drawdown and is_live:
+                    logging.warning("drawdown exceeded %.0f%% - disabling live trading", params.max_drawdown * 100)
+                    is_live = False
+                logging.info("decision latency %d ms after candle close", tick.latency_ms)
+                logging.debug("balance cache %s", balances.stats())
+                print(json.dumps(asdict(tick)))
+            else:
+                logging.warning("candle closing at %s not available, skipping tick", close_ts)
+            failures = 0
+            close_ts = scheduler.wait_for_close()
         except Exception as exc:
-            logging.error("error in main loop: %s", exc)
-            time.sleep(30)
+            failures += 1
+            delay = scheduler.retry_delay(failures)
+            logging.error("error in main loop: %s (retrying in %.0fs)", exc, delay)
+            time.sleep(delay)
+            close_ts = scheduler.last_close()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Coinbase categorise-adapt-trade bot")
     parser.add_argument("--live", action="store_true", help="place real orders")
     parser.add_argument("--paper", action="store_true", help="paper trading mode")
-    parser.add_argument("--risk", type=float, default=0.01, help="risk per trade")
+    parser.add_argument("--risk", type=float, help="risk per trade (default 0.01, or from --params)")
+    parser.add_argument("--params", metavar="FILE", help="strategy parameters as a JSON object")
+    parser.add_argument("--fills", metavar="FILE", help="paper-mode fees and slippage as a JSON object")
     parser.add_argument("--loglevel", default="INFO", help="logging level")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use the asyncio run loop")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds to wait after each candle close")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing for stops and targets")
+    parser.add_argument("--window", type=int, default=WINDOW_BARS, help="candles kept in memory")
+    parser.add_argument("--wal", action="store_true", help="use WAL journaling with synchronous=NORMAL")
+    parser.add_argument("--mmap-dir", metavar="DIR", help="also keep candles in memory-mapped files here")
+    parser.add_argument("--candle-policy", choices=POLICIES, default=CANDLE_POLICY, help="how to handle bad candles")
+    parser.add_argument("--backfill", metavar="SINCE", help="load history from this ISO date and exit")
+    parser.add_argument("--until", metavar="UNTIL", help="end of the backfill range (default: now)")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="concurrent backfill requests")
+    parser.add_argument("--export-parquet", metavar="DIR", help="archive stored candles to Parquet and exit")
+    parser.add_argument("--import-parquet", metavar="DIR", help="load archived Parquet candles and exit")
+    parser.add_argument("--pair", default=PAIR, help="market to backfill, export or import")
+    parser.add_argument("--timeframe", default=TIMEFRAME, help="candle timeframe to backfill, export or import")
     args = parser.parse_args()
 
     logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.INFO), format="%(asctime)s %(levelname)s %(message)s")
 
+    if args.export_parquet or args.import_parquet:
+        db = Database(DB_FILE, args.window, wal=args.wal, pair=args.pair, timeframe=args.timeframe)
+        if args.export_parquet:
+            print(json.dumps({"exported": db.export_parquet(args.export_parquet)}))
+        if args.import_parquet:
+            print(json.dumps({"imported": db.import_parquet(args.import_parquet)}))
+        sys.exit(0)
+
+    if args.backfill:
+        stats = backfill(
+            Database(DB_FILE, args.window, wal=args.wal, pair=args.pair, timeframe=args.timeframe),
+            parse_date(args.backfill),
+            parse_date(args.until) if args.until else None,
+            workers=args.workers,
+            policy=backfill_policy(args.candle_policy),
+        )
+        print(json.dumps(stats))
+        sys.exit(0)
+
     live = args.live and not args.paper
-    run_bot(is_live=live, risk_pct=args.risk)
+    params = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    options = dict(
+        is_live=live,
+        risk_pct=args.risk if args.risk is not None else params.risk_pct,
+        window_bars=args.window,
+        wal=args.wal,
+        candle_policy=args.candle_policy,
+        mmap_dir=args.mmap_dir,
+        settle=args.settle,
+        atr_method=args.atr,
+        params=params,
+        fills=FillModel.load(args.fills) if args.fills else None,
+    )
+    if args.use_async:
+        import asyncio
+
+        from async_bot import run_bot_async
+
+        asyncio.run(run_bot_async(**options))
+    else:
+        run_bot(**options)
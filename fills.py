@@ -0,0 +1,173 @@
+"""Fill simulation for paper trading and backtests: prices, fees and slippage.
+
+The strategy decides on closed bars. It enters at the close, and exits on
+the bar whose high or low crosses its stop or target, or whose regime
+changes. Filling all of that at the close, for free, flatters it; a
+:class:`FillModel` prices each fill instead:
+
+* entries and regime-change exits are market orders at the close. They pay
+  half the spread, plus ``impact`` times the order's share of the bar's
+  volume, plus the taker fee;
+* a stop is a market order triggered at the stop (at the open when the bar
+  gaps through it), with the same slippage and the taker fee;
+* a target is a resting limit order filled at the target (at the open when
+  the bar gaps through it), with the maker fee and no slippage.
+
+When one bar crosses both the stop and the target, whichever was reached
+first decides. :func:`intrabar_path` derives that from lower-timeframe bars;
+without them, the extreme nearer the open is assumed to come first, the usual
+OHLC heuristic. ``path="worst"`` always assumes the stop.
+
+:meth:`FillModel.exits` classifies and prices exits over whole arrays of
+trades. Only the size-dependent slippage is left per trade, because position
+sizes depend on the balance the previous trade left.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, fields
+from typing import Tuple
+
+import numpy as np
+
+PATHS = ("ohlc", "worst")
+# how a position was closed
+SIGNAL, STOP, TARGET = 0, 1, 2
+
+
+@dataclass(frozen=True)
+class FillModel:
+    """Trading costs, as fractions of price; the defaults cost nothing."""
+
+    maker_fee: float = 0.0
+    taker_fee: float = 0.0
+    # full bid/ask spread; market orders cross half of it
+    spread: float = 0.0
+    # extra slippage per unit of the bar's volume an order takes
+    impact: float = 0.0
+    # which of the stop and target a bar crossing both reached first
+    path: str = "ohlc"
+
+    def __post_init__(self) -> None:
+        if self.path not in PATHS:
+            raise ValueError(f"unknown intrabar path {self.path!r}")
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "FillModel":
+        names = {f.name for f in fields(cls)}
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"unknown fill model settings: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: str) -> "FillModel":
+        """Read settings from a JSON object; missing keys keep their defaults."""
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+    def slippage(self, amount: float, volume: float) -> float:
+        """Price concession of a market order for ``amount`` on a bar trading ``volume``."""
+        participation = min(amount / volume, 1.0) if volume > 0 else 1.0
+        return self.spread / 2 + self.impact * participation
+
+    def market(self, price: float, side: int, amount: float, volume: float) -> float:
+        """Fill price of a market buy (``side`` 1) or sell (-1) referenced at ``price``."""
+        return price * (1.0 + side * self.slippage(amount, volume))
+
+    def exits(self, side, open_, high, low, close, stop, target, path=None) -> Tuple[np.ndarray, np.ndarray]:
+        """``(reference price, kind)`` of positions closing on the given bars.
+
+        ``side`` is 1 for longs and -1 for shorts; ``kind`` is :data:`STOP`,
+        :data:`TARGET` or :data:`SIGNAL`. ``path`` is the optional
+        :func:`intrabar_path` of each bar.
+        """
+        long = np.asarray(side) > 0
+        stop_hit = np.where(long, low <= stop, high >= stop)
+        target_hit = np.where(long, high >= target, low <= target)
+        if self.path == "worst":
+            high_first = ~long
+        else:
+            nearer_high = high - open_ <= open_ - low
+            high_first = nearer_high if path is None else np.where(path != 0, path > 0, nearer_high)
+        stop_first = high_first != long
+        kind = np.where(stop_hit & (stop_first | ~target_hit), STOP, np.where(target_hit, TARGET, SIGNAL))
+        # a bar opening beyond the level fills at the open
+        stop_ref = np.where(long, np.minimum(open_, stop), np.maximum(open_, stop))
+        target_ref = np.where(long, np.maximum(open_, target), np.minimum(open_, target))
+        reference = np.where(kind == STOP, stop_ref, np.where(kind == TARGET, target_ref, close))
+        return reference, kind
+
+    def exit_price(self, side: int, kind: int, reference: float, amount: float, volume: float) -> float:
+        """Fill price of the order closing a position of ``side``."""
+        if kind == TARGET:
+            return reference
+        return self.market(reference, -side, amount, volume)
+
+    def pnl(self, side: int, entry: float, exit_: float, amount: float, kind: int) -> float:
+        """Realised profit after the entry's taker fee and the exit's fee."""
+        gross = (exit_ - entry) * amount
+        if side < 0:
+            gross = -gross
+        exit_fee = self.maker_fee if kind == TARGET else self.taker_fee
+        return gross - (self.taker_fee * entry + exit_fee * exit_) * amount
+
+    def close(
+        self,
+        side: int,
+        bar: Tuple[float, float, float, float, float],
+        stop: float,
+        target: float,
+        entry: float,
+        amount: float,
+        path: int = 0,
+    ) -> Tuple[float, float]:
+        """``(exit price, pnl)`` of one position closing on ``bar`` (OHLCV), as :meth:`exits` prices it."""
+        open_, high, low, close, volume = bar
+        # plain floats: the event-driven loop calls this for every exit
+        long = side > 0
+        stop_hit = low <= stop if long else high >= stop
+        target_hit = high >= target if long else low <= target
+        if self.path == "worst":
+            stop_first = True
+        else:
+            high_first = path > 0 if path else high - open_ <= open_ - low
+            stop_first = high_first != long
+        if stop_hit and (stop_first or not target_hit):
+            kind, reference = STOP, (min(open_, stop) if long else max(open_, stop))
+        elif target_hit:
+            kind, reference = TARGET, (max(open_, target) if long else min(open_, target))
+        else:
+            kind, reference = SIGNAL, close
+        price = self.exit_price(side, kind, reference, amount, volume)
+        return price, self.pnl(side, entry, price, amount, kind)
+
+
+def intrabar_path(ts: np.ndarray, timeframe_ms: int, lower) -> np.ndarray:
+    """Which extreme of each bar came first, from lower-timeframe candles.
+
+    ``1`` where the bar's high was reached before its low, ``-1`` where the
+    low came first and ``0`` where ``lower`` cannot tell: no lower bars, or
+    both extremes in the same lower bar.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    out = np.zeros(len(ts), dtype=np.int8)
+    sub_ts = np.asarray(lower["ts"], dtype=np.int64)
+    owner = np.searchsorted(ts, sub_ts, side="right") - 1
+    inside = (owner >= 0) & (sub_ts < ts[np.maximum(owner, 0)] + timeframe_ms)
+    if not inside.any():
+        return out
+    owner = owner[inside]
+    high = np.asarray(lower["high"], dtype=np.float64)[inside]
+    low = np.asarray(lower["low"], dtype=np.float64)[inside]
+    groups, starts, counts = np.unique(owner, return_index=True, return_counts=True)
+    group_of = np.repeat(np.arange(len(groups)), counts)
+    index = np.arange(len(owner))
+    never = len(index)
+    top = np.maximum.reduceat(high, starts)[group_of]
+    bottom = np.minimum.reduceat(low, starts)[group_of]
+    first_high = np.minimum.reduceat(np.where(high == top, index, never), starts)
+    first_low = np.minimum.reduceat(np.where(low == bottom, index, never), starts)
+    out[groups] = np.sign(first_low - first_high)
+    return out
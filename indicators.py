@@ -0,0 +1,352 @@
+"""Incremental indicators for the regime strategy.
+
+:mod:`bot` evaluates the strategy on a window of candles each tick. The
+classes here keep just enough state to produce the same values from one
+closed bar at a time, so long replays and backtests do constant work per
+bar instead of re-slicing history.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LOOKBACK = 20
+ATR_FACTOR = 1.01
+CHUNK_BARS = 1 << 16
+CACHE_SIZE = 64
+STATES = np.array(["chaos", "consolidation", "up", "down"])
+
+
+class RollingExtreme:
+    """Max (or min) over the last ``size`` values with a monotonic deque."""
+
+    def __init__(self, size: int, largest: bool = True) -> None:
+        self.size = size
+        self.largest = largest
+        self._items: Deque[Tuple[int, float]] = deque()
+
+    def push(self, i: int, value: float) -> None:
+        items = self._items
+        if self.largest:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((i, value))
+        self.evict(i - self.size + 1)
+
+    def evict(self, first: int) -> None:
+        """Drop values with index below ``first``."""
+        while self._items and self._items[0][0] < first:
+            self._items.popleft()
+
+    @property
+    def value(self) -> float:
+        return self._items[0][1] if self._items else np.nan
+
+
+class RollingMedian:
+    """Median of the last ``size`` values from a sorted window (bisect)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._fifo: Deque[float] = deque()
+        self._sorted: List[float] = []
+
+    def push(self, value: float) -> None:
+        self._fifo.append(value)
+        insort(self._sorted, value)
+        if len(self._fifo) > self.size:
+            old = self._fifo.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+
+    @property
+    def value(self) -> float:
+        s = self._sorted
+        n = len(s)
+        if not n:
+            return np.nan
+        if n % 2:
+            return s[n // 2]
+        # same operation order as np.median, so results match bit for bit
+        return (s[n // 2 - 1] + s[n // 2]) / 2
+
+
+class StreamingClassifier:
+    """Stateful equivalent of :func:`bot.label_state`, fed one closed bar at a time."""
+
+    def __init__(self, lookback: int = LOOKBACK, atr_factor: float = ATR_FACTOR) -> None:
+        self.lookback = lookback
+        self.atr_factor = atr_factor
+        self.count = 0
+        self._median = RollingMedian(lookback)
+        self._high = RollingExtreme(lookback, largest=True)
+        self._low = RollingExtreme(lookback, largest=False)
+        self._range = np.nan
+        self.state = "chaos"
+        # extremes of the ``lookback`` bars before the latest one, as trade_logic uses
+        self.high20 = np.nan
+        self.low20 = np.nan
+
+    def update(self, high: float, low: float, close: float) -> str:
+        i = self.count
+        rng = high - low
+        # the previous ``lookback`` bars, before this one joins the window
+        self._high.evict(i - self.lookback)
+        self._low.evict(i - self.lookback)
+        prev_high = self.high20 = self._high.value
+        prev_low = self.low20 = self._low.value
+        self._high.push(i, high)
+        self._low.push(i, low)
+        self._median.push(rng)
+        prev_range, self._range = self._range, rng
+        self.count += 1
+
+        if self.count < self.lookback + 1:
+            self.state = "chaos"
+            return self.state
+        median_range = self._median.value
+        overlap = self._high.value - self._low.value <= median_range
+        new_high = close > prev_high
+        new_low = close < prev_low
+        if rng <= self.atr_factor * median_range and overlap:
+            self.state = "consolidation"
+        elif rng > prev_range and (new_high or new_low):
+            self.state = "up" if new_high else "down"
+        else:
+            self.state = "chaos"
+        return self.state
+
+    def seed(self, candles) -> str:
+        """Feed every bar of ``candles`` (DataFrame or structured array) in order."""
+        high = np.asarray(candles["high"], dtype=np.float64)
+        low = np.asarray(candles["low"], dtype=np.float64)
+        close = np.asarray(candles["close"], dtype=np.float64)
+        for h, l, c in zip(high.tolist(), low.tolist(), close.tolist()):
+            self.update(h, l, c)
+        return self.state
+
+
+class RunningATR:
+    """Average True Range updated in ``O(1)`` per closed bar.
+
+    ``method="simple"`` is the mean of the last ``period`` true ranges, as in
+    :func:`bot.compute_atr` (kept as a running sum, so it can differ from a
+    fresh mean in the last few bits). ``method="wilder"`` seeds with that
+    mean over the first ``period`` bars and then smooths
+    ``atr = (atr * (period - 1) + tr) / period``.
+    """
+
+    METHODS = ("simple", "wilder")
+
+    def __init__(self, period: int = LOOKBACK, method: str = "simple") -> None:
+        if method not in self.METHODS:
+            raise ValueError(f"unknown ATR method {method!r}")
+        self.period = period
+        self.method = method
+        self.count = 0
+        self.last_ts = None
+        self._prev_close = None
+        self._trs: Deque[float] = deque()
+        self._sum = 0.0
+        self._value = np.nan
+
+    def update(self, high: float, low: float, close: float, ts: Optional[int] = None) -> float:
+        rng = high - low
+        if self._prev_close is None:
+            tr = rng
+        else:
+            tr = max(rng, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.count += 1
+        if ts is not None:
+            self.last_ts = ts
+
+        if self.method == "wilder" and self.count > self.period:
+            self._value = (self._value * (self.period - 1) + tr) / self.period
+            return self._value
+        self._trs.append(tr)
+        self._sum += tr
+        if len(self._trs) > self.period:
+            self._sum -= self._trs.popleft()
+        self._value = self._sum / len(self._trs)
+        return self._value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def extend(self, candles) -> float:
+        """Feed the bars of ``candles`` newer than the last one seen.
+
+        Seeds a fresh engine from stored candles, then catches it up each tick.
+        """
+        ts = np.asarray(candles["ts"])
+        start = 0 if self.last_ts is None else int(np.searchsorted(ts, self.last_ts, side="right"))
+        high = np.asarray(candles["high"], dtype=np.float64)[start:]
+        low = np.asarray(candles["low"], dtype=np.float64)[start:]
+        close = np.asarray(candles["close"], dtype=np.float64)[start:]
+        for t, h, l, c in zip(ts[start:].tolist(), high.tolist(), low.tolist(), close.tolist()):
+            self.update(h, l, c, t)
+        return self._value
+
+
+class IndicatorContext:
+    """Memoised derived values for one bar of one instrument."""
+
+    def __init__(self, cache: "IndicatorCache") -> None:
+        self._cache = cache
+        self._values: Dict[str, Any] = {}
+
+    def get(self, name: str, compute: Callable[[], Any]) -> Any:
+        if name in self._values:
+            self._cache.hits += 1
+            return self._values[name]
+        self._cache.misses += 1
+        value = self._values[name] = compute()
+        return value
+
+
+class IndicatorCache:
+    """LRU of :class:`IndicatorContext` keyed by market, last bar ts and parameters.
+
+    Every value derived for the current bar (ranges, rolling extremes, ATR)
+    is computed once per tick however many callers ask for it; contexts of
+    the least recently evaluated instruments are evicted past ``maxsize``.
+    The ``lookback`` and ``atr_factor`` the values are derived with are part
+    of the key, so callers with different parameters never share them.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._contexts: "OrderedDict[Tuple[str, str, int, int, float], IndicatorContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def context(
+        self, pair: str, timeframe: str, candles, lookback: int = LOOKBACK, atr_factor: float = ATR_FACTOR
+    ) -> IndicatorContext:
+        key = (pair, timeframe, int(np.asarray(candles["ts"])[-1]), lookback, atr_factor)
+        ctx = self._contexts.get(key)
+        if ctx is None:
+            ctx = self._contexts[key] = IndicatorContext(self)
+            if len(self._contexts) > self.maxsize:
+                self._contexts.popitem(last=False)
+        else:
+            self._contexts.move_to_end(key)
+        return ctx
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def rolling_median(values: np.ndarray, size: int, chunk: int = CHUNK_BARS) -> np.ndarray:
+    """Median of each trailing ``size`` window, NaN until the first full one."""
+    out = np.full(len(values), np.nan)
+    if len(values) < size:
+        return out
+    windows = sliding_window_view(values, size)
+    # np.median partitions a copy of its input, so bound the copy size
+    for start in range(0, len(windows), chunk):
+        out[size - 1 + start:size - 1 + start + chunk] = np.median(windows[start:start + chunk], axis=1)
+    return out
+
+
+def rolling_max(values: np.ndarray, size: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= size:
+        out[size - 1:] = sliding_window_view(values, size).max(axis=1)
+    return out
+
+
+def rolling_min(values: np.ndarray, size: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= size:
+        out[size - 1:] = sliding_window_view(values, size).min(axis=1)
+    return out
+
+
+def state_codes(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    lookback: int = LOOKBACK,
+    atr_factor: float = ATR_FACTOR,
+) -> np.ndarray:
+    """Regime of every bar as an index into :data:`STATES`."""
+    n = len(close)
+    rng = high - low
+    median_range = rolling_median(rng, lookback)
+    high_max = rolling_max(high, lookback)
+    low_min = rolling_min(low, lookback)
+    prev_high = np.concatenate(([np.nan], high_max[:-1]))
+    prev_low = np.concatenate(([np.nan], low_min[:-1]))
+    prev_range = np.concatenate(([np.nan], rng[:-1]))
+
+    consolidation = (rng <= atr_factor * median_range) & (high_max - low_min <= median_range)
+    new_high = close > prev_high
+    trending = ~consolidation & (rng > prev_range) & (new_high | (close < prev_low))
+    codes = np.zeros(n, dtype=np.int8)
+    codes[consolidation] = 1
+    codes[trending & new_high] = 2
+    codes[trending & ~new_high] = 3
+    codes[:lookback] = 0
+    return codes
+
+
+def label_states(candles, lookback: int = LOOKBACK, atr_factor: float = ATR_FACTOR) -> np.ndarray:
+    """Vectorised :func:`bot.label_state` for every bar of ``candles`` at once.
+
+    Element ``t`` equals ``label_state`` called on the candles up to and
+    including bar ``t``.
+    """
+    high = np.asarray(candles["high"], dtype=np.float64)
+    low = np.asarray(candles["low"], dtype=np.float64)
+    close = np.asarray(candles["close"], dtype=np.float64)
+    return STATES[state_codes(high, low, close, lookback, atr_factor)]
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """True range of every bar; the first bar has no previous close and uses ``high - low``."""
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr_series(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period: int = LOOKBACK,
+    method: str = "simple",
+) -> np.ndarray:
+    """Vectorised :class:`RunningATR` value after every bar.
+
+    The first ``period - 1`` bars average the true ranges seen so far, as the
+    running engine does. Wilder smoothing is a recurrence, so past the seed
+    it is evaluated with a plain loop over a list.
+    """
+    if method not in RunningATR.METHODS:
+        raise ValueError(f"unknown ATR method {method!r}")
+    tr = true_range(high, low, close)
+    n = len(tr)
+    out = np.empty(n)
+    head = min(n, period - 1)
+    out[:head] = np.cumsum(tr[:head]) / np.arange(1, head + 1)
+    if n < period:
+        return out
+    if method == "simple":
+        out[period - 1:] = sliding_window_view(tr, period).mean(axis=1)
+        return out
+    value = out[period - 1] = tr[:period].mean()
+    smoothed = [value]
+    for x in tr[period:].tolist():
+        value = (value * (period - 1) + x) / period
+        smoothed.append(value)
+    out[period - 1:] = smoothed
+    return out
@@ -0,0 +1,130 @@
+"""Append-only memory-mapped candle files.
+
+An alternative hot-path backend to the SQLite ``candles`` table: one file
+per pair and timeframe holding fixed-width ``(ts, open, high, low, close,
+volume)`` records behind a small header. Appends write straight into the
+mapping and the last ``n`` bars are returned as a zero-copy NumPy view, so
+the strategy can read them without SQL or DataFrame construction.
+
+File layout (little endian)::
+
+    bytes 0-7    magic b"CANDLE01"
+    bytes 8-15   number of records (int64)
+    bytes 16-63  reserved
+    bytes 64-    records, CANDLE_DTYPE each
+
+The file is grown geometrically, so appends are amortised ``O(1)`` per bar.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"CANDLE01"
+HEADER_BYTES = 64
+INITIAL_CAPACITY = 4096
+CANDLE_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+
+class MmapCandleStore:
+    """Memory-mapped candle records for a single pair and timeframe."""
+
+    def __init__(self, path: str) -> None:
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size < HEADER_BYTES:
+            with open(self.path, "wb") as fh:
+                fh.write(MAGIC.ljust(HEADER_BYTES, b"\0"))
+                fh.truncate(HEADER_BYTES + INITIAL_CAPACITY * CANDLE_DTYPE.itemsize)
+        with open(self.path, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a candle store")
+        self._map()
+
+    def _map(self) -> None:
+        size = os.path.getsize(self.path)
+        self.capacity = (size - HEADER_BYTES) // CANDLE_DTYPE.itemsize
+        self._header = np.memmap(self.path, dtype="<i8", mode="r+", shape=(HEADER_BYTES // 8,))
+        self._records = np.memmap(self.path, dtype=CANDLE_DTYPE, mode="r+", offset=HEADER_BYTES, shape=(self.capacity,))
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(self.capacity * 2, needed)
+        self._records.flush()
+        with open(self.path, "r+b") as fh:
+            fh.truncate(HEADER_BYTES + capacity * CANDLE_DTYPE.itemsize)
+        self._map()
+
+    def __len__(self) -> int:
+        return int(self._header[1])
+
+    @property
+    def last_ts(self) -> int:
+        n = len(self)
+        return int(self._records["ts"][n - 1]) if n else 0
+
+    def append(self, bars: Sequence[Sequence]) -> int:
+        """Append bars newer than the last record; return how many were written."""
+        n = len(self)
+        last = self.last_ts
+        new = sorted((b for b in bars if not n or b[0] > last), key=lambda b: b[0])
+        if not new:
+            return 0
+        k = len(new)
+        if n + k > self.capacity:
+            self._grow(n + k)
+        self._records[n:n + k] = [tuple(b[:6]) for b in new]
+        # records first, then the count, so a crash never exposes a torn record
+        self._header[1] = n + k
+        return k
+
+    def clear(self) -> None:
+        """Drop every record, keeping the file's capacity."""
+        self._header[1] = 0
+
+    def view(self) -> np.ndarray:
+        """Zero-copy view of every stored record."""
+        return self._records[:len(self)]
+
+    def tail(self, n: int) -> np.ndarray:
+        """Zero-copy view of the last ``n`` records."""
+        count = len(self)
+        return self._records[max(count - n, 0):count]
+
+    def frame(self, n: int) -> pd.DataFrame:
+        """The last ``n`` records as a DataFrame, for callers that need pandas."""
+        return pd.DataFrame(self.tail(n))
+
+    def flush(self) -> None:
+        self._records.flush()
+        self._header.flush()
+
+
+class MmapCandles:
+    """Directory of :class:`MmapCandleStore` files keyed by pair and timeframe."""
+
+    def __init__(self, root: str) -> None:
+        self.root = pathlib.Path(root)
+        self._stores: Dict[Tuple[str, str], MmapCandleStore] = {}
+
+    def store(self, pair: str, timeframe: str) -> MmapCandleStore:
+        key = (pair, timeframe)
+        if key not in self._stores:
+            name = f"{pair.replace('/', '-')}_{timeframe}.candles"
+            self._stores[key] = MmapCandleStore(str(self.root / name))
+        return self._stores[key]
+
+    def flush(self) -> None:
+        for store in self._stores.values():
+            store.flush()
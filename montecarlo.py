@@ -0,0 +1,204 @@
+"""Monte Carlo drawdown and risk-of-ruin analysis.
+
+Resamples a trade list, from the bot's ``orders`` table or from a backtest,
+into many alternative trade sequences and reports how deep and how long the
+drawdowns get and how often the account is ruined, for several values of
+``risk_pct``.
+
+The bot sizes every position at ``risk_pct`` of the USDC balance, so a trade
+that moves the price by ``R`` (signed by side, as a fraction of the entry)
+multiplies equity by ``1 + risk_pct * R``. Each trade is reduced to that
+``R`` once; the paths for every risk level are then built from the same
+resampled indices, ``batch`` simulations at a time, with array operations
+over ``(simulations, trades)`` blocks.
+
+Usage::
+
+    $ python montecarlo.py --risk 0.005,0.01,0.02                     # closed orders in bot_log.db
+    $ python montecarlo.py --backtest --archive archive/ --sims 100000 --method permutation
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backtest import Backtester, Trade, load_candles
+from bot import DB_FILE, DEFAULT_PARAMS, PAIR, TIMEFRAME, StrategyParams, parse_date
+from indicators import RunningATR
+
+SIMULATIONS = 100_000
+BATCH_CELLS = 1 << 18  # cells per (simulations, trades) block; larger blocks fall out of cache
+METHODS = ("bootstrap", "permutation")
+RUIN = 0.5
+
+
+def trade_returns(trades: Sequence[Trade]) -> np.ndarray:
+    """Signed price move of each trade as a fraction of its entry price."""
+    entry = np.array([t.entry_price for t in trades], dtype=np.float64)
+    exit_ = np.array([t.exit_price for t in trades], dtype=np.float64)
+    sign = np.array([-1.0 if t.side == "sell" else 1.0 for t in trades])
+    return sign * (exit_ - entry) / entry
+
+
+def returns_from_db(db_file: str = DB_FILE, pair: str = PAIR, timeframe: str = TIMEFRAME) -> np.ndarray:
+    """:func:`trade_returns` of the closed orders in the bot's database.
+
+    A closed order keeps its entry price and the timestamp of the bar it was
+    closed on; it was closed at that bar's close.
+    """
+    con = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        rows = con.execute(
+            """SELECT o.side, o.price, c.close FROM orders o
+               JOIN candles c ON c.pair=o.pair AND c.timeframe=o.timeframe AND c.ts=o.ts
+               WHERE o.status='closed' AND o.pair=? AND o.timeframe=? ORDER BY o.ts, o.id""",
+            (pair, timeframe),
+        ).fetchall()
+    finally:
+        con.close()
+    if not rows:
+        return np.empty(0)
+    side, entry, exit_ = zip(*rows)
+    sign = np.where(np.array(side) == "sell", -1.0, 1.0)
+    return sign * (np.array(exit_) - np.array(entry)) / np.array(entry)
+
+
+@dataclass
+class RiskProfile:
+    """Per-simulation outcomes for one ``risk_pct``."""
+
+    risk_pct: float
+    max_drawdown: np.ndarray
+    recovery: np.ndarray
+    final_return: np.ndarray
+    ruined: np.ndarray
+
+    def summary(self, kill_drawdown: Optional[float] = DEFAULT_PARAMS.max_drawdown) -> dict:
+        """Percentiles of each distribution and the ruin probabilities.
+
+        ``recovery`` is the longest stretch, in trades, spent below a previous
+        equity peak (a stretch still open at the end counts as it stands).
+        """
+        q = lambda a, p: round(float(np.percentile(a, p)), 6)
+        out = {
+            "risk_pct": self.risk_pct,
+            "simulations": len(self.max_drawdown),
+            "max_drawdown": {f"p{p}": q(self.max_drawdown, p) for p in (50, 90, 95, 99)},
+            "recovery_trades": {f"p{p}": q(self.recovery, p) for p in (50, 90, 95, 99)},
+            "final_return": {f"p{p}": q(self.final_return, p) for p in (5, 50, 95)},
+            "risk_of_ruin": round(float(self.ruined.mean()), 6),
+        }
+        if kill_drawdown is not None:
+            out["kill_switch"] = round(float((self.max_drawdown >= kill_drawdown).mean()), 6)
+        return out
+
+
+def simulate(
+    returns: np.ndarray,
+    risk_levels: Sequence[float],
+    simulations: int = SIMULATIONS,
+    horizon: Optional[int] = None,
+    method: str = "bootstrap",
+    ruin: float = RUIN,
+    seed: Optional[int] = None,
+) -> Dict[float, RiskProfile]:
+    """Resample ``returns`` into ``simulations`` trade sequences per risk level.
+
+    ``bootstrap`` draws ``horizon`` trades (default: as many as there are)
+    with replacement; ``permutation`` reorders all of them, so only the path,
+    not the final equity, varies. A path is ruined once equity falls to
+    ``1 - ruin`` of the starting balance.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown resampling method {method!r}")
+    returns = np.asarray(returns, dtype=np.float64)
+    m = len(returns)
+    if not m:
+        raise ValueError("no trades to resample")
+    horizon = m if method == "permutation" or horizon is None else horizon
+    rng = np.random.default_rng(seed)
+    batch = max(1, BATCH_CELLS // horizon)
+    steps = np.arange(1, horizon + 1)
+    out = {r: {"dd": [], "rec": [], "ret": [], "ruin": []} for r in risk_levels}
+
+    for start in range(0, simulations, batch):
+        size = min(batch, simulations - start)
+        if method == "bootstrap":
+            sampled = returns[rng.integers(0, m, (size, horizon))]
+        else:
+            sampled = rng.permuted(np.broadcast_to(returns, (size, m)), axis=1)
+        for risk in risk_levels:
+            # equity cannot go below zero: a position loses at most the account
+            equity = np.cumprod(np.maximum(1.0 + risk * sampled, 0.0), axis=1)
+            peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+            drawdown = 1.0 - equity / peak
+            last_peak = np.maximum.accumulate(np.where(equity >= peak, steps, 0), axis=1)
+            acc = out[risk]
+            acc["dd"].append(drawdown.max(axis=1))
+            acc["rec"].append((steps - last_peak).max(axis=1))
+            acc["ret"].append(equity[:, -1] - 1.0)
+            acc["ruin"].append(equity.min(axis=1) <= 1.0 - ruin)
+
+    return {
+        risk: RiskProfile(
+            risk,
+            np.concatenate(acc["dd"]),
+            np.concatenate(acc["rec"]),
+            np.concatenate(acc["ret"]),
+            np.concatenate(acc["ruin"]),
+        )
+        for risk, acc in out.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo drawdown and risk of ruin from a trade list")
+    parser.add_argument("--risk", default="0.005,0.01,0.02", help="comma-separated risk_pct values")
+    parser.add_argument("--sims", type=int, default=SIMULATIONS, help="simulations per risk level")
+    parser.add_argument("--horizon", type=int, help="trades per bootstrap path (default: number of trades)")
+    parser.add_argument("--method", choices=METHODS, default="bootstrap")
+    parser.add_argument("--ruin", type=float, default=RUIN, help="loss of starting capital that counts as ruin")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--backtest", action="store_true", help="take trades from a backtest of the stored candles instead of the orders table")
+    parser.add_argument("--params", metavar="FILE", help="strategy parameters for --backtest and the kill switch")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing for --backtest")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database holding orders and candles")
+    parser.add_argument("--archive", metavar="DIR", help="with --backtest, read candles from a Parquet archive")
+    parser.add_argument("--pair", default=PAIR)
+    parser.add_argument("--timeframe", default=TIMEFRAME)
+    parser.add_argument("--since", help="first candle for --backtest, ISO date")
+    parser.add_argument("--until", help="end of the --backtest range, ISO date")
+    parser.add_argument("--loglevel", default="WARNING", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.WARNING), format="%(asctime)s %(levelname)s %(message)s")
+
+    params = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    if args.backtest:
+        candles = load_candles(
+            args.db,
+            args.archive,
+            args.pair,
+            args.timeframe,
+            parse_date(args.since) if args.since else None,
+            parse_date(args.until) if args.until else None,
+        )
+        # no halt, so the whole trade list is available to resample
+        returns = trade_returns(Backtester(replace(params, max_drawdown=None), atr_method=args.atr).run(candles).trades)
+    else:
+        returns = returns_from_db(args.db, args.pair, args.timeframe)
+    risk_levels: List[float] = [float(r) for r in args.risk.split(",")]
+    started = time.perf_counter()
+    profiles = simulate(returns, risk_levels, args.sims, args.horizon, args.method, args.ruin, args.seed)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"trades": len(returns), "method": args.method, "seconds": round(seconds, 3)}))
+    for profile in profiles.values():
+        print(json.dumps(profile.summary(params.max_drawdown)))
@@ -0,0 +1,300 @@
+"""Many markets in one process.
+
+Runs the strategy on a list of ``PAIR:TIMEFRAME`` markets with one async
+exchange client, one database connection and one candle scheduler.
+Requests are paced by a :class:`request_scheduler.RequestScheduler`, which
+puts orders ahead of candle polling and shares identical reads. The
+scheduler wakes on the greatest common divisor of the timeframes; at each
+close, every market whose own candle closed then is evaluated through
+:func:`async_bot.run_tick`, with at most ``concurrency`` candle requests in
+flight. In live mode the balance is fetched once per close for all of them.
+
+Each market is a :meth:`bot.Database.market` view with its own candle
+window, running ATR, previous state and drawdown kill switch. Indicator
+contexts are cached per market in one shared cache. Each market's writes of
+a close are committed as one transaction once its candles have arrived; a
+market that fails is logged and skipped without holding up the others, and
+its writes are rolled back.
+
+Usage::
+
+    $ python multi_bot.py --paper --markets BTC/USDC:15m ETH/USDC:15m SOL/USDC:1h
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass, replace
+from functools import reduce
+from typing import List, Optional, Sequence, Tuple
+
+import ccxt
+
+from async_bot import backfill_async, make_exchange, run_tick
+from bot import (
+    BARS_LOOKBACK,
+    CANDLE_POLICY,
+    DB_FILE,
+    DEFAULT_PARAMS,
+    PAIR,
+    TIMEFRAME,
+    WINDOW_BARS,
+    BalanceService,
+    Database,
+    StrategyParams,
+    Tick,
+    backfill_policy,
+)
+from fills import FillModel
+from indicators import IndicatorCache, RunningATR
+from request_scheduler import RequestScheduler, ScheduledExchange
+from scheduler import SETTLE_SECONDS, CandleScheduler
+from validation import POLICIES
+
+CONCURRENCY = 8
+
+
+def parse_market(value: str) -> Tuple[str, str]:
+    """``"ETH/USDC:1h"`` -> ``("ETH/USDC", "1h")``."""
+    pair, sep, timeframe = value.rpartition(":")
+    if not sep or pair.count("/") != 1:
+        raise ValueError(f"expected PAIR:TIMEFRAME, got {value!r}")
+    ccxt.Exchange.parse_timeframe(timeframe)
+    return pair, timeframe
+
+
+@dataclass
+class Market:
+    """Run state of one market."""
+
+    db: Database
+    atr_engine: RunningATR
+    is_live: bool
+    prev_state: Optional[str] = None
+    peak_equity: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.db.pair}:{self.db.timeframe}"
+
+
+class MultiBot:
+    """Evaluates many markets per candle close on shared resources."""
+
+    def __init__(
+        self,
+        exchange,
+        db: Database,
+        markets: Sequence[Tuple[str, str]],
+        is_live: bool = False,
+        params: StrategyParams = DEFAULT_PARAMS,
+        fills: Optional[FillModel] = None,
+        candle_policy: str = CANDLE_POLICY,
+        atr_method: str = "simple",
+        concurrency: int = CONCURRENCY,
+        settle: float = SETTLE_SECONDS,
+    ) -> None:
+        if not markets:
+            raise ValueError("no markets to run")
+        self.exchange = exchange
+        self.db = db
+        self.params = params
+        self.fills = fills
+        self.candle_policy = candle_policy
+        self.markets: List[Market] = []
+        for pair, timeframe in markets:
+            view = db if (pair, timeframe) == (db.pair, db.timeframe) else db.market(pair, timeframe)
+            self.markets.append(Market(view, RunningATR(params.lookback, method=atr_method), is_live))
+        step = reduce(math.gcd, (m.db.timeframe_ms for m in self.markets))
+        self.scheduler = CandleScheduler(step, settle)
+        self.balances = BalanceService(fetch_async=exchange.fetch_balance)
+        self.indicators = IndicatorCache(max(len(self.markets) * 2, 64))
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def due(self, close_ts: int) -> List[Market]:
+        """Markets whose candle closes at ``close_ts``."""
+        return [m for m in self.markets if close_ts % m.db.timeframe_ms == 0]
+
+    async def catch_up(self, markets: Sequence[Market], close_ts: int) -> None:
+        """Backfill markets that fell further behind than one candle request covers.
+
+        Only candles closed by ``close_ts`` are loaded, one market at a
+        time, through the shared client.
+        """
+        now = self.exchange.milliseconds()
+        for market in markets:
+            db = market.db
+            last_ts = db.max_ts()
+            if last_ts and now - last_ts > BARS_LOOKBACK * db.timeframe_ms:
+                until = close_ts - close_ts % db.timeframe_ms
+                await backfill_async(self.exchange, db, last_ts + db.timeframe_ms, until, policy=backfill_policy(self.candle_policy))
+
+    async def evaluate(self, market: Market, close_ts: int, deadline: float) -> Optional[Tick]:
+        """Poll ``market`` until its candle closing at ``close_ts`` is served, then evaluate it."""
+        until = close_ts - close_ts % market.db.timeframe_ms
+        while True:
+            async with self.semaphore:
+                tick = await run_tick(
+                    self.exchange,
+                    market.db,
+                    market.is_live,
+                    self.params.risk_pct,
+                    market.prev_state,
+                    self.candle_policy,
+                    until,
+                    self.balances,
+                    market.atr_engine,
+                    self.indicators,
+                    self.params,
+                    self.fills,
+                    fetch_balance=False,
+                )
+            if tick or time.monotonic() + self.scheduler.poll_interval > deadline:
+                return tick
+            await asyncio.sleep(self.scheduler.poll_interval)
+
+    async def _evaluate_safely(self, market: Market, close_ts: int, deadline: float) -> Optional[Tick]:
+        try:
+            tick = await self.evaluate(market, close_ts, deadline)
+        except Exception as exc:
+            # run_tick's transaction has rolled back whatever the market wrote
+            logging.error("%s: %s", market.name, exc)
+            return None
+        if tick:
+            tick.latency_ms = self.scheduler.latency_ms(close_ts)
+            market.prev_state = tick.state
+            market.peak_equity = max(market.peak_equity or tick.equity, tick.equity)
+            drawdown = (market.peak_equity - tick.equity) / market.peak_equity
+            if self.params.max_drawdown is not None and drawdown >= self.params.max_drawdown and market.is_live:
+                logging.warning("%s: drawdown exceeded %.0f%% - disabling live trading", market.name, self.params.max_drawdown * 100)
+                market.is_live = False
+        return tick
+
+    async def tick(self, close_ts: int, markets: Optional[Sequence[Market]] = None) -> List[Tuple[Market, Optional[Tick]]]:
+        """Evaluate ``markets`` (by default those due) at their latest close by ``close_ts``.
+
+        A market's tick is ``None`` when it failed or its candle was not
+        served before the poll timeout.
+        """
+        markets = self.due(close_ts) if markets is None else list(markets)
+        if not markets:
+            return []
+        await self.catch_up(markets, close_ts)
+        deadline = time.monotonic() + self.scheduler.poll_timeout
+        # no transaction across the awaits: each market commits its own writes
+        # in run_tick, so the database is never locked while requests are out
+        if any(m.is_live for m in markets):
+            await self.balances.refresh()
+        ticks = await asyncio.gather(*(self._evaluate_safely(m, close_ts, deadline) for m in markets))
+        return list(zip(markets, ticks))
+
+    async def run(self) -> None:
+        sent = self.scheduler.clock()
+        try:
+            server = await self.exchange.fetch_time()
+        except Exception as exc:
+            logging.warning("could not read exchange time, using local clock: %s", exc)
+        else:
+            self.scheduler.set_offset(server, sent, self.scheduler.clock())
+        # evaluate every market's latest closed candle right away, then the due ones per close
+        close_ts = self.scheduler.last_close()
+        markets: Optional[List[Market]] = self.markets
+        failures = 0
+        while True:
+            try:
+                for market, tick in await self.tick(close_ts, markets):
+                    if tick:
+                        print(json.dumps({"pair": market.db.pair, "timeframe": market.db.timeframe, **asdict(tick)}))
+                    else:
+                        logging.warning("%s: no tick for the candle closing by %s", market.name, close_ts)
+                if isinstance(self.exchange, ScheduledExchange):
+                    logging.info("requests: %s", json.dumps(self.exchange.stats()))
+                failures = 0
+                markets = None
+                close_ts = self.scheduler.next_close()
+                await asyncio.sleep(self.scheduler.delay_until(close_ts))
+            except Exception as exc:
+                failures += 1
+                delay = self.scheduler.retry_delay(failures)
+                logging.error("error in main loop: %s (retrying in %.0fs)", exc, delay)
+                await asyncio.sleep(delay)
+                close_ts = self.scheduler.last_close()
+                markets = self.markets
+
+
+async def run_multi_bot(
+    markets: Sequence[Tuple[str, str]],
+    is_live: bool = False,
+    risk_pct: float = 0.01,
+    window_bars: int = WINDOW_BARS,
+    wal: bool = False,
+    candle_policy: str = CANDLE_POLICY,
+    mmap_dir: Optional[str] = None,
+    settle: float = SETTLE_SECONDS,
+    atr_method: str = "simple",
+    params: StrategyParams = DEFAULT_PARAMS,
+    fills: Optional[FillModel] = None,
+    concurrency: int = CONCURRENCY,
+    exchange=None,
+    db: Optional[Database] = None,
+    rate_share: float = 1.0,
+) -> None:
+    """Run ``markets`` until interrupted.
+
+    Requests go through a :class:`request_scheduler.RequestScheduler` with
+    ``rate_share`` of the exchange's limits, for processes sharing an account.
+    """
+    exchange = exchange or make_exchange(rate_limit=False)
+    exchange = ScheduledExchange(exchange, RequestScheduler(rate_limit_ms=exchange.rateLimit, share=rate_share))
+    if db is None:
+        pair, timeframe = markets[0]
+        db = Database(DB_FILE, window_bars, wal=wal, mmap_dir=mmap_dir, pair=pair, timeframe=timeframe)
+    params = replace(params, risk_pct=risk_pct)
+    logging.info("starting multi-market bot: %d markets live=%s %s", len(markets), is_live, params)
+    try:
+        runner = MultiBot(exchange, db, markets, is_live, params, fills, candle_policy, atr_method, concurrency, settle)
+        await runner.run()
+    finally:
+        await exchange.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot on many markets in one process")
+    parser.add_argument("--markets", nargs="+", type=parse_market, default=[(PAIR, TIMEFRAME)], metavar="PAIR:TIMEFRAME")
+    parser.add_argument("--live", action="store_true", help="place real orders")
+    parser.add_argument("--paper", action="store_true", help="paper trading mode")
+    parser.add_argument("--risk", type=float, help="risk per trade (default 0.01, or from --params)")
+    parser.add_argument("--params", metavar="FILE", help="strategy parameters as a JSON object")
+    parser.add_argument("--fills", metavar="FILE", help="paper-mode fees and slippage as a JSON object")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="candle requests in flight at once")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds to wait after each candle close")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing for stops and targets")
+    parser.add_argument("--window", type=int, default=WINDOW_BARS, help="candles kept in memory per market")
+    parser.add_argument("--wal", action="store_true", help="use WAL journaling with synchronous=NORMAL")
+    parser.add_argument("--mmap-dir", metavar="DIR", help="also keep candles in memory-mapped files here")
+    parser.add_argument("--candle-policy", choices=POLICIES, default=CANDLE_POLICY, help="how to handle bad candles")
+    parser.add_argument("--loglevel", default="INFO", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.INFO), format="%(asctime)s %(levelname)s %(message)s")
+
+    params = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    asyncio.run(run_multi_bot(
+        list(dict.fromkeys(args.markets)),
+        is_live=args.live and not args.paper,
+        risk_pct=args.risk if args.risk is not None else params.risk_pct,
+        window_bars=args.window,
+        wal=args.wal,
+        candle_policy=args.candle_policy,
+        mmap_dir=args.mmap_dir,
+        settle=args.settle,
+        atr_method=args.atr,
+        params=params,
+        fills=FillModel.load(args.fills) if args.fills else None,
+        concurrency=args.concurrency,
+    ))
@@ -0,0 +1,237 @@
+"""One scheduler for every request a process makes to the exchange.
+
+ccxt's ``enableRateLimit`` spaces calls out in the order they are made, so
+when many markets share a client an exit order can wait behind a queue of
+candle fetches. :class:`RequestScheduler` replaces it. Endpoints are grouped
+into classes: order placement, account reads (balances, orders) and market
+data (candles, tickers, time).
+
+* Each class has its own token bucket, and all of them draw on one bucket
+  for the exchange-wide limit (``rateLimit``).
+* When a request has to wait for the exchange-wide limit, the next free
+  slot goes to the most urgent class: orders, then account reads, then
+  market data.
+* An identical read already queued or in flight is not sent again; the
+  caller shares its result. Two markets needing the balance, for example,
+  cost one request. Orders are never coalesced.
+* :meth:`RequestScheduler.stats` reports each class's queue depth and waits.
+
+:class:`ScheduledExchange` wraps an async ccxt client so that its endpoint
+methods go through the scheduler and everything else passes through.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+ORDER, ACCOUNT, MARKET = "order", "account", "market"
+# most urgent first
+PRIORITY = (ORDER, ACCOUNT, MARKET)
+ENDPOINTS = {
+    "create_order": ORDER,
+    "cancel_order": ORDER,
+    "cancel_orders": ORDER,
+    "edit_order": ORDER,
+    "fetch_balance": ACCOUNT,
+    "fetch_order": ACCOUNT,
+    "fetch_orders": ACCOUNT,
+    "fetch_open_orders": ACCOUNT,
+    "fetch_closed_orders": ACCOUNT,
+    "fetch_my_trades": ACCOUNT,
+    "fetch_ohlcv": MARKET,
+    "fetch_ticker": MARKET,
+    "fetch_tickers": MARKET,
+    "fetch_order_book": MARKET,
+    "fetch_trades": MARKET,
+    "fetch_time": MARKET,
+    "load_markets": MARKET,
+}
+# requests per second and burst of each class. Coinbase allows 30/s per
+# account on the authenticated endpoints, candles included; market data is
+# capped below that so orders and balances always have headroom
+LIMITS = {ORDER: (15.0, 15), ACCOUNT: (10.0, 10), MARKET: (20.0, 20)}
+OVERALL_BURST = 10
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self) -> float:
+        """Seconds until a token is available."""
+        if math.isinf(self.rate):
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if not math.isinf(self.rate):
+            self._refill()
+            self.tokens -= 1
+
+
+@dataclass
+class EndpointStats:
+    queued: int = 0
+    max_queued: int = 0
+    requests: int = 0
+    coalesced: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "mean_wait_ms": round(self.wait_total / self.requests * 1000, 1) if self.requests else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class RequestScheduler:
+    """Rate limits, prioritises and coalesces requests; see the module docstring.
+
+    ``rate_limit_ms`` is the exchange-wide spacing (ccxt's ``rateLimit``),
+    0 for none. ``share`` scales every rate and burst (to at least one
+    request), for processes splitting one account's limits between them.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]] = LIMITS,
+        rate_limit_ms: float = 0,
+        share: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.clock = clock
+        self.buckets = {cls: TokenBucket(rate * share, max(1, burst * share), clock) for cls, (rate, burst) in limits.items()}
+        self.overall = TokenBucket(1000 / rate_limit_ms * share, max(1, OVERALL_BURST * share), clock) if rate_limit_ms else None
+        self.metrics = {cls: EndpointStats() for cls in PRIORITY}
+        self._queues: Dict[str, Deque[tuple]] = {cls: deque() for cls in PRIORITY}
+        self._in_flight: Dict[Any, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def submit(self, cls: str, call: Callable[[], Awaitable], key: Any = None) -> Any:
+        """Run ``call()`` when ``cls`` may; callers submitting the same ``key`` meanwhile share it."""
+        stats = self.metrics[cls]
+        if key is not None and key in self._in_flight:
+            stats.coalesced += 1
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._in_flight[key] = future
+        self._queues[cls].append((self.clock(), call, future, key))
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        else:
+            self._wakeup.set()
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {cls: self.metrics[cls].summary() for cls in PRIORITY}
+
+    def _next(self) -> float:
+        """Start the most urgent request allowed now, or return how long until one is."""
+        overall = self.overall.wait() if self.overall else 0.0
+        wait = math.inf
+        for cls in PRIORITY:
+            if not self._queues[cls]:
+                continue
+            if overall:
+                # nothing may start; the most urgent class gets the next slot
+                return overall
+            own = self.buckets[cls].wait()
+            if not own:
+                self._start(cls)
+                return 0.0
+            wait = min(wait, own)
+        return wait
+
+    def _start(self, cls: str) -> None:
+        queued_at, call, future, key = self._queues[cls].popleft()
+        self.buckets[cls].take()
+        if self.overall:
+            self.overall.take()
+        waited = self.clock() - queued_at
+        stats = self.metrics[cls]
+        stats.queued -= 1
+        stats.requests += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        task = asyncio.ensure_future(self._run(call, future, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, call: Callable[[], Awaitable], future: asyncio.Future, key: Any) -> None:
+        try:
+            result = await call()
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _dispatch(self) -> None:
+        try:
+            while any(self._queues.values()):
+                delay = self._next()
+                if delay:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._dispatcher = None
+
+
+class ScheduledExchange:
+    """An async ccxt client whose endpoint calls go through a :class:`RequestScheduler`."""
+
+    def __init__(self, exchange, scheduler: Optional[RequestScheduler] = None) -> None:
+        self.exchange = exchange
+        self.scheduler = scheduler or RequestScheduler(rate_limit_ms=getattr(exchange, "rateLimit", 0))
+
+    def __getattr__(self, name: str):
+        method = getattr(self.exchange, name)
+        cls = ENDPOINTS.get(name)
+        if cls is None:
+            return method
+
+        async def request(*args, **kwargs):
+            key = None
+            if cls != ORDER:
+                key = (name, args, tuple(sorted(kwargs.items())))
+                try:
+                    hash(key)
+                except TypeError:
+                    key = None
+            return await self.scheduler.submit(cls, lambda: method(*args, **kwargs), key)
+
+        return request
+
+    def stats(self) -> dict:
+        return self.scheduler.stats()
@@ -0,0 +1,159 @@
+"""On-disk, content-addressed cache of backtest and sweep results.
+
+An entry is addressed by three hashes: the strategy code that produced it
+(:func:`code_version`), its configuration (parameters, ATR method, capital,
+...) and the candles it ran on (:func:`candle_digest`). Editing the strategy,
+changing a parameter or touching a single candle therefore misses, while
+re-running an identical job is a file read.
+
+Entries for the same code and configuration are stored together, named by
+how many bars they cover, so :meth:`ResultCache.latest` can also find the
+longest cached run over a *prefix* of the current candles; resumable results
+(the event-driven :class:`backtest.Backtester`) then only simulate the bars
+appended since.
+
+The cache is bounded by :meth:`ResultCache.evict`: entries older than
+``max_age`` go first, then the least recently used until the directory is
+under ``max_bytes``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pathlib
+import pickle
+import time
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+CACHE_DIR = ".backtest_cache"
+MAX_BYTES = 1 << 30
+MAX_AGE = 30 * 86400.0
+DIGEST_COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+# modules and bot functions whose code decides a backtest's outcome
+STRATEGY_MODULES = ("backtest", "fills", "indicators", "sweep")
+STRATEGY_FUNCTIONS = ("StrategyParams", "position_size", "trail_order", "exit_signal", "entry_signal", "order_pnl")
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """Hash of the source code that backtest results depend on."""
+    import importlib
+
+    import bot
+
+    h = hashlib.blake2b(digest_size=16)
+    for name in STRATEGY_MODULES:
+        h.update(inspect.getsource(importlib.import_module(name)).encode())
+    for name in STRATEGY_FUNCTIONS:
+        h.update(inspect.getsource(getattr(bot, name)).encode())
+    return h.hexdigest()
+
+
+def candle_digest(candles, n: Optional[int] = None) -> Tuple[int, str]:
+    """``(bars, hash)`` of the first ``n`` candles (all by default)."""
+    n = len(candles["ts"]) if n is None else n
+    h = hashlib.blake2b(digest_size=16)
+    for name in DIGEST_COLUMNS:
+        dtype = np.int64 if name == "ts" else np.float64
+        h.update(np.ascontiguousarray(np.asarray(candles[name])[:n], dtype=dtype).tobytes())
+    return n, h.hexdigest()
+
+
+class ResultCache:
+    """Pickled results under ``root``, keyed by code, configuration and candles."""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE) -> None:
+        self.root = pathlib.Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def _series(self, kind: str, config: dict) -> pathlib.Path:
+        key = json.dumps({"kind": kind, "code": code_version(), "config": config}, sort_keys=True, default=str)
+        name = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return self.root / name[:2] / name
+
+    @staticmethod
+    def _entry(series: pathlib.Path, digest: Tuple[int, str]) -> pathlib.Path:
+        return series / f"{digest[0]:012d}-{digest[1]}.pkl"
+
+    def _load(self, path: pathlib.Path) -> Any:
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:  # a torn or stale entry is just a miss
+            logging.warning("dropping unreadable cache entry %s: %s", path, exc)
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # recency for eviction
+        return value
+
+    def get(self, kind: str, config: dict, digest: Tuple[int, str]) -> Any:
+        """The value stored for exactly these candles, or ``None``."""
+        value = self._load(self._entry(self._series(kind, config), digest))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def latest(self, kind: str, config: dict, candles) -> Optional[Tuple[int, Any]]:
+        """``(bars, value)`` of the longest entry over a prefix of ``candles``."""
+        series = self._series(kind, config)
+        total = len(candles["ts"])
+        if series.is_dir():
+            for path in sorted(series.glob("*.pkl"), reverse=True):
+                n = int(path.stem.split("-")[0])
+                if n > total or self._entry(series, candle_digest(candles, n)) != path:
+                    continue
+                value = self._load(path)
+                if value is not None:
+                    self.hits += 1
+                    return n, value
+        self.misses += 1
+        return None
+
+    def put(self, kind: str, config: dict, digest: Tuple[int, str], value: Any) -> None:
+        path = self._entry(self._series(kind, config), digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        # readers never see a partial file
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones over ``max_bytes``."""
+        if not self.root.is_dir():
+            return 0
+        now = time.time()
+        entries = []
+        for path in self.root.glob("*/*/*.pkl"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
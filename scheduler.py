@@ -0,0 +1,96 @@
+"""Candle-boundary aligned scheduling.
+
+Instead of sleeping a full timeframe after each tick (which drifts by the
+processing time every tick), the run loops wake at each candle close plus a
+short settle delay, measured on the exchange's clock, and poll briefly until
+the closed bar is served. Decision latency is measured from the candle
+close.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable, Optional
+
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+POLL_TIMEOUT = 60.0
+RETRY_BASE = 5.0
+
+
+class CandleScheduler:
+    def __init__(
+        self,
+        timeframe_ms: int,
+        settle: float = SETTLE_SECONDS,
+        poll_interval: float = POLL_INTERVAL,
+        poll_timeout: float = POLL_TIMEOUT,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.timeframe_ms = timeframe_ms
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.offset_ms = 0
+
+    def sync_clock(self, exchange) -> None:
+        """Estimate the exchange clock offset from ``exchange.fetch_time()``."""
+        try:
+            sent = self.clock()
+            server = exchange.fetch_time()
+            received = self.clock()
+        except Exception as exc:
+            logging.warning("could not read exchange time, using local clock: %s", exc)
+            return
+        self.set_offset(server, sent, received)
+
+    def set_offset(self, server_ms: Optional[int], sent: float, received: float) -> None:
+        """Record the exchange clock offset from a time request made between ``sent`` and ``received``."""
+        if server_ms:
+            self.offset_ms = int(server_ms - (sent + received) / 2 * 1000)
+            logging.info("exchange clock offset %d ms", self.offset_ms)
+
+    def now_ms(self) -> int:
+        return int(self.clock() * 1000) + self.offset_ms
+
+    def last_close(self, now_ms: Optional[int] = None) -> int:
+        """The most recent candle close at or before ``now_ms``."""
+        now_ms = self.now_ms() if now_ms is None else now_ms
+        return now_ms // self.timeframe_ms * self.timeframe_ms
+
+    def next_close(self, now_ms: Optional[int] = None) -> int:
+        return self.last_close(now_ms) + self.timeframe_ms
+
+    def delay_until(self, ts_ms: int) -> float:
+        """Seconds from now until ``ts_ms`` plus the settle delay."""
+        return max(0.0, (ts_ms - self.now_ms()) / 1000 + self.settle)
+
+    def wait_for_close(self) -> int:
+        """Sleep until the next candle close has settled and return its timestamp."""
+        close_ts = self.next_close()
+        self.sleep(self.delay_until(close_ts))
+        return close_ts
+
+    def retry_delay(self, failures: int) -> float:
+        """Exponential back-off after an error, never past the next close."""
+        delay = RETRY_BASE * 2 ** max(failures - 1, 0)
+        return min(delay, self.delay_until(self.next_close()))
+
+    def poll(self, fetch: Callable[[], object], ready: Callable[[object], bool]) -> tuple:
+        """Call ``fetch`` until ``ready(result)`` or the poll timeout; return ``(result, ready)``."""
+        deadline = self.clock() + self.poll_timeout
+        while True:
+            result = fetch()
+            if ready(result):
+                return result, True
+            if self.clock() + self.poll_interval > deadline:
+                return result, False
+            self.sleep(self.poll_interval)
+
+    def latency_ms(self, close_ts: int) -> int:
+        """Milliseconds elapsed since the candle close at ``close_ts``."""
+        return self.now_ms() - close_ts
@@ -0,0 +1,356 @@
+"""Markets sharded across processes, with one process writing the database.
+
+One Python process running :mod:`multi_bot` is bound to one core. This
+runner splits the markets round-robin across ``processes`` workers. Each
+worker runs a :class:`multi_bot.MultiBot` over its share with its own
+exchange client, paced to its share of the account's rate limits. A single
+writer process owns the SQLite database.
+
+A worker keeps the state its strategy reads (the candle window, the open
+orders) in a private in-memory :class:`ShardDatabase`, seeded read-only
+from the database at start. Every write it makes there (``store_candles``,
+``record_order``, ``close_order``, ``log_tick``) is also buffered. A
+worker's transaction (one per market and candle close) reaches the writer
+as a single queue message when it commits, and is discarded on rollback. The writer
+drains up to ``batch`` messages, waiting at most ``flush_ms`` for more, and
+applies them in one SQLite transaction. There is never more than one
+writer, so workers never contend for the database lock. A message the
+writer cannot apply is logged and dropped, and if the writer dies the
+workers are stopped, since nothing they did would be stored.
+
+Order ids are assigned by the workers, striding from the largest id in the
+database, so they need no round trip. No other process may write orders to
+the database while the runner is up.
+
+Usage::
+
+    $ python sharded_bot.py --paper --processes 4 --markets BTC/USDC:15m ETH/USDC:15m SOL/USDC:1h ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue as queues
+import signal
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from multiprocessing.connection import wait
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from bot import (
+    CANDLE_POLICY,
+    DB_FILE,
+    DEFAULT_PARAMS,
+    PAIR,
+    TIMEFRAME,
+    WINDOW_BARS,
+    Database,
+    Order,
+    StrategyParams,
+)
+from fills import FillModel
+from indicators import RunningATR
+from multi_bot import CONCURRENCY, parse_market, run_multi_bot
+from scheduler import SETTLE_SECONDS
+from validation import POLICIES
+
+# messages the writer applies per SQLite transaction, and how long it waits to fill a batch
+WRITE_BATCH = 256
+FLUSH_MS = 50
+# attempts at a failing transaction, and the first pause between them (doubling)
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.1
+
+
+class ShardDatabase(Database):
+    """A worker's in-memory copy of its markets that forwards writes to the writer.
+
+    Reads are served locally. Writes are applied locally too and sent to
+    ``writes`` (a queue) as one list of ``(method, pair, timeframe, args)``
+    per committed transaction. Tick logs are only sent, since nothing reads
+    them back.
+    """
+
+    def __init__(
+        self,
+        writes,
+        source: str = DB_FILE,
+        order_ids: Optional[Iterator[int]] = None,
+        window_bars: int = WINDOW_BARS,
+        pair: str = PAIR,
+        timeframe: str = TIMEFRAME,
+    ) -> None:
+        self.writes = writes
+        self.source = source
+        self.order_ids = order_ids or itertools.count(1)
+        self._pending: List[tuple] = []
+        super().__init__(":memory:", window_bars, pair=pair, timeframe=timeframe)
+
+    def _open_market(self, pair: str, timeframe: str, window_bars: int, mmap_dir: Optional[str]) -> None:
+        # seed the window and the open orders from the shared database
+        con = sqlite3.connect(f"file:{self.source}?mode=ro", uri=True)
+        try:
+            candles = con.execute(
+                "SELECT * FROM candles WHERE pair=? AND timeframe=? ORDER BY ts DESC LIMIT ?",
+                (pair, timeframe, window_bars),
+            ).fetchall()
+            orders = con.execute(
+                "SELECT id, ts, side, price, amount, stop, target, status, pair, timeframe FROM orders "
+                "WHERE status='open' AND pair=? AND timeframe=?",
+                (pair, timeframe),
+            ).fetchall()
+        finally:
+            con.close()
+        self.cur.executemany("INSERT OR IGNORE INTO candles VALUES (?,?,?,?,?,?,?,?)", candles)
+        self.cur.executemany("INSERT OR REPLACE INTO orders VALUES (?,?,?,?,?,?,?,?,?,?)", orders)
+        self.con.commit()
+        super()._open_market(pair, timeframe, window_bars, None)
+
+    def _send(self, method: str, *args) -> None:
+        self._pending.append((method, self.pair, self.timeframe, args))
+        self._commit()
+
+    def _commit(self) -> None:
+        super()._commit()
+        if not self._session.depth and self._pending:
+            self.writes.put(list(self._pending))
+            self._pending.clear()
+
+    @contextmanager
+    def transaction(self) -> Iterator["ShardDatabase"]:
+        try:
+            with super().transaction():
+                yield self
+        except BaseException:
+            if not self._session.depth:
+                self._pending.clear()
+            raise
+        self._commit()
+
+    def store_candles(self, bars: List[list]) -> None:
+        bars = [list(b) for b in bars]
+        super().store_candles(bars)
+        self._send("store_candles", bars)
+
+    def record_order(self, order: Order) -> None:
+        if order.id is None:
+            order = replace(order, id=next(self.order_ids))
+        super().record_order(order)
+        self._send("record_order", order)
+
+    def close_order(self, order_id: int, ts: int) -> None:
+        super().close_order(order_id, ts)
+        self._send("close_order", order_id, ts)
+
+    def log_tick(self, ts: int, state: str, decision: str, pnl: float, equity: float) -> None:
+        self._send("log_tick", ts, state, decision, pnl, equity)
+
+
+def apply_writes(db: Database, messages: Sequence[list], views: Dict[Tuple[str, str], Database]) -> int:
+    """Apply the writes of ``messages`` in one transaction; returns how many there were."""
+    count = 0
+    with db.transaction():
+        for writes in messages:
+            for method, pair, timeframe, args in writes:
+                view = views.get((pair, timeframe))
+                if view is None:
+                    view = views[pair, timeframe] = db.market(pair, timeframe, window_bars=1)
+                getattr(view, method)(*args)
+            count += len(writes)
+    return count
+
+
+def write_batches(db: Database, writes, batch: int = WRITE_BATCH, flush_ms: float = FLUSH_MS) -> dict:
+    """Apply messages from ``writes`` in batches until a ``None`` arrives; returns statistics.
+
+    A batch that keeps failing is rolled back and its messages applied one
+    at a time, so that one bad message cannot stop the writer; a message
+    that still fails is logged and dropped ("quarantined").
+    """
+    views = {(db.pair, db.timeframe): db}
+    stats = {"messages": 0, "writes": 0, "commits": 0, "max_batch": 0, "quarantined": 0}
+    done = False
+    while not done:
+        message = writes.get()
+        if message is None:
+            break
+        messages = [message]
+        deadline = time.monotonic() + flush_ms / 1000
+        while len(messages) < batch:
+            try:
+                message = writes.get(timeout=max(deadline - time.monotonic(), 0))
+            except queues.Empty:
+                break
+            if message is None:
+                done = True
+                break
+            messages.append(message)
+        _apply_batch(db, messages, views, stats)
+        stats["messages"] += len(messages)
+        stats["max_batch"] = max(stats["max_batch"], len(messages))
+    return stats
+
+
+def _apply_batch(db: Database, messages: List[list], views: Dict[Tuple[str, str], Database], stats: dict) -> None:
+    """:func:`apply_writes` with retries, then message by message, then quarantine."""
+    for attempt in range(WRITE_RETRIES):
+        if attempt:
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            stats["writes"] += apply_writes(db, messages, views)
+        except Exception as exc:
+            # the transaction has been rolled back
+            logging.warning("writing %d messages failed (attempt %d of %d): %s", len(messages), attempt + 1, WRITE_RETRIES, exc)
+        else:
+            stats["commits"] += 1
+            return
+    if len(messages) > 1:
+        for message in messages:
+            _apply_batch(db, [message], views, stats)
+        return
+    stats["quarantined"] += 1
+    logging.error("quarantined a message that failed %d times: %r", WRITE_RETRIES, messages[0])
+
+
+def _writer_main(db_file: str, writes, wal: bool, batch: int, flush_ms: float, loglevel: str) -> None:
+    # ^C reaches the whole process group; keep writing until the workers are gone
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=getattr(logging, loglevel.upper(), logging.INFO), format="%(asctime)s %(levelname)s writer %(message)s")
+    try:
+        db = Database(db_file, window_bars=1, wal=wal)
+        stats = write_batches(db, writes, batch, flush_ms)
+    except Exception:
+        # the runner sees the exit code and stops the workers
+        logging.exception("writer failed")
+        raise
+    db.con.close()
+    logging.info("wrote %(writes)d writes from %(messages)d messages in %(commits)d commits, %(quarantined)d quarantined", stats)
+
+
+def _shard_main(
+    index: int,
+    shards: int,
+    markets: List[Tuple[str, str]],
+    first_id: int,
+    writes,
+    db_file: str,
+    loglevel: str,
+    options: dict,
+) -> None:
+    logging.basicConfig(
+        level=getattr(logging, loglevel.upper(), logging.INFO), format=f"%(asctime)s %(levelname)s shard {index} %(message)s"
+    )
+    pair, timeframe = markets[0]
+    db = ShardDatabase(writes, db_file, itertools.count(first_id + index, shards), options["window_bars"], pair, timeframe)
+    try:
+        asyncio.run(run_multi_bot(markets, db=db, **options))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_sharded(
+    markets: Sequence[Tuple[str, str]],
+    processes: int = os.cpu_count() or 1,
+    db_file: str = DB_FILE,
+    wal: bool = True,
+    batch: int = WRITE_BATCH,
+    flush_ms: float = FLUSH_MS,
+    loglevel: str = "INFO",
+    **options,
+) -> None:
+    """Run ``markets`` on ``processes`` workers and one writer until interrupted.
+
+    ``options`` are passed on to :func:`multi_bot.run_multi_bot`.
+    """
+    processes = max(1, min(processes, len(markets)))
+    # create or migrate the schema before anyone reads it
+    db = Database(db_file, window_bars=1, wal=wal)
+    first_id = (db.cur.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0) + 1
+    db.con.close()
+
+    ctx = multiprocessing.get_context("spawn")
+    writes = ctx.Queue()
+    writer = ctx.Process(target=_writer_main, args=(db_file, writes, wal, batch, flush_ms, loglevel), name="writer")
+    writer.start()
+    options = dict(options, window_bars=options.get("window_bars", WINDOW_BARS))
+    workers = [
+        ctx.Process(
+            target=_shard_main,
+            args=(i, processes, list(markets[i::processes]), first_id, writes, db_file, loglevel, dict(options, rate_share=1 / processes)),
+            name=f"shard-{i}",
+        )
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logging.info("running %d markets on %d processes", len(markets), processes)
+    running = {worker.sentinel: worker for worker in workers}
+    try:
+        while running:
+            ready = wait([*running, writer.sentinel])
+            if writer.sentinel in ready:
+                # nothing a worker does from now on would be stored
+                writer.join()
+                logging.critical("database writer exited with code %s; stopping the workers", writer.exitcode)
+                for worker in running.values():
+                    worker.terminate()
+                    worker.join()
+                raise RuntimeError("database writer stopped")
+            for sentinel in ready:
+                running.pop(sentinel).join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+    finally:
+        if writer.is_alive():
+            writes.put(None)
+            writer.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot on many markets across processes with one database writer")
+    parser.add_argument("--markets", nargs="+", type=parse_market, default=[(PAIR, TIMEFRAME)], metavar="PAIR:TIMEFRAME")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--batch", type=int, default=WRITE_BATCH, help="worker messages per database transaction")
+    parser.add_argument("--flush-ms", type=float, default=FLUSH_MS, help="longest the writer waits to fill a batch")
+    parser.add_argument("--live", action="store_true", help="place real orders")
+    parser.add_argument("--paper", action="store_true", help="paper trading mode")
+    parser.add_argument("--risk", type=float, help="risk per trade (default 0.01, or from --params)")
+    parser.add_argument("--params", metavar="FILE", help="strategy parameters as a JSON object")
+    parser.add_argument("--fills", metavar="FILE", help="paper-mode fees and slippage as a JSON object")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="candle requests in flight at once per worker")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds to wait after each candle close")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing for stops and targets")
+    parser.add_argument("--window", type=int, default=WINDOW_BARS, help="candles kept in memory per market")
+    parser.add_argument("--no-wal", dest="wal", action="store_false", help="use the rollback journal instead of WAL")
+    parser.add_argument("--candle-policy", choices=POLICIES, default=CANDLE_POLICY, help="how to handle bad candles")
+    parser.add_argument("--loglevel", default="INFO", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.INFO), format="%(asctime)s %(levelname)s %(message)s")
+
+    params = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    run_sharded(
+        list(dict.fromkeys(args.markets)),
+        processes=args.processes,
+        wal=args.wal,
+        batch=args.batch,
+        flush_ms=args.flush_ms,
+        loglevel=args.loglevel,
+        is_live=args.live and not args.paper,
+        risk_pct=args.risk if args.risk is not None else params.risk_pct,
+        window_bars=args.window,
+        candle_policy=args.candle_policy,
+        settle=args.settle,
+        atr_method=args.atr,
+        params=params,
+        fills=FillModel.load(args.fills) if args.fills else None,
+        concurrency=args.concurrency,
+    )
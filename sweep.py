@@ -0,0 +1,308 @@
+"""Parallel parameter sweeps over the vectorised backtest.
+
+The candle columns the strategy reads are copied once into a shared-memory
+block; worker processes attach to it by name instead of receiving a pickled
+DataFrame with every task. Each worker keeps the :class:`backtest.Features`
+it has built, and tasks are ordered so that configurations sharing a regime
+setting (``lookback``, ``atr_factor``) land on the same worker one after
+another. Ranked results are written to SQLite.
+
+Usage::
+
+    $ python sweep.py --grid lookback=14,20,30 atr_factor=1.0,1.01,1.05 risk_pct=0.005,0.01
+    $ python sweep.py --archive archive/ --random 2000 --grid stop_atr=0.5:3 target_atr=0.5:3
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields, replace
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backtest import CAPITAL, Features, load_candles, vectorised_backtest
+from bot import DB_FILE, DEFAULT_PARAMS, PAIR, TIMEFRAME, StrategyParams, parse_date
+from fills import FillModel
+from indicators import RunningATR
+from result_cache import CACHE_DIR, ResultCache, candle_digest
+
+RESULTS_DB = "sweeps.db"
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+FEATURE_CACHE = 8
+RANKINGS = {
+    "pnl": lambda r: r["pnl"],
+    "pnl_per_drawdown": lambda r: r["pnl"] / max(r["drawdown"], 1e-9),
+    "win_rate": lambda r: r["win_rate"],
+}
+PARAM_COLUMNS = tuple(f.name for f in fields(StrategyParams))
+# result column -> BacktestResult.summary() key; "drawdown" is the one reached
+METRICS = {
+    "trades": "trades",
+    "win_rate": "win_rate",
+    "pnl": "pnl",
+    "final_equity": "final_equity",
+    "drawdown": "max_drawdown",
+    "halted_at": "halted_at",
+}
+METRIC_COLUMNS = tuple(METRICS)
+INTEGER_COLUMNS = ("lookback", "trades", "halted_at")
+
+RESULTS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sweep_results (
+    sweep_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    {", ".join(f"{name} {'INTEGER' if name in INTEGER_COLUMNS else 'REAL'}" for name in PARAM_COLUMNS + METRIC_COLUMNS)},
+    PRIMARY KEY (sweep_id, rank)
+) WITHOUT ROWID
+"""
+
+
+class SharedCandles:
+    """The :data:`COLUMNS` of the candles in one shared-memory block.
+
+    Create it in the parent; workers call :meth:`attach` with :attr:`spec`.
+    """
+
+    def __init__(self, candles) -> None:
+        n = len(candles["ts"])
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8 * len(COLUMNS)))
+        self.spec = (self.shm.name, n)
+        for name, view in _columns(self.shm, n).items():
+            view[:] = np.asarray(candles[name])
+
+    @staticmethod
+    def attach(spec: tuple) -> tuple:
+        """Return ``(shm, columns)``; keep ``shm`` referenced while using the arrays."""
+        name, n = spec
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, _columns(shm, n)
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedCandles":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _columns(shm: shared_memory.SharedMemory, n: int) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(n, dtype=np.int64 if name == "ts" else np.float64, buffer=shm.buf, offset=i * n * 8)
+        for i, name in enumerate(COLUMNS)
+    }
+
+
+def grid(space: Dict[str, Sequence], base: StrategyParams = DEFAULT_PARAMS) -> List[StrategyParams]:
+    """Every combination of the values in ``space``, other fields as in ``base``."""
+    names = list(space)
+    return [replace(base, **dict(zip(names, values))) for values in itertools.product(*space.values())]
+
+
+def random_search(
+    space: Dict[str, object],
+    n: int,
+    seed: Optional[int] = None,
+    base: StrategyParams = DEFAULT_PARAMS,
+) -> List[StrategyParams]:
+    """``n`` random configurations, other fields as in ``base``.
+
+    A list in ``space`` is sampled uniformly from its values, a ``(low, high)``
+    tuple uniformly from that interval (integers if both ends are).
+    """
+    rng = np.random.default_rng(seed)
+    draws = {}
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                draws[name] = rng.integers(low, high + 1, n).tolist()
+            else:
+                draws[name] = rng.uniform(low, high, n).tolist()
+        else:
+            draws[name] = [values[i] for i in rng.integers(0, len(values), n)]
+    return [replace(base, **{name: draws[name][i] for name in space}) for i in range(n)]
+
+
+_shm: Optional[shared_memory.SharedMemory] = None
+_candles: Dict[str, np.ndarray] = {}
+_features: Dict[tuple, Features] = {}
+_cache_size = FEATURE_CACHE
+_atr_method = "simple"
+_capital = CAPITAL
+_fills: Optional[FillModel] = None
+
+
+def _init_worker(
+    spec: tuple,
+    atr_method: str,
+    capital: float,
+    cache_size: int = FEATURE_CACHE,
+    fills: Optional[FillModel] = None,
+) -> None:
+    global _shm, _candles, _atr_method, _capital, _cache_size, _fills
+    _shm, _candles = SharedCandles.attach(spec)
+    _atr_method, _capital, _cache_size, _fills = atr_method, capital, cache_size, fills
+    _features.clear()
+
+
+def _features_for(params: StrategyParams) -> Features:
+    """Whole-history features for ``params`` in this worker, built once per regime setting."""
+    key = (params.lookback, params.atr_factor)
+    features = _features.get(key)
+    if features is None:
+        if len(_features) >= _cache_size:
+            _features.pop(next(iter(_features)))
+        features = _features[key] = Features.from_candles(_candles, params, _atr_method)
+    return features
+
+
+def result_row(params: StrategyParams, summary: dict) -> dict:
+    """Parameters and metrics of one backtest, keyed by result column."""
+    return {**asdict(params), **{column: summary[key] for column, key in METRICS.items()}}
+
+
+def _evaluate(params: StrategyParams) -> dict:
+    return result_row(params, vectorised_backtest(_features_for(params), params, _capital, _fills).summary())
+
+
+def run_sweep(
+    candles,
+    configs: Sequence[StrategyParams],
+    workers: Optional[int] = None,
+    rank_by: str = "pnl",
+    atr_method: str = "simple",
+    capital: float = CAPITAL,
+    cache: Optional[ResultCache] = None,
+    fills: Optional[FillModel] = None,
+) -> List[dict]:
+    """Backtest every configuration across a process pool; best first.
+
+    With ``cache``, configurations already run on these candles are read
+    back and only the rest go to the pool. ``fills`` prices every trade
+    with its fees and slippage.
+    """
+    rows: List[dict] = []
+    todo = list(configs)
+    if cache is not None:
+        digest = candle_digest(candles)
+        costs = asdict(fills) if fills is not None else None
+        key = lambda p: {"params": asdict(p), "capital": capital, "atr_method": atr_method, "fills": costs}
+        todo = []
+        for params in configs:
+            row = cache.get("sweep", key(params), digest)
+            if row is None:
+                todo.append(params)
+            else:
+                rows.append(row)
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        # neighbouring tasks share Features when they share the regime setting
+        ordered = sorted(todo, key=lambda p: (p.lookback, p.atr_factor))
+        chunksize = max(1, math.ceil(len(ordered) / (workers * 4)))
+        with SharedCandles(candles) as shared:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.spec, atr_method, capital, FEATURE_CACHE, fills)) as pool:
+                computed = list(pool.map(_evaluate, ordered, chunksize=chunksize))
+        if cache is not None:
+            for params, row in zip(ordered, computed):
+                cache.put("sweep", key(params), digest, row)
+        rows.extend(computed)
+    return sorted(rows, key=RANKINGS[rank_by], reverse=True)
+
+
+def save_results(rows: List[dict], db_file: str = RESULTS_DB, sweep_id: Optional[str] = None) -> str:
+    """Store ranked ``rows`` under a new sweep id and return it."""
+    sweep_id = sweep_id or time.strftime("%Y%m%dT%H%M%S-") + uuid.uuid4().hex[:6]
+    names = PARAM_COLUMNS + METRIC_COLUMNS
+    con = sqlite3.connect(db_file)
+    with con:
+        con.execute(RESULTS_SCHEMA)
+        con.executemany(
+            f"INSERT INTO sweep_results (sweep_id, rank, {', '.join(names)}) VALUES ({', '.join('?' * (len(names) + 2))})",
+            [(sweep_id, rank, *(row[name] for name in names)) for rank, row in enumerate(rows, 1)],
+        )
+    con.close()
+    return sweep_id
+
+
+def parse_space(items: Sequence[str], ranges: bool) -> Dict[str, object]:
+    """Parse ``name=v1,v2,...`` (and, with ``ranges``, ``name=low:high``) items."""
+    types = {f.name: (int if f.name == "lookback" else float) for f in fields(StrategyParams)}
+    space: Dict[str, object] = {}
+    for item in items:
+        name, _, spec = item.partition("=")
+        if name not in types:
+            raise ValueError(f"unknown strategy parameter {name!r}")
+        cast = types[name]
+        if ":" in spec:
+            if not ranges:
+                raise ValueError(f"{name}: low:high ranges need --random")
+            low, high = spec.split(":")
+            space[name] = (cast(low), cast(high))
+        else:
+            space[name] = [cast(v) for v in spec.split(",")]
+    return space
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep strategy parameters with the vectorised backtest")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=VALUES", help="values per parameter: v1,v2,... or low:high with --random")
+    parser.add_argument("--random", type=int, metavar="N", help="sample N configurations instead of the full grid")
+    parser.add_argument("--seed", type=int, help="random search seed")
+    parser.add_argument("--params", metavar="FILE", help="base parameters as a JSON object")
+    parser.add_argument("--rank-by", choices=RANKINGS, default="pnl")
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--out", default=RESULTS_DB, help="SQLite file for ranked results")
+    parser.add_argument("--cache", default=CACHE_DIR, metavar="DIR", help="result cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="always simulate")
+    parser.add_argument("--top", type=int, default=10, help="results to print")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database holding candles")
+    parser.add_argument("--archive", metavar="DIR", help="read candles from a Parquet archive instead")
+    parser.add_argument("--pair", default=PAIR)
+    parser.add_argument("--timeframe", default=TIMEFRAME)
+    parser.add_argument("--since", help="first candle, ISO date")
+    parser.add_argument("--until", help="end of the range, ISO date")
+    parser.add_argument("--capital", type=float, default=CAPITAL, help="starting USDC balance")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing")
+    parser.add_argument("--fills", metavar="FILE", help="fees and slippage as a JSON object (default: free fills at the close)")
+    parser.add_argument("--loglevel", default="WARNING", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.WARNING), format="%(asctime)s %(levelname)s %(message)s")
+
+    base = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    space = parse_space(args.grid, ranges=args.random is not None)
+    configs = random_search(space, args.random, args.seed, base) if args.random else grid(space, base)
+    candles = load_candles(
+        args.db,
+        args.archive,
+        args.pair,
+        args.timeframe,
+        parse_date(args.since) if args.since else None,
+        parse_date(args.until) if args.until else None,
+    )
+    started = time.perf_counter()
+    cache = None if args.no_cache else ResultCache(args.cache)
+    fills = FillModel.load(args.fills) if args.fills else None
+    rows = run_sweep(candles, configs, args.workers, args.rank_by, args.atr, args.capital, cache, fills)
+    seconds = time.perf_counter() - started
+    if cache:
+        cache.evict()
+    sweep_id = save_results(rows, args.out)
+    cached = cache.stats()["hits"] if cache else 0
+    print(json.dumps({"sweep_id": sweep_id, "configs": len(rows), "cached": cached, "bars": len(candles), "seconds": round(seconds, 3)}))
+    for row in rows[:args.top]:
+        print(json.dumps(row))
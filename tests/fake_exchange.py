@@ -0,0 +1,52 @@
+"""In-process stand-in for the ccxt async client used by the tests."""
+
+import asyncio
+
+
+class FakeAsyncExchange:
+    rateLimit = 0
+
+    def __init__(self, bars, balance=None, latency=0.0):
+        # one list of bars for every market, or a list per pair
+        self.bars = bars
+        self.balance = balance or {"total": {"USDC": 1000.0, "BTC": 0.0}}
+        self.latency = latency
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    def bars_of(self, pair):
+        return self.bars[pair] if isinstance(self.bars, dict) else self.bars
+
+    def milliseconds(self):
+        series = self.bars.values() if isinstance(self.bars, dict) else [self.bars]
+        return max((bars[-1][0] for bars in series if bars), default=0)
+
+    async def fetch_time(self):
+        return self.milliseconds()
+
+    async def fetch_ohlcv(self, pair, timeframe, since=None, limit=None):
+        self.calls.append("fetch_ohlcv")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        bars = [b for b in self.bars_of(pair) if since is None or b[0] >= since]
+        return [list(b) for b in bars[:limit]]
+
+    async def fetch_balance(self):
+        self.calls.append("fetch_balance")
+        await asyncio.sleep(self.latency)
+        return self.balance
+
+    async def create_order(self, pair, type, side, amount, price=None):
+        self.calls.append("create_order")
+        order = {"id": str(len(self.calls)), "symbol": pair, "side": side, "amount": amount}
+        await asyncio.sleep(self.latency)
+        return order
+
+    async def close(self):
+        self.closed = True
@@ -0,0 +1,48 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import pandas as pd
+from archive import load_candles
+from bot import Database, PAIR, TIMEFRAME, TIMEFRAME_MS
+
+JAN_1_2024 = 1_704_067_200_000
+
+
+def test_parquet_round_trip(tmp_path):
+    db = Database(str(tmp_path / "live.db"))
+    bars = [[JAN_1_2024 + i * TIMEFRAME_MS * 96, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, float(i)] for i in range(70)]
+    db.store_candles(bars)
+    root = tmp_path / "archive"
+    assert db.export_parquet(str(root)) == 70
+    months = sorted(p.name for p in root.glob("pair=BTC-USDC/timeframe=15m/*.parquet"))
+    assert months == ["month=2024-01.parquet", "month=2024-02.parquet", "month=2024-03.parquet"]
+
+    # re-exporting merges instead of duplicating
+    db.export_parquet(str(root))
+    pd.testing.assert_frame_equal(load_candles(str(root), PAIR, TIMEFRAME), db.candles_dataframe())
+
+    fresh = Database(str(tmp_path / "research.db"))
+    assert fresh.import_parquet(str(root)) == 70
+    pd.testing.assert_frame_equal(fresh.candles_dataframe(), db.candles_dataframe())
+    assert fresh.window.last_ts == bars[-1][0]
+
+
+def test_load_candles_selects_columns_and_range(tmp_path):
+    db = Database(str(tmp_path / "live.db"))
+    bars = [[JAN_1_2024 + i * TIMEFRAME_MS * 96, 1.0, 2.0, 0.5, float(i), 1.0] for i in range(70)]
+    db.store_candles(bars)
+    db.export_parquet(str(tmp_path / "archive"))
+    start, end = bars[40][0], bars[45][0]
+    df = load_candles(str(tmp_path / "archive"), PAIR, TIMEFRAME, columns=["close"], start=start, end=end)
+    assert list(df.columns) == ["close"]
+    assert list(df["close"]) == [40.0, 41.0, 42.0, 43.0, 44.0]
+    assert load_candles(str(tmp_path / "archive"), "ETH/USDC", TIMEFRAME).empty
+
+
+def test_market_views_archive_their_own_market(tmp_path):
+    db = Database(str(tmp_path / "live.db"))
+    eth = db.market("ETH/USDC", "1h")
+    eth.store_candles([[JAN_1_2024 + i * 3_600_000, 1.0, 2.0, 0.5, 1.5, 1.0] for i in range(5)])
+    root = str(tmp_path / "archive")
+    assert eth.export_parquet(root) == 5 and db.export_parquet(root) == 0
+    fresh = Database(str(tmp_path / "research.db")).market("ETH/USDC", "1h")
+    assert fresh.import_parquet(root) == 5 and len(fresh.window) == 5
@@ -0,0 +1,81 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import asyncio
+import time
+
+from async_bot import run_tick
+from bot import Database, TIMEFRAME_MS
+from fake_exchange import FakeAsyncExchange
+
+
+def make_bars(n):
+    return [[i * TIMEFRAME_MS, 100.0 + i, 101.0 + i, 99.0 + i, 100.0 + i, 1.0] for i in range(n)]
+
+
+def test_tick_requests_run_concurrently(tmp_path):
+    exchange = FakeAsyncExchange(make_bars(30), latency=0.2)
+    db = Database(str(tmp_path / "async.db"))
+    start = time.perf_counter()
+    tick = asyncio.run(run_tick(exchange, db, is_live=True, risk_pct=0.01))
+    elapsed = time.perf_counter() - start
+    assert sorted(exchange.calls) == ["fetch_balance", "fetch_ohlcv"]
+    assert elapsed < 0.35  # one round trip, not two
+    assert tick.ts == 29 * TIMEFRAME_MS and tick.equity == 1000.0
+    assert db.max_ts() == tick.ts
+
+
+def test_paper_tick_skips_balance(tmp_path):
+    exchange = FakeAsyncExchange(make_bars(30))
+    db = Database(str(tmp_path / "async.db"))
+    db.store_candles(make_bars(25))
+    tick = asyncio.run(run_tick(exchange, db, is_live=False, risk_pct=0.01))
+    assert exchange.calls == ["fetch_ohlcv"]
+    assert tick.ts == 29 * TIMEFRAME_MS
+    assert db.cur.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 1
+
+
+def test_tick_waits_for_closed_bar(tmp_path):
+    bars = make_bars(30)
+    exchange = FakeAsyncExchange(bars)
+    db = Database(str(tmp_path / "async.db"))
+    # the last served bar is still forming at this close, the one before it is not served yet
+    close_ts = 29 * TIMEFRAME_MS
+    del bars[-2]
+    assert asyncio.run(run_tick(exchange, db, False, 0.01, until=close_ts)) is None
+    assert db.max_ts() == 27 * TIMEFRAME_MS  # forming bar not stored
+
+    bars.insert(-1, [28 * TIMEFRAME_MS, 128.0, 129.0, 127.0, 128.0, 1.0])
+    tick = asyncio.run(run_tick(exchange, db, False, 0.01, until=close_ts))
+    assert tick.ts == 28 * TIMEFRAME_MS
+
+
+def test_loop_fetches_the_balance_once_per_tick(tmp_path, monkeypatch):
+    import async_bot
+    import bot
+
+    monkeypatch.setattr(bot, "exchange", None)  # the blocking client must not be touched
+    monkeypatch.setattr(async_bot, "DB_FILE", str(tmp_path / "loop.db"))
+    bars = make_bars(60)
+    closing = bars.pop(-2)
+    exchange = FakeAsyncExchange(bars)
+    real_sleep = asyncio.sleep
+    polls = []
+
+    async def sleep(delay):
+        if delay == 1.0:  # a poll interval: the closing bar is served on the third poll
+            polls.append(delay)
+            if len(polls) == 2:
+                bars.insert(-1, closing)
+            return await real_sleep(0)
+        if delay:
+            raise KeyboardInterrupt
+        return await real_sleep(0)
+
+    monkeypatch.setattr(async_bot.asyncio, "sleep", sleep)
+    try:
+        asyncio.run(async_bot.run_bot_async(is_live=True, settle=0, exchange=exchange))
+    except KeyboardInterrupt:
+        pass
+    assert exchange.calls.count("fetch_ohlcv") == 3
+    assert exchange.calls.count("fetch_balance") == 2  # at start, then with the tick's first request
+    assert exchange.closed
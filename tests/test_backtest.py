@@ -0,0 +1,135 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pytest
+from backtest import Backtester, Features, load_candles, vectorised_backtest
+from bot import BalanceService, Database, StrategyParams, label_state, trade_logic
+from test_indicators import random_history
+
+
+def reference_run(df, db, monkeypatch, params=StrategyParams(), capital=1000.0):
+    """The live code path: label_state and trade_logic per bar on a real Database.
+
+    The stubbed exchange balance is credited as soon as an order closes, so
+    a same-bar re-entry is sized from it as it would be live.
+    """
+    import bot
+
+    wallet = {"USDC": capital}
+    realise = bot.order_pnl
+
+    def order_pnl(order, price):
+        pnl = realise(order, price)
+        wallet["USDC"] += pnl
+        return pnl
+
+    monkeypatch.setattr(bot, "order_pnl", order_pnl)
+    prev_state = None
+    for t in range(len(df)):
+        window = df.iloc[max(0, t - 40):t + 1]
+        state = label_state(window, params=params)
+        balances = BalanceService(ttl=0, fetch=lambda: {"total": dict(wallet)})
+        trade_logic(db, window, state, True, params.risk_pct, prev_state, balances, params=params)
+        prev_state = state
+    return wallet["USDC"]
+
+
+def test_backtest_matches_live_trade_logic(tmp_path, monkeypatch):
+    df = random_history(3000, 11)
+    db = Database(str(tmp_path / "reference.db"))
+    cash = reference_run(df, db, monkeypatch)
+    expected = db.cur.execute("SELECT ts, side, price, amount, status FROM orders ORDER BY id").fetchall()
+
+    bt = Backtester(StrategyParams(max_drawdown=None))
+    result = bt.run(df)
+    closed = [(t.exit_ts, t.side, t.entry_price, t.amount, "closed") for t in result.trades]
+    if bt.order is not None:
+        closed.append((bt.order.ts, bt.order.side, bt.order.price, bt.order.amount, "open"))
+    assert len(result.trades) > 20
+    assert [c[:2] + c[4:] for c in closed] == [e[:2] + e[4:] for e in expected]
+    assert [c[2:4] for c in closed] == pytest.approx([e[2:4] for e in expected])
+    assert bt.cash == pytest.approx(cash)
+    stored = bt.db.cur.execute("SELECT COUNT(*) FROM orders WHERE status='closed'").fetchone()[0]
+    assert stored == len(result.trades)
+
+
+def test_equity_drawdown_and_incremental_runs():
+    df = random_history(5000, 12)
+    full = Backtester(StrategyParams(max_drawdown=None))
+    whole = full.run(df)
+    assert len(whole.equity) == len(df)
+    assert full.cash == pytest.approx(1000.0 + whole.total_pnl)
+    assert whole.max_drawdown == pytest.approx(np.max(1 - whole.equity / np.maximum.accumulate(whole.equity)))
+
+    bt = Backtester(StrategyParams(max_drawdown=None))
+    bt.run(df.iloc[:2000])
+    extended = bt.run(df)  # only the new 3000 bars are simulated
+    np.testing.assert_array_equal(extended.equity, whole.equity)
+    assert [t.exit_ts for t in extended.trades] == [t.exit_ts for t in whole.trades]
+
+
+def test_drawdown_halt_stops_new_entries():
+    df = random_history(5000, 13)
+    result = Backtester(StrategyParams(risk_pct=5.0, max_drawdown=0.05)).run(df)
+    assert result.halted_at is not None
+    assert all(t.entry_ts <= result.halted_at for t in result.trades)
+
+
+@pytest.mark.parametrize("seed, rounded, atr_method, risk_pct, max_drawdown", [
+    (21, False, "simple", 0.01, None),
+    (22, True, "simple", 0.01, 0.10),
+    (23, False, "wilder", 0.5, 0.10),
+    (24, True, "wilder", 5.0, 0.05),
+])
+def test_vectorised_backtest_matches_event_driven(seed, rounded, atr_method, risk_pct, max_drawdown):
+    df = random_history(8000, seed, rounded)
+    params = StrategyParams(risk_pct=risk_pct, max_drawdown=max_drawdown)
+    expected = Backtester(params, atr_method=atr_method).run(df)
+    result = vectorised_backtest(Features.from_candles(df, params, atr_method), params)
+    assert len(expected.trades) > 0
+    # the running ATR sum can differ from a windowed mean in the last bits
+    assert [(t.entry_ts, t.exit_ts, t.side) for t in result.trades] == [(t.entry_ts, t.exit_ts, t.side) for t in expected.trades]
+    numbers = lambda trades: [(t.entry_price, t.exit_price, t.amount, t.stop, t.target, t.pnl) for t in trades]
+    np.testing.assert_allclose(numbers(result.trades), numbers(expected.trades), rtol=1e-12)
+    assert result.halted_at == expected.halted_at
+    np.testing.assert_array_equal(result.ts, expected.ts)
+    np.testing.assert_allclose(result.equity, expected.equity, rtol=0, atol=1e-9)
+
+
+def test_vectorised_backtest_without_trades():
+    df = random_history(10, 0)
+    result = vectorised_backtest(Features.from_candles(df))
+    assert result.trades == []
+    np.testing.assert_array_equal(result.equity, np.full(10, 1000.0))
+
+
+def test_strategy_params_reach_every_path(tmp_path, monkeypatch):
+    params = StrategyParams(lookback=14, atr_factor=1.2, entry_band=0.2, stop_atr=1.5, target_atr=2.0, risk_pct=0.02, max_drawdown=None)
+    df = random_history(1500, 25)
+    db = Database(str(tmp_path / "reference.db"))
+    reference_run(df, db, monkeypatch, params)
+    expected = db.cur.execute("SELECT ts, side FROM orders WHERE status='closed' ORDER BY id").fetchall()
+
+    event = Backtester(params).run(df)
+    vector = vectorised_backtest(Features.from_candles(df, params), params)
+    assert len(event.trades) > 10
+    assert [(t.exit_ts, t.side) for t in event.trades] == expected
+    assert [(t.entry_ts, t.exit_ts, t.side) for t in vector.trades] == [(t.entry_ts, t.exit_ts, t.side) for t in event.trades]
+    assert event.trades != Backtester().run(df).trades
+
+
+def test_load_candles_never_writes_the_database(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "live.db"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE candles (ts INTEGER, pair TEXT, timeframe TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL)")
+    con.executemany("INSERT INTO candles VALUES (?, 'BTC/USDC', '15m', 1.0, 2.0, 0.5, 1.5, 1.0)", [(ts,) for ts in range(5)])
+    con.commit()
+    con.close()
+    before = path.read_bytes()
+    assert list(load_candles(str(path), start=1, end=4)["ts"]) == [1, 2, 3]
+    assert path.read_bytes() == before  # no migration, no new tables
+    with pytest.raises(Exception):
+        load_candles(str(tmp_path / "missing.db"))
+    assert not (tmp_path / "missing.db").exists()
@@ -1,8 +1,11 @@
 import sys, pathlib
 sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
 import os
+import sqlite3
+import time
 import pandas as pd
-from bot import label_state, trade_logic, Database, compute_atr
+import pytest
+from bot import label_state, trade_logic, Database, Order, compute_atr
 
 
 def make_df(prices):
@@ -71,3 +74,281 @@ def test_close_on_state_change(tmp_path):
     second_order = db.last_open_order()
     assert second_order is not None
     assert second_order.id != first_order.id
+
+
+def test_exits_test_the_levels_set_before_the_bar(tmp_path):
+    db = Database(str(tmp_path / "trail.db"))
+    db.record_order(Order(None, 0, "buy", 100.0, 1.0, 90.0, 110.0, "open"))
+    df = make_df([(100, 101, 99, 100)] * 20 + [(100, 105, 99, 104)])
+    # trailing on this close would put the target at 104.5, inside the bar's range
+    decision, pnl = trade_logic(db, df, "up", is_live=False, risk_pct=0.01, prev_state="up", atr=0.5)
+    assert (decision, pnl) == ("hold", 0.0)
+    order = db.last_open_order()
+    assert (order.stop, order.target) == (103.5, 104.5)
+
+
+def test_candle_window_is_bounded_and_incremental(tmp_path):
+    db = Database(str(tmp_path / "window.db"), window_bars=5)
+    bars = [[i * 60_000, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 10.0] for i in range(12)]
+    for i in range(0, 12, 3):
+        db.store_candles(bars[i:i + 3])
+    df = db.window.frame()
+    assert list(df["ts"]) == [b[0] for b in bars[-5:]]
+    assert list(df.columns) == list(db.candles_dataframe().columns)
+    # re-sent bars are ignored, like INSERT OR IGNORE
+    db.store_candles(bars[-2:])
+    assert len(db.window) == 5
+
+    reopened = Database(str(tmp_path / "window.db"), window_bars=5)
+    pd.testing.assert_frame_equal(reopened.window.frame(), db.candles_dataframe().tail(5).reset_index(drop=True))
+
+
+def test_transaction_groups_writes_and_rolls_back(tmp_path):
+    db = Database(str(tmp_path / "tx.db"), wal=True)
+    assert db.cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with db.transaction():
+        db.store_candles([[0, 1.0, 2.0, 0.5, 1.5, 1.0]])
+        db.record_order(Order(None, 0, "buy", 1.5, 1.0, 1.0, 2.0, "open"))
+        db.log_tick(0, "up", "buy", 0.0, 1000.0)
+        assert db.con.in_transaction
+    assert not db.con.in_transaction
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.store_candles([[60_000, 1.0, 2.0, 0.5, 1.5, 1.0]])
+            db.log_tick(60_000, "up", "hold", 0.0, 1000.0)
+            raise RuntimeError("tick failed")
+    assert len(db.candles_dataframe()) == 1
+    assert db.window.last_ts == 0
+    assert db.cur.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 1
+
+
+class PagedExchange:
+    rateLimit = 0
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = 0
+
+    def milliseconds(self):
+        return self.bars[-1][0] + 1
+
+    def fetch_ohlcv(self, pair, timeframe, since, limit):
+        self.calls += 1
+        return [b for b in self.bars if b[0] >= since][:limit]
+
+
+def test_backfill_pages_range(tmp_path, monkeypatch):
+    import bot
+
+    bars = [[i * bot.TIMEFRAME_MS, 1.0, 2.0, 0.5, 1.5, 1.0] for i in range(1000)]
+    fake = PagedExchange(bars)
+    monkeypatch.setattr(bot, "exchange", fake)
+    db = Database(str(tmp_path / "backfill.db"), window_bars=50)
+    stats = bot.backfill(db, 0, page_bars=64, workers=4, batch_pages=3)
+    # the last bar is still forming
+    assert stats["bars"] == 999 and stats["pages"] == fake.calls == 16
+    assert list(db.candles_dataframe()["ts"]) == [b[0] for b in bars[:-1]]
+    assert db.window.last_ts == bars[-2][0] and len(db.window) == 50
+
+
+def test_catch_up_stores_only_closed_bars(tmp_path, monkeypatch):
+    import bot
+
+    bars = [[i * bot.TIMEFRAME_MS, 100.0, 101.0, 99.0, 100.5, 1.0] for i in range(400)]
+    bars[-1][4] = 100.7  # partial close of the forming bar
+    monkeypatch.setattr(bot, "exchange", PagedExchange(bars))
+    db = Database(str(tmp_path / "outage.db"))
+    db.store_candles(bars[1:2])
+    bot.fetch_new_candles(db, until=bars[-1][0])
+    assert db.max_ts() == bars[-2][0]
+    assert db.candles_dataframe()["close"].iloc[-1] == 100.5
+
+
+def test_catch_up_over_a_gap_does_not_stall(tmp_path, monkeypatch):
+    import bot
+
+    bars = [[i * bot.TIMEFRAME_MS, 100.0, 101.0, 99.0, 100.5, 1.0] for i in range(400)]
+    del bars[100:110]  # the exchange has no bars for part of the outage
+    monkeypatch.setattr(bot, "exchange", PagedExchange(bars))
+    db = Database(str(tmp_path / "gap.db"))
+    db.store_candles(bars[1:2])
+    # under the default reject policy the catch-up drops the gap instead of raising
+    bot.fetch_new_candles(db, until=bars[-1][0])
+    assert db.max_ts() == bars[-2][0]
+
+
+def test_poll_waits_through_empty_responses(tmp_path, monkeypatch):
+    import bot
+    from scheduler import CandleScheduler
+
+    bars = [[i * bot.TIMEFRAME_MS, 1.0, 2.0, 0.5, 1.5, 1.0] for i in range(1, 11)]
+    responses = iter([[], [], bars])
+    fake = PagedExchange(bars)
+    fake.fetch_ohlcv = lambda pair, timeframe, since, limit: next(responses)
+    monkeypatch.setattr(bot, "exchange", fake)
+    db = Database(str(tmp_path / "poll.db"))
+    db.store_candles(bars[:5])
+    close_ts = bars[-1][0]
+    scheduler = CandleScheduler(bot.TIMEFRAME_MS, poll_interval=0.0, poll_timeout=1.0, sleep=lambda _: None)
+    _, ready = scheduler.poll(
+        lambda: bot.fetch_new_candles(db, until=close_ts),
+        lambda _: db.max_ts() >= close_ts - bot.TIMEFRAME_MS,
+    )
+    assert ready and db.max_ts() == bars[-2][0]
+
+
+def test_candle_queries_use_clustered_key(tmp_path):
+    db = Database(str(tmp_path / "plan.db"))
+    queries = [
+        ("SELECT MAX(ts) FROM candles WHERE pair=? AND timeframe=?", ("BTC/USDC", "15m")),
+        ("SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts", ("BTC/USDC", "15m")),
+        ("SELECT ts, open, high, low, close, volume FROM candles WHERE pair=? AND timeframe=? ORDER BY ts DESC LIMIT ?", ("BTC/USDC", "15m", 10)),
+    ]
+    for sql, params in queries:
+        plan = " ".join(row[-1] for row in db.cur.execute("EXPLAIN QUERY PLAN " + sql, params))
+        assert "USING PRIMARY KEY (pair=? AND timeframe=?)" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+
+
+def test_migrates_rowid_candles_table(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    con = sqlite3.connect(path)
+    con.execute(
+        """CREATE TABLE candles (
+            ts INTEGER, pair TEXT, timeframe TEXT,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            UNIQUE (ts, pair, timeframe)
+        )"""
+    )
+    rows = [(i * 60_000, pair, "15m", 1.0, 2.0, 0.5, 1.5, 1.0) for pair in ("BTC/USDC", "ETH/USDC") for i in range(30)]
+    con.executemany("INSERT INTO candles VALUES (?,?,?,?,?,?,?,?)", rows)
+    con.commit()
+    con.close()
+
+    db = Database(path)
+    sql = db.cur.execute("SELECT sql FROM sqlite_master WHERE name='candles'").fetchone()[0]
+    assert "WITHOUT ROWID" in sql
+    assert db.cur.execute("SELECT COUNT(*) FROM candles").fetchone()[0] == 60
+    assert db.max_ts() == 29 * 60_000 and len(db.window) == 30
+    # opening again is a no-op
+    Database(path)
+
+
+class BalanceExchange:
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_balance(self):
+        self.calls += 1
+        return {"total": {"USDC": 2000.0, "BTC": 0.5}}
+
+
+def test_balance_service_one_call_per_quiet_tick(tmp_path, monkeypatch):
+    import bot
+
+    fake = BalanceExchange()
+    monkeypatch.setattr(bot, "exchange", fake)
+    balances = bot.BalanceService(ttl=60)
+    db = Database(str(tmp_path / "balance.db"))
+
+    flat = make_df([(100, 101, 99, 100)] * 10 + [(100, 130, 70, 100)] * 11)
+    tick = bot.evaluate_tick(db, flat, is_live=True, risk_pct=0.01, balances=balances)
+    assert tick.decision == "hold" and fake.calls == 1
+    assert tick.equity == 2000.0 + 0.5 * 100
+    assert balances.stats() == {"hits": 0, "misses": 1}
+
+    prices = [(100 + i, 101 + i, 99 + i, 100 + i) for i in range(20)] + [(120, 125, 118, 124)]
+    balances.invalidate()
+    fake.calls = 0
+    tick = bot.evaluate_tick(db, make_df(prices), is_live=True, risk_pct=0.01, balances=balances)
+    assert tick.decision == "buy"
+    # one fetch sizes the order and marks the equity; the order invalidates it
+    assert fake.calls == 1 and not balances.fresh()
+    assert abs(db.last_open_order().amount - round(2000.0 * 0.01 / 124, 8)) < 1e-12
+
+
+def test_evaluate_tick_sizes_stops_from_atr_engine(tmp_path):
+    import bot
+    from indicators import RunningATR
+
+    db = Database(str(tmp_path / "atr.db"))
+    prices = [(100 + i, 101 + i, 99 + i, 100 + i) for i in range(40)] + [(140, 145, 138, 144)]
+    df = make_df(prices)
+    engine = RunningATR(method="wilder")
+    tick = bot.evaluate_tick(db, df, is_live=False, risk_pct=0.01, atr_engine=engine)
+    assert tick.decision == "buy" and engine.count == len(df)
+    order = db.last_open_order()
+    assert abs(order.stop - (df["high"].iloc[-21:-1].max() - engine.value)) < 1e-9
+
+
+class LiveExchange:
+    """Serves a breakout on the last closed candle and counts balance requests."""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.balance_calls = 0
+
+    def milliseconds(self):
+        return int(time.time() * 1000)
+
+    def fetch_time(self):
+        return self.milliseconds()
+
+    def fetch_ohlcv(self, pair, timeframe, since=None, limit=None):
+        return [b for b in self.bars if since is None or b[0] >= since][:limit]
+
+    def fetch_balance(self):
+        self.balance_calls += 1
+        return {"total": {"USDC": 2000.0, "BTC": 0.0}}
+
+
+def test_live_entry_tick_fetches_the_balance_once(tmp_path, monkeypatch):
+    import bot
+
+    last = int(time.time() * 1000) // bot.TIMEFRAME_MS * bot.TIMEFRAME_MS - bot.TIMEFRAME_MS
+    prices = [(100 + i, 101 + i, 99 + i, 100 + i) for i in range(20)] + [(120, 125, 118, 124)]
+    bars = [[last - (20 - i) * bot.TIMEFRAME_MS, *p, 1.0] for i, p in enumerate(prices)]
+    live = LiveExchange(bars)
+    monkeypatch.setattr(bot, "exchange", live)
+    monkeypatch.setattr(bot, "DB_FILE", str(tmp_path / "live.db"))
+
+    def stop(_):
+        raise KeyboardInterrupt
+
+    # stop once the first tick is done, waiting for the next close
+    monkeypatch.setattr(bot.CandleScheduler, "wait_for_close", stop)
+    with pytest.raises(KeyboardInterrupt):
+        bot.run_bot(is_live=True, settle=0)
+    order = Database(bot.DB_FILE).last_open_order()
+    assert order is not None and order.side == "buy" and order.ts == last
+    # the starting equity's snapshot sizes the order and marks the tick too
+    assert live.balance_calls == 1
+
+
+def test_live_tick_writes_are_one_transaction(tmp_path, monkeypatch):
+    import bot
+
+    last = int(time.time() * 1000) // bot.TIMEFRAME_MS * bot.TIMEFRAME_MS - bot.TIMEFRAME_MS
+    prices = [(100 + i, 101 + i, 99 + i, 100 + i) for i in range(20)] + [(120, 125, 118, 124)]
+    bars = [[last - (20 - i) * bot.TIMEFRAME_MS, *p, 1.0] for i, p in enumerate(prices)]
+    monkeypatch.setattr(bot, "exchange", LiveExchange(bars))
+    monkeypatch.setattr(bot, "DB_FILE", str(tmp_path / "live.db"))
+
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def stop(_):
+        raise KeyboardInterrupt
+
+    # logging the tick fails after the order is recorded; stop at the retry back-off
+    monkeypatch.setattr(bot.Database, "log_tick", fail)
+    monkeypatch.setattr(bot.time, "sleep", stop)
+    with pytest.raises(KeyboardInterrupt):
+        bot.run_bot(is_live=True, settle=0)
+    db = Database(bot.DB_FILE)
+    assert db.last_open_order() is None
+    # the candles were committed as they were stored, outside the tick
+    assert db.max_ts() == last
@@ -0,0 +1,110 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import Backtester, Features, vectorised_backtest
+from bot import Database, StrategyParams, label_state, trade_logic
+from fills import SIGNAL, STOP, TARGET, FillModel, intrabar_path
+from test_indicators import random_history
+
+COSTS = FillModel(maker_fee=0.004, taker_fee=0.006, spread=0.001, impact=0.05)
+
+
+def test_exit_kinds_and_reference_prices():
+    model = FillModel()
+    # long, stop 95, target 105; columns: open, high, low, close
+    bars = np.array([
+        [104.0, 106.0, 94.0, 100.0],  # both crossed, open nearer the high: target first
+        [96.0, 106.0, 94.0, 100.0],   # both crossed, open nearer the low: stop first
+        [93.0, 99.0, 92.0, 98.0],     # gapped through the stop: fill at the open
+        [107.0, 108.0, 101.0, 102.0], # gapped through the target: fill at the open
+        [100.0, 101.0, 99.0, 100.5],  # regime change: at the close
+    ])
+    reference, kind = model.exits(np.ones(5), *bars.T, 95.0, 105.0)
+    assert kind.tolist() == [TARGET, STOP, STOP, TARGET, SIGNAL]
+    assert reference.tolist() == [105.0, 95.0, 93.0, 107.0, 100.5]
+
+    _, kind = FillModel(path="worst").exits(np.ones(5), *bars.T, 95.0, 105.0)
+    assert kind.tolist() == [STOP, STOP, STOP, TARGET, SIGNAL]
+    # a lower-timeframe path overrides the heuristic, shorts mirror longs
+    _, kind = model.exits(np.full(2, -1), *bars[:2].T, 105.0, 95.0, np.array([-1, 1]))
+    assert kind.tolist() == [TARGET, STOP]
+
+
+def test_costs():
+    assert COSTS.market(100.0, 1, 0.5, 10.0) == pytest.approx(100 * (1 + 0.0005 + 0.05 * 0.05))
+    assert COSTS.market(100.0, -1, 20.0, 10.0) == pytest.approx(100 * (1 - 0.0005 - 0.05))
+    # targets rest on the book: no slippage, maker fee
+    assert COSTS.exit_price(1, TARGET, 105.0, 1.0, 10.0) == 105.0
+    assert COSTS.pnl(1, 100.0, 105.0, 2.0, TARGET) == pytest.approx(10 - (0.006 * 100 + 0.004 * 105) * 2)
+    assert COSTS.pnl(-1, 100.0, 105.0, 2.0, STOP) == pytest.approx(-10 - (0.006 * 100 + 0.006 * 105) * 2)
+    with pytest.raises(ValueError):
+        FillModel.from_dict({"fee": 0.001})
+
+
+def test_intrabar_path_from_lower_timeframe():
+    ts = np.array([0, 900_000, 1_800_000])
+    lower = pd.DataFrame({
+        "ts": [0, 300_000, 600_000, 900_000, 1_200_000],
+        "high": [10.0, 12.0, 11.0, 20.0, 20.0],
+        "low": [8.0, 9.0, 7.0, 18.0, 18.0],
+    })
+    # bar 0: high at 300000 before the low at 600000; bar 1: same lower bar; bar 2: none
+    assert intrabar_path(ts, 900_000, lower).tolist() == [1, 0, 0]
+    lower["low"] = [7.0, 9.0, 8.0, 18.0, 18.0]
+    assert intrabar_path(ts, 900_000, lower).tolist() == [-1, 0, 0]
+
+
+@pytest.mark.parametrize("model", [COSTS, FillModel(taker_fee=0.001, path="worst")])
+def test_vectorised_fills_match_event_driven(model):
+    df = random_history(6000, 21)
+    params = StrategyParams(max_drawdown=None)
+    path = np.random.default_rng(0).integers(-1, 2, len(df)).astype(np.int8)
+    event = Backtester(params, fills=model).run(df, path)
+    vector = vectorised_backtest(Features.from_candles(df, params, path=path), params, fills=model)
+    assert len(event.trades) > 50
+    assert [(t.entry_ts, t.exit_ts, t.side) for t in vector.trades] == [(t.entry_ts, t.exit_ts, t.side) for t in event.trades]
+    numbers = lambda trades: [(t.entry_price, t.exit_price, t.amount, t.pnl) for t in trades]
+    np.testing.assert_allclose(numbers(vector.trades), numbers(event.trades), rtol=1e-12)
+    np.testing.assert_allclose(vector.equity, event.equity, atol=1e-9)
+    # costs only ever take away
+    free = Backtester(params).run(df)
+    assert event.total_pnl < free.total_pnl
+
+
+def test_free_fills_move_exits_onto_the_levels_hit():
+    df = random_history(3000, 22).set_index("ts", drop=False)
+    params = StrategyParams(max_drawdown=None)
+    free = Backtester(params, fills=FillModel()).run(df).trades
+    close_fills = Backtester(params).run(df).trades
+    assert [(t.entry_ts, t.exit_ts, t.side, t.entry_price) for t in free] == [
+        (t.entry_ts, t.exit_ts, t.side, t.entry_price) for t in close_fills
+    ]
+    for t in free:
+        bar = df.loc[t.exit_ts]
+        assert t.exit_price in (t.stop, t.target, bar["open"], bar["close"])
+    assert any(t.exit_price != bar_close for t, bar_close in zip(free, df.loc[[t.exit_ts for t in free], "close"]))
+
+
+def test_paper_mode_fills(tmp_path):
+    df = random_history(400, 23)
+    db = Database(str(tmp_path / "paper.db"))
+    closes = 0
+    prev_state = None
+    for t in range(40, len(df)):
+        window = df.iloc[t - 40:t + 1]
+        state = label_state(window)
+        before = db.last_open_order()
+        decision, pnl = trade_logic(db, window, state, False, 0.01, prev_state, fills=COSTS)
+        prev_state = state
+        if decision in ("buy", "sell"):
+            order = db.last_open_order()
+            side = 1 if decision == "buy" else -1
+            assert order.price == pytest.approx(COSTS.market(window["close"].iloc[-1], side, order.amount, 1.0))
+        if decision == "close":
+            closes += 1
+            bar = tuple(window[c].iloc[-1] for c in ("open", "high", "low", "close", "volume"))
+            side = 1 if before.side == "buy" else -1
+            assert pnl == pytest.approx(COSTS.close(side, bar, before.stop, before.target, before.price, before.amount)[1])
+    assert closes > 0
@@ -0,0 +1,130 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+from bot import Database, StrategyParams, compute_atr, label_state
+from indicators import RunningATR, StreamingClassifier, label_states
+
+
+def random_history(n, seed, rounded=False):
+    """Random walk with flat stretches, so every regime shows up."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 1, n)
+    flat = (np.arange(n) // 60) % 3 == 0
+    steps[flat] = 0.0
+    close = 100 + np.cumsum(steps)
+    high = close + np.where(flat, 1.0, rng.exponential(1.0, n))
+    low = close - np.where(flat, 1.0, rng.exponential(1.0, n))
+    if rounded:
+        # ties in ranges, highs and lows exercise the median and deque edge cases
+        close, high, low = np.round(close), np.round(high), np.round(low)
+    return pd.DataFrame({
+        "ts": np.arange(n) * 60_000,
+        "open": close,
+        "high": np.maximum(high, close),
+        "low": np.minimum(low, close),
+        "close": close,
+        "volume": 1.0,
+    })
+
+
+def test_streaming_classifier_matches_label_state():
+    seen = set()
+    for seed, rounded in ((0, False), (1, True), (2, True)):
+        df = random_history(1500, seed, rounded)
+        clf = StreamingClassifier()
+        streamed = [clf.update(h, l, c) for h, l, c in zip(df["high"], df["low"], df["close"])]
+        expected = [label_state(df.iloc[max(0, t - 30):t + 1]) for t in range(len(df))]
+        assert streamed == expected
+        seen.update(expected)
+    assert seen == {"chaos", "consolidation", "up", "down"}
+
+
+def test_seed_from_stored_candles(tmp_path):
+    db = Database(str(tmp_path / "history.db"))
+    db.store_candles(random_history(400, 3).values.tolist())
+    history = db.candles_dataframe()
+    clf = StreamingClassifier()
+    assert clf.seed(history.iloc[:200]) == label_state(history.iloc[:200])
+    for t in range(200, len(history)):
+        bar = history.iloc[t]
+        assert clf.update(bar["high"], bar["low"], bar["close"]) == label_state(history.iloc[:t + 1])
+
+
+def test_label_states_matches_label_state():
+    for seed, rounded in ((4, False), (5, True)):
+        df = random_history(1500, seed, rounded)
+        expected = [label_state(df.iloc[:t + 1]) for t in range(len(df))]
+        assert list(label_states(df)) == expected
+    assert list(label_states(df.iloc[:5])) == ["chaos"] * 5
+
+
+def test_running_atr_matches_compute_atr_and_wilder():
+    df = random_history(300, 6)
+    simple = RunningATR(period=20)
+    wilder = RunningATR(period=20, method="wilder")
+    expected_wilder = None
+    for t in range(len(df)):
+        bar = df.iloc[t]
+        value = simple.update(bar["high"], bar["low"], bar["close"], int(bar["ts"]))
+        assert abs(value - compute_atr(df.iloc[:t + 1])) < 1e-9
+        w = wilder.update(bar["high"], bar["low"], bar["close"])
+        if t == 19:
+            expected_wilder = value
+        elif t > 19:
+            prev_close = df["close"].iloc[t - 1]
+            tr = max(bar["high"] - bar["low"], abs(bar["high"] - prev_close), abs(bar["low"] - prev_close))
+            expected_wilder = (expected_wilder * 19 + tr) / 20
+        if expected_wilder is not None:
+            assert w == expected_wilder
+
+
+def test_running_atr_extend_only_feeds_new_bars():
+    df = random_history(100, 7)
+    engine = RunningATR()
+    engine.extend(df.iloc[:60])
+    engine.extend(df.iloc[40:80])  # overlapping window, as each tick sees
+    fresh = RunningATR()
+    fresh.extend(df.iloc[:80])
+    assert engine.count == fresh.count == 80
+    assert engine.value == fresh.value
+
+
+def test_indicator_cache_shares_values_within_a_bar(tmp_path):
+    import bot
+    from indicators import IndicatorCache
+
+    cache = IndicatorCache(maxsize=2)
+    db = Database(str(tmp_path / "cache.db"))
+    df = random_history(300, 8)
+    for end in range(21, 300):
+        window = df.iloc[:end]
+        ctx = cache.context("BTC/USDC", "15m", window)
+        assert label_state(window, ctx) == label_state(window)
+    cache.hits = cache.misses = 0
+
+    tick = bot.evaluate_tick(db, df, is_live=False, risk_pct=0.01, indicators=cache)
+    # trade_logic reuses the 20-bar high/low label_state computed
+    assert cache.hits >= 2
+    assert tick.indicator_cache == cache.stats()
+    before = cache.stats()
+    label_state(df, cache.context("BTC/USDC", "15m", df))
+    assert cache.misses == before["misses"]
+
+    cache.context("ETH/USDC", "15m", df)
+    cache.context("SOL/USDC", "15m", df)
+    assert len(cache._contexts) == 2 and ("BTC/USDC", "15m", int(df["ts"].iloc[-1]), 20, 1.01) not in cache._contexts
+
+
+def test_indicator_cache_keys_on_parameters():
+    from indicators import IndicatorCache
+
+    cache = IndicatorCache()
+    df = random_history(300, 9)
+    short = StrategyParams(lookback=10)
+    default = cache.context("BTC/USDC", "15m", df)
+    assert label_state(df, default) == label_state(df)
+    ctx = cache.context("BTC/USDC", "15m", df, short.lookback, short.atr_factor)
+    assert ctx is not default
+    assert label_state(df, ctx, short) == label_state(df, params=short)
+    assert cache.context("BTC/USDC", "15m", df, 20, 1.05) is not default
@@ -0,0 +1,69 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+from bot import Database, compute_atr, label_state
+from mmap_store import INITIAL_CAPACITY, MmapCandleStore
+
+
+def make_bars(n, start=0):
+    rng = np.random.default_rng(start)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return [[(start + i) * 60_000, c, c + 1.5, c - 1.5, c + 0.2, 1.0] for i, c in enumerate(close)]
+
+
+def test_append_grow_and_reopen(tmp_path):
+    path = tmp_path / "BTC-USDC_15m.candles"
+    store = MmapCandleStore(str(path))
+    bars = make_bars(INITIAL_CAPACITY + 100)
+    assert store.append(bars[:10]) == 10
+    assert store.append(bars[5:]) == len(bars) - 10
+    assert store.capacity >= len(bars)
+    assert len(store) == len(bars) and store.last_ts == bars[-1][0]
+
+    tail = store.tail(25)
+    assert np.shares_memory(tail, store.view())
+    assert list(tail["ts"]) == [b[0] for b in bars[-25:]]
+
+    reopened = MmapCandleStore(str(path))
+    assert len(reopened) == len(bars)
+    np.testing.assert_array_equal(reopened.view()["close"], [b[4] for b in bars])
+
+
+def test_strategy_reads_mmap_views(tmp_path):
+    bars = make_bars(300)
+    db = Database(str(tmp_path / "live.db"), window_bars=100)
+    db.store_candles(bars[:200])
+    db = Database(str(tmp_path / "live.db"), window_bars=100, mmap_dir=str(tmp_path / "mmap"))
+    assert len(db.mmap) == 200  # seeded from SQLite
+    db.store_candles(bars[200:])
+
+    view = db.recent_candles()
+    frame = db.window.frame()
+    assert isinstance(view, np.ndarray) and len(view) == 100
+    pd.testing.assert_frame_equal(pd.DataFrame(view), frame)
+    for end in range(21, 100):
+        assert label_state(view[:end]) == label_state(frame.iloc[:end])
+        assert compute_atr(view[:end]) == compute_atr(frame.iloc[:end])
+
+
+def test_mmap_follows_writes_it_did_not_see(tmp_path):
+    bars = make_bars(300)
+    db_file, mmap_dir = str(tmp_path / "live.db"), str(tmp_path / "mmap")
+    Database(db_file, mmap_dir=mmap_dir).store_candles(bars[:100])
+    Database(db_file).store_candles(bars[100:200])  # a run without the mmap
+    db = Database(db_file, window_bars=50, mmap_dir=mmap_dir)
+    assert list(db.mmap.view()["ts"]) == [b[0] for b in bars[:200]]
+
+    db.store_candles(bars[250:])
+    db.store_candles(bars[200:250])  # a backfilled hole
+    assert list(db.mmap.view()["ts"]) == [b[0] for b in bars]
+
+    try:
+        with db.transaction():
+            db.store_candles(make_bars(10, start=300))
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert len(db.mmap) == 300
+    pd.testing.assert_frame_equal(pd.DataFrame(db.recent_candles()), db.window.frame())
@@ -0,0 +1,72 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pytest
+from backtest import Trade
+from bot import Database, Order
+from montecarlo import returns_from_db, simulate, trade_returns
+
+
+def reference_path(returns, risk):
+    """Max drawdown and longest underwater stretch of one path, one trade at a time."""
+    equity = peak = 1.0
+    worst = longest = since_peak = 0
+    for r in returns:
+        equity *= max(1.0 + risk * r, 0.0)
+        if equity >= peak:
+            peak, since_peak = equity, 0
+        else:
+            since_peak += 1
+        worst = max(worst, 1 - equity / peak)
+        longest = max(longest, since_peak)
+    return worst, longest, equity - 1
+
+
+def test_trade_returns_are_signed_price_moves():
+    trades = [
+        Trade(0, 1, "buy", 100.0, 110.0, 0.1, 90.0, 120.0, 1.0),
+        Trade(1, 2, "sell", 100.0, 110.0, 0.1, 110.0, 90.0, -1.0),
+    ]
+    np.testing.assert_allclose(trade_returns(trades), [0.1, -0.1])
+
+
+def test_permutation_paths_match_a_sequential_walk():
+    returns = np.random.default_rng(0).normal(0.002, 0.03, 60)
+    profiles = simulate(returns, [0.5, 2.0], simulations=300, method="permutation", seed=3)
+    for risk, profile in profiles.items():
+        # every permutation compounds to the same final equity
+        np.testing.assert_allclose(profile.final_return, np.prod(1 + risk * returns) - 1)
+        assert profile.max_drawdown.shape == (300,)
+    rng = np.random.default_rng(3)
+    first = rng.permuted(np.broadcast_to(returns, (300, 60)), axis=1)[0]
+    worst, longest, final = reference_path(first, 2.0)
+    assert profiles[2.0].max_drawdown[0] == pytest.approx(worst)
+    assert profiles[2.0].recovery[0] == longest
+
+
+def test_bootstrap_ruin_and_summary():
+    returns = np.array([-0.5, -0.5, 0.4])
+    profiles = simulate(returns, [0.1, 1.0], simulations=5000, horizon=20, ruin=0.5, seed=1)
+    assert profiles[0.1].ruined.mean() < profiles[1.0].ruined.mean()
+    assert profiles[1.0].ruined.mean() > 0.9
+    summary = profiles[1.0].summary(kill_drawdown=0.1)
+    assert summary["kill_switch"] == 1.0
+    assert summary["max_drawdown"]["p50"] <= summary["max_drawdown"]["p99"]
+    with pytest.raises(ValueError):
+        simulate(np.empty(0), [0.01])
+
+
+def test_returns_from_closed_orders(tmp_path):
+    db = Database(str(tmp_path / "orders.db"))
+    db.store_candles([[t * 900_000, 100, 101, 99, close, 1] for t, close in enumerate([100.0, 104.0, 95.0, 97.0])])
+    db.record_order(Order(None, 900_000, "buy", 100.0, 0.1, 98.0, 104.0, "closed"))   # closed at 104
+    db.record_order(Order(None, 2_700_000, "sell", 100.0, 0.1, 102.0, 95.0, "closed"))  # closed at 97
+    db.record_order(Order(None, 2_700_000, "buy", 97.0, 0.1, 95.0, 99.0, "open"))
+    np.testing.assert_allclose(returns_from_db(str(tmp_path / "orders.db")), [0.04, 0.03])
+    before = (tmp_path / "orders.db").read_bytes()
+    db.con.close()
+    returns_from_db(str(tmp_path / "orders.db"))
+    assert (tmp_path / "orders.db").read_bytes() == before
+    with pytest.raises(Exception):
+        returns_from_db(str(tmp_path / "missing.db"))
+    assert not (tmp_path / "missing.db").exists()
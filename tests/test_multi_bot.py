@@ -0,0 +1,168 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import asyncio
+import sqlite3
+
+import pytest
+from bot import Database, Order
+from fake_exchange import FakeAsyncExchange
+from multi_bot import MultiBot, parse_market
+
+M15 = 900_000
+H1 = 3_600_000
+
+
+def make_bars(n, timeframe_ms, start=100.0):
+    return [[i * timeframe_ms, start + i, start + 1 + i, start - 1 + i, start + i, 1.0] for i in range(n)]
+
+
+def test_market_views_are_isolated_and_share_transactions(tmp_path):
+    db = Database(str(tmp_path / "multi.db"))
+    eth = db.market("ETH/USDC", "1h")
+    assert (eth.pair, eth.timeframe, eth.timeframe_ms) == ("ETH/USDC", "1h", H1)
+    with db.transaction():
+        db.store_candles(make_bars(3, M15))
+        eth.store_candles(make_bars(5, H1, 2000.0))
+        eth.record_order(Order(None, 0, "sell", 2000.0, 1.0, 2010.0, 1990.0, "open"))
+        eth.log_tick(0, "down", "sell", 0.0, 1000.0)
+        assert db.con.in_transaction
+    assert not db.con.in_transaction
+    assert (db.max_ts(), eth.max_ts()) == (2 * M15, 4 * H1)
+    assert len(db.window) == 3 and eth.window.last_ts == 4 * H1
+    assert db.last_open_order() is None and eth.last_open_order().side == "sell"
+
+    with pytest.raises(RuntimeError):
+        with eth.transaction():
+            db.store_candles([[3 * M15, 1.0, 2.0, 0.5, 1.5, 1.0]])
+            raise RuntimeError("tick failed")
+    assert db.max_ts() == 2 * M15 and db.window.last_ts == 2 * M15
+
+
+def test_migrates_orders_and_logs_without_markets(tmp_path):
+    path = str(tmp_path / "old.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, ts INTEGER, side TEXT, price REAL, amount REAL, stop REAL, target REAL, status TEXT)")
+    con.execute("CREATE TABLE logs (ts INTEGER, state TEXT, decision TEXT, pnl REAL, equity REAL)")
+    con.execute("INSERT INTO orders VALUES (1, 0, 'buy', 100.0, 1.0, 95.0, 105.0, 'open')")
+    con.commit()
+    con.close()
+
+    db = Database(path)
+    assert db.last_open_order().price == 100.0
+    assert db.market("ETH/USDC", "15m").last_open_order() is None
+    db.log_tick(0, "up", "hold", 0.0, 1000.0)
+    assert db.cur.execute("SELECT pair, timeframe FROM logs").fetchall() == [("BTC/USDC", "15m")]
+
+
+def test_migrates_tables_missing_only_the_timeframe(tmp_path):
+    path = str(tmp_path / "half.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, ts INTEGER, side TEXT, price REAL, amount REAL, stop REAL, target REAL, status TEXT, pair TEXT)")
+    con.execute("CREATE TABLE logs (ts INTEGER, state TEXT, decision TEXT, pnl REAL, equity REAL, pair TEXT)")
+    con.execute("INSERT INTO orders VALUES (1, 0, 'buy', 100.0, 1.0, 95.0, 105.0, 'open', 'BTC/USDC')")
+    con.commit()
+    con.close()
+
+    db = Database(path)
+    assert db.last_open_order().price == 100.0
+    db.log_tick(0, "up", "hold", 0.0, 1000.0)
+    assert db.cur.execute("SELECT pair, timeframe FROM logs").fetchall() == [("BTC/USDC", "15m")]
+
+
+def test_parse_market():
+    assert parse_market("ETH/USDC:1h") == ("ETH/USDC", "1h")
+    for value in ("ETH/USDC", "ETHUSDC:1h", "ETH/USDC:soon"):
+        with pytest.raises(ValueError):
+            parse_market(value)
+
+
+def test_close_evaluates_due_markets_with_bounded_concurrency(tmp_path):
+    bars = {
+        "BTC/USDC": make_bars(40 * 4 + 1, M15),
+        "ETH/USDC": make_bars(40 * 4 + 1, M15, 2000.0),
+        "SOL/USDC": make_bars(41, H1, 50.0),
+        "DOGE/USDC": [],
+    }
+    exchange = FakeAsyncExchange(bars, latency=0.05)
+    db = Database(str(tmp_path / "multi.db"))
+    markets = [("BTC/USDC", "15m"), ("ETH/USDC", "15m"), ("SOL/USDC", "1h"), ("DOGE/USDC", "15m")]
+    runner = MultiBot(exchange, db, markets, concurrency=2)
+    runner.scheduler.poll_timeout = 0
+    assert runner.scheduler.timeframe_ms == M15
+
+    # the last served bar of each market is still forming at this close
+    close_ts = 40 * H1
+    results = asyncio.run(runner.tick(close_ts))
+    assert [m.name for m, _ in results] == ["BTC/USDC:15m", "ETH/USDC:15m", "SOL/USDC:1h", "DOGE/USDC:15m"]
+    ticks = [tick for _, tick in results]
+    assert [t.ts for t in ticks[:3]] == [close_ts - M15, close_ts - M15, close_ts - H1]
+    assert ticks[3] is None  # nothing served before the poll timeout, without holding up the others
+    assert exchange.max_in_flight == 2
+    assert not db.con.in_transaction
+    rows = db.cur.execute("SELECT pair, timeframe, ts FROM logs ORDER BY pair").fetchall()
+    assert rows == [("BTC/USDC", "15m", close_ts - M15), ("ETH/USDC", "15m", close_ts - M15), ("SOL/USDC", "1h", close_ts - H1)]
+    assert [m.prev_state for m, _ in results[:3]] == [t.state for t in ticks[:3]]
+
+    # a quarter past: the hourly market is not due
+    assert [m.name for m in runner.due(close_ts + M15)] == ["BTC/USDC:15m", "ETH/USDC:15m", "DOGE/USDC:15m"]
+
+
+def test_failed_market_rolls_back_only_its_writes(tmp_path, monkeypatch):
+    import bot
+
+    bars = {"BTC/USDC": make_bars(41, M15), "ETH/USDC": make_bars(41, M15, 2000.0)}
+    evaluate_tick = bot.evaluate_tick
+
+    def failing(db, *args):
+        tick = evaluate_tick(db, *args)
+        if db.pair == "ETH/USDC":
+            raise RuntimeError("evaluation failed after writing")
+        return tick
+
+    monkeypatch.setattr(bot, "evaluate_tick", failing)
+    db = Database(str(tmp_path / "multi.db"))
+    runner = MultiBot(FakeAsyncExchange(bars), db, [("BTC/USDC", "15m"), ("ETH/USDC", "15m")])
+    runner.scheduler.poll_timeout = 0
+    btc, eth = asyncio.run(runner.tick(40 * M15))
+    assert btc[1] is not None and eth[1] is None
+    assert not db.con.in_transaction
+    counts = lambda table: dict(db.cur.execute(f"SELECT pair, COUNT(*) FROM {table} GROUP BY pair").fetchall())
+    assert counts("candles") == {"BTC/USDC": 40} and counts("logs") == {"BTC/USDC": 1}
+    assert len(eth[0].db.window) == 0
+
+
+def test_balance_and_catch_up_use_the_shared_client(tmp_path, monkeypatch):
+    import bot
+
+    monkeypatch.setattr(bot, "exchange", None)  # the blocking client must not be touched
+    bars = make_bars(1000, M15)
+    exchange = FakeAsyncExchange({"BTC/USDC": bars})
+    db = Database(str(tmp_path / "multi.db"))
+    db.store_candles(bars[1:2])
+    runner = MultiBot(exchange, db, [("BTC/USDC", "15m")], is_live=True)
+    runner.scheduler.poll_timeout = 0
+    ((market, tick),) = asyncio.run(runner.tick(999 * M15))
+    assert db.max_ts() == 998 * M15 and tick.ts == 998 * M15
+    assert exchange.calls.count("fetch_balance") == 1
+    assert exchange.calls.count("fetch_ohlcv") == 5  # four backfill pages, then the tick's request
+
+
+def test_database_is_not_locked_while_markets_poll(tmp_path):
+    bars = {"BTC/USDC": make_bars(41, M15), "ETH/USDC": []}
+    path = str(tmp_path / "multi.db")
+    db = Database(path)
+    runner = MultiBot(FakeAsyncExchange(bars, latency=0.02), db, [("BTC/USDC", "15m"), ("ETH/USDC", "15m")])
+    runner.scheduler.poll_interval, runner.scheduler.poll_timeout = 0.05, 0.3
+
+    async def main():
+        task = asyncio.ensure_future(runner.tick(40 * M15))
+        await asyncio.sleep(0.15)  # BTC is evaluated, ETH is still polling
+        other = sqlite3.connect(path, timeout=0)
+        other.execute("INSERT INTO logs (ts, state, decision, pnl, equity) VALUES (0, 'up', 'hold', 0, 0)")
+        other.commit()
+        other.close()
+        return await task
+
+    btc, eth = asyncio.run(main())
+    assert btc[1] is not None and eth[1] is None
+    assert db.cur.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 2
@@ -0,0 +1,66 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import sqlite3
+from bot import Database, evaluate_tick
+from indicators import RunningATR
+from replay import load_candles, load_ticks, replay
+from test_indicators import random_history
+
+
+def record(tmp_path, df, window=200):
+    """A paper run through the live tick path, as ``run_bot`` drives it."""
+    path = str(tmp_path / "bot_log.db")
+    db = Database(path)
+    db.store_candles(df.values.tolist())
+    engine = RunningATR()
+    prev_state = None
+    for t in range(30, len(df)):
+        tick = evaluate_tick(db, df.iloc[max(0, t + 1 - window):t + 1], False, 0.01, prev_state, atr_engine=engine)
+        prev_state = tick.state
+    db.con.close()
+    return path
+
+
+def test_replay_of_an_unchanged_strategy_matches(tmp_path):
+    df = random_history(1500, 31)
+    path = record(tmp_path, df)
+    ticks = load_ticks(path)
+    report = replay(load_candles(path), ticks, window_bars=200)
+    assert report.ticks == len(df) - 30
+    assert set(ticks["decision"]) >= {"buy", "sell", "close", "hold"}
+    assert report.mismatches == []
+    assert report.summary()["mismatches"] == 0
+
+
+def test_replay_reports_each_difference(tmp_path):
+    df = random_history(800, 32)
+    path = record(tmp_path, df)
+    con = sqlite3.connect(path)
+    entry = con.execute("SELECT ts FROM logs WHERE decision IN ('buy', 'sell') ORDER BY rowid LIMIT 1").fetchone()[0]
+    con.execute("UPDATE logs SET decision='hold' WHERE ts=?", (entry,))
+    con.execute("UPDATE logs SET state='chaos' WHERE ts=? AND state!='chaos'", (int(df["ts"].iloc[600]),))
+    con.execute("DELETE FROM candles WHERE ts=?", (int(df["ts"].iloc[700]),))
+    con.commit()
+    con.close()
+
+    report = replay(load_candles(path), load_ticks(path), window_bars=200)
+    first = report.mismatches[0]
+    assert (first.ts, first.logged_decision) == (entry, "hold")
+    assert first.decision in ("buy", "sell")
+    summary = report.summary()
+    assert summary["first_mismatch"] == entry
+    assert summary["missing_candles"] == 1
+    assert summary["state_mismatches"] >= 1
+    assert int(df["ts"].iloc[700]) in [m.ts for m in report.mismatches if m.state is None]
+
+
+def test_replay_never_writes_to_the_database(tmp_path):
+    path = str(tmp_path / "candles_only.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE candles (ts INTEGER, pair TEXT, timeframe TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL)")
+    con.commit()
+    con.close()
+    before = pathlib.Path(path).read_bytes()
+    assert load_ticks(path).empty
+    assert replay(load_candles(path), load_ticks(path)).summary()["ticks"] == 0
+    assert pathlib.Path(path).read_bytes() == before
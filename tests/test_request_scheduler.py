@@ -0,0 +1,75 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import asyncio
+
+import pytest
+from fake_exchange import FakeAsyncExchange
+from request_scheduler import ACCOUNT, LIMITS, MARKET, ORDER, RequestScheduler, ScheduledExchange, TokenBucket
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, burst=2, clock=lambda: now[0])
+    bucket.take()
+    bucket.take()
+    assert bucket.wait() == pytest.approx(0.5)
+    now[0] = 0.25
+    assert bucket.wait() == pytest.approx(0.25)
+    now[0] = 10.0
+    assert bucket.wait() == 0.0 and bucket.tokens == 2  # never more than the burst
+
+
+def test_identical_reads_are_coalesced():
+    bars = {"BTC/USDC": [[0, 1.0, 2.0, 0.5, 1.5, 1.0]], "ETH/USDC": [[0, 3.0, 4.0, 2.5, 3.5, 1.0]]}
+    exchange = ScheduledExchange(FakeAsyncExchange(bars, latency=0.05))
+
+    async def main():
+        return await asyncio.gather(
+            exchange.fetch_balance(),
+            exchange.fetch_balance(),
+            exchange.fetch_ohlcv("BTC/USDC", timeframe="15m", since=0),
+            exchange.fetch_ohlcv("BTC/USDC", timeframe="15m", since=0),
+            exchange.fetch_ohlcv("ETH/USDC", timeframe="15m", since=0),
+            exchange.create_order("BTC/USDC", "market", "buy", 1.0),
+            exchange.create_order("BTC/USDC", "market", "buy", 1.0),
+        )
+
+    balance, again, btc, btc_again, eth, first, second = asyncio.run(main())
+    assert balance is again and btc == btc_again and eth != btc
+    assert sorted(exchange.exchange.calls) == ["create_order", "create_order", "fetch_balance", "fetch_ohlcv", "fetch_ohlcv"]
+    assert first["id"] != second["id"]  # orders always go out
+    stats = exchange.stats()
+    assert (stats[ACCOUNT]["requests"], stats[ACCOUNT]["coalesced"]) == (1, 1)
+    assert (stats[MARKET]["requests"], stats[MARKET]["coalesced"]) == (2, 1)
+    assert (stats[ORDER]["requests"], stats[ORDER]["coalesced"]) == (2, 0)
+    assert all(s["queued"] == 0 for s in stats.values())
+
+
+def test_orders_jump_the_queue():
+    bars = {f"C{i}/USDC": [[0, 1.0, 2.0, 0.5, 1.5, 1.0]] for i in range(10)}
+    fake = FakeAsyncExchange(bars)
+    # 50 requests a second overall, one at a time
+    exchange = ScheduledExchange(fake, RequestScheduler(LIMITS, rate_limit_ms=20))
+    exchange.scheduler.overall.tokens = 1
+
+    async def main():
+        candles = [asyncio.ensure_future(exchange.fetch_ohlcv(pair, timeframe="15m")) for pair in bars]
+        await asyncio.sleep(0.005)
+        order = await exchange.create_order("C0/USDC", "market", "sell", 1.0)
+        await asyncio.gather(*candles)
+        return order
+
+    assert asyncio.run(main())["side"] == "sell"
+    # the first candle request took the only token; the order had the next one
+    assert fake.calls[:2] == ["fetch_ohlcv", "create_order"] and len(fake.calls) == 11
+    stats = exchange.stats()
+    assert stats[MARKET]["max_queued"] == 10 and stats[ORDER]["max_queued"] == 1
+    assert stats[ORDER]["max_wait_ms"] < stats[MARKET]["max_wait_ms"]
+
+
+def test_share_scales_rates_and_bursts():
+    scheduler = RequestScheduler(LIMITS, rate_limit_ms=20, share=0.25)
+    assert (scheduler.buckets[ORDER].rate, scheduler.buckets[ORDER].burst) == (LIMITS[ORDER][0] / 4, LIMITS[ORDER][1] / 4)
+    assert (scheduler.overall.rate, scheduler.overall.burst) == (12.5, 2.5)
+    tiny = RequestScheduler(LIMITS, rate_limit_ms=20, share=0.01)
+    assert tiny.overall.burst == 1 and all(bucket.burst == 1 for bucket in tiny.buckets.values())
@@ -0,0 +1,89 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import os
+import pickle
+import time
+import numpy as np
+import backtest
+from backtest import Backtester, cached_backtest
+from bot import StrategyParams
+from result_cache import ResultCache, candle_digest
+from sweep import grid, run_sweep
+from test_indicators import random_history
+
+
+def test_hits_only_identical_code_config_and_candles(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    df = random_history(500, 1)
+    digest = candle_digest(df)
+    cache.put("sweep", {"a": 1}, digest, "value")
+    assert cache.get("sweep", {"a": 1}, digest) == "value"
+    assert cache.get("sweep", {"a": 2}, digest) is None
+    assert cache.get("vectorised", {"a": 1}, digest) is None
+    changed = df.copy()
+    changed.loc[100, "close"] += 0.01
+    assert cache.get("sweep", {"a": 1}, candle_digest(changed)) is None
+    assert cache.stats() == {"hits": 1, "misses": 3}
+
+
+def test_event_backtest_resumes_from_a_cached_prefix(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    df = random_history(4000, 2)
+    params = StrategyParams(max_drawdown=None)
+    first = cached_backtest(df.iloc[:2500], params, cache=cache)
+    assert len(first.equity) == 2500
+    full = Backtester(params).run(df)
+
+    resumed_from = []
+    run = Backtester.run
+    monkeypatch.setattr(backtest.Backtester, "run", lambda self, candles, path=None: resumed_from.append(self.last_ts) or run(self, candles, path))
+    extended = cached_backtest(df, params, cache=cache)
+    assert resumed_from == [int(df["ts"][2499])]
+    np.testing.assert_array_equal(extended.equity, full.equity)
+    assert extended.trades == full.trades
+
+    # identical rerun: nothing simulated
+    again = cached_backtest(df, params, cache=cache)
+    assert resumed_from == [int(df["ts"][2499])]
+    np.testing.assert_array_equal(again.equity, full.equity)
+
+    # a rewritten candle inside the cached prefix forces a fresh run
+    edited = df.copy()
+    edited.loc[10, "high"] += 1.0
+    cached_backtest(edited, params, cache=cache)
+    assert resumed_from[-1] is None
+
+
+def test_vectorised_and_sweep_results_are_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    df = random_history(2000, 3)
+    result = cached_backtest(df, vectorised=True, cache=cache)
+    assert cached_backtest(df, vectorised=True, cache=cache).trades == result.trades
+    assert cache.hits == 1
+
+    configs = grid({"stop_atr": [1.0, 2.0], "target_atr": [1.0, 2.0]})
+    rows = run_sweep(df, configs, workers=1, cache=cache)
+    again = run_sweep(df, configs, workers=1, cache=cache)
+    assert again == rows
+    assert cache.hits == 1 + len(configs)
+
+
+def test_unpickled_backtester_keeps_its_orders():
+    bt = Backtester(StrategyParams(max_drawdown=None))
+    bt.run(random_history(2000, 4))
+    copy = pickle.loads(pickle.dumps(bt))
+    count = "SELECT COUNT(*) FROM orders"
+    assert copy.db.cur.execute(count).fetchone() == bt.db.cur.execute(count).fetchone() == (len(bt.trades),)
+
+
+def test_evict_by_age_then_size(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10_000, max_age=3600)
+    now = time.time()
+    for i in range(6):
+        cache.put("sweep", {"i": i}, (1, "x"), b"\0" * 3000)
+    paths = sorted(tmp_path.glob("*/*/*.pkl"))
+    for age, path in zip((7200, 50, 40, 30, 20, 10), paths):
+        os.utime(path, (now - age, now - age))
+    assert cache.evict() == 3  # one expired, then two oldest to get under 10 kB
+    remaining = {p for p in tmp_path.glob("*/*/*.pkl")}
+    assert remaining == set(paths[3:])
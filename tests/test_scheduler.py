@@ -0,0 +1,56 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from scheduler import CandleScheduler
+
+TF = 900_000
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeExchange:
+    def __init__(self, server_ms):
+        self.server_ms = server_ms
+
+    def fetch_time(self):
+        return self.server_ms
+
+
+def test_wakes_at_candle_close_on_exchange_clock():
+    clock = FakeClock(10 * TF / 1000 + 100.0)  # 100 s into a candle
+    scheduler = CandleScheduler(TF, settle=2.0, clock=clock, sleep=clock.sleep)
+    scheduler.sync_clock(FakeExchange(int(clock.now * 1000) + 3_000))  # exchange 3 s ahead
+    assert scheduler.offset_ms == 3_000
+    assert scheduler.last_close() == 10 * TF
+    close_ts = scheduler.wait_for_close()
+    assert close_ts == 11 * TF
+    # 900 - 100 - 3 s until the exchange's close, then the settle delay
+    assert clock.slept == [799.0]
+    assert scheduler.latency_ms(close_ts) == 2_000
+
+
+def test_poll_until_ready_or_timeout():
+    clock = FakeClock(0.0)
+    scheduler = CandleScheduler(TF, poll_interval=1.0, poll_timeout=5.0, clock=clock, sleep=clock.sleep)
+    results = iter(range(100))
+    assert scheduler.poll(lambda: next(results), lambda r: r >= 3) == (3, True)
+    assert clock.slept == [1.0, 1.0, 1.0]
+    clock.slept.clear()
+    assert scheduler.poll(lambda: 0, lambda r: False) == (0, False)
+    assert sum(clock.slept) == 5.0
+
+
+def test_retry_delay_backs_off_until_next_close():
+    clock = FakeClock(TF / 1000 - 30.0)  # 30 s before a close
+    scheduler = CandleScheduler(TF, settle=2.0, clock=clock, sleep=clock.sleep)
+    assert [scheduler.retry_delay(n) for n in (1, 2, 3, 4)] == [5.0, 10.0, 20.0, 32.0]
@@ -0,0 +1,100 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import itertools
+import queue
+
+import pytest
+from bot import Database, Order
+import sharded_bot
+from sharded_bot import ShardDatabase, write_batches
+
+M15 = 900_000
+
+
+def make_bars(n, start=100.0):
+    return [[i * M15, start + i, start + 1 + i, start - 1 + i, start + i, 1.0] for i in range(n)]
+
+
+def source_db(tmp_path):
+    path = str(tmp_path / "shared.db")
+    db = Database(path)
+    db.store_candles(make_bars(50))
+    db.record_order(Order(None, 0, "buy", 100.0, 1.0, 95.0, 105.0, "open"))
+    db.market("ETH/USDC", "15m").store_candles(make_bars(10, 2000.0))
+    db.con.close()
+    return path
+
+
+def test_shard_is_seeded_and_sends_one_message_per_transaction(tmp_path):
+    path = source_db(tmp_path)
+    writes = queue.Queue()
+    shard = ShardDatabase(writes, path, itertools.count(7, 4), window_bars=20)
+    eth = shard.market("ETH/USDC", "15m")
+    assert shard.max_ts() == 49 * M15 and len(shard.window) == 20
+    assert shard.last_open_order().id == 1 and eth.last_open_order() is None
+
+    with shard.transaction():
+        shard.store_candles(make_bars(51)[50:])
+        shard.close_order(1, 50 * M15)
+        eth.record_order(Order(None, 9 * M15, "sell", 2009.0, 1.0, 2019.0, 1999.0, "open"))
+        eth.record_order(Order(None, 9 * M15, "sell", 2009.0, 1.0, 2019.0, 1999.0, "open"))
+        eth.log_tick(9 * M15, "down", "sell", 0.0, 1000.0)
+        assert writes.empty()
+    message = writes.get_nowait()
+    assert [(method, pair) for method, pair, _, _ in message] == [
+        ("store_candles", "BTC/USDC"),
+        ("close_order", "BTC/USDC"),
+        ("record_order", "ETH/USDC"),
+        ("record_order", "ETH/USDC"),
+        ("log_tick", "ETH/USDC"),
+    ]
+    # ids stride so that shards never collide
+    assert [args[0].id for method, _, _, args in message if method == "record_order"] == [7, 11]
+    assert shard.last_open_order() is None and eth.last_open_order().id == 11
+
+    with pytest.raises(RuntimeError):
+        with shard.transaction():
+            shard.log_tick(50 * M15, "up", "hold", 0.0, 1000.0)
+            raise RuntimeError("tick failed")
+    shard.log_tick(50 * M15, "up", "hold", 0.0, 1000.0)
+    assert len(writes.get_nowait()) == 1 and writes.empty()
+    # the shard never writes the shared database itself
+    assert Database(path).max_ts() == 49 * M15
+
+
+def test_writer_applies_batches_in_few_transactions(tmp_path):
+    path = source_db(tmp_path)
+    writes = queue.Queue()
+    shards = [ShardDatabase(writes, path, itertools.count(2 + i, 2), pair=pair) for i, pair in enumerate(("BTC/USDC", "ETH/USDC"))]
+    for ts in range(50, 60):
+        for shard in shards:
+            with shard.transaction():
+                shard.store_candles([[ts * M15, 1.0, 2.0, 0.5, 1.5, 1.0]])
+                shard.log_tick(ts * M15, "up", "hold", 0.0, 1000.0)
+    shards[1].record_order(Order(None, 59 * M15, "buy", 1.5, 1.0, 1.0, 2.0, "open"))
+    writes.put(None)
+
+    db = Database(path)
+    stats = write_batches(db, writes, batch=8, flush_ms=0)
+    assert stats == {"messages": 21, "writes": 41, "commits": 3, "max_batch": 8, "quarantined": 0}
+    assert db.max_ts() == 59 * M15 and db.market("ETH/USDC", "15m").max_ts() == 59 * M15
+    assert db.cur.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 20
+    assert db.market("ETH/USDC", "15m").last_open_order().id == 3
+    assert db.last_open_order().id == 1
+
+
+def test_writer_quarantines_a_bad_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_bot, "RETRY_DELAY", 0.0)
+    path = source_db(tmp_path)
+    writes = queue.Queue()
+    tick = lambda ts: [("log_tick", "BTC/USDC", "15m", (ts * M15, "up", "hold", 0.0, 1000.0))]
+    writes.put(tick(50))
+    writes.put([("store_candles", "BTC/USDC", "15m", ([[51 * M15, 1.0]],))])  # a truncated bar
+    writes.put(tick(52))
+    writes.put(None)
+
+    db = Database(path)
+    stats = write_batches(db, writes, flush_ms=0)
+    assert stats["quarantined"] == 1 and stats["writes"] == 2 and stats["messages"] == 3
+    assert [ts for (ts,) in db.cur.execute("SELECT ts FROM logs ORDER BY ts")] == [50 * M15, 52 * M15]
+    assert db.max_ts() == 49 * M15 and not db.con.in_transaction
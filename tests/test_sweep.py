@@ -0,0 +1,55 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import sqlite3
+import numpy as np
+import pytest
+from backtest import Features, vectorised_backtest
+from bot import StrategyParams
+from sweep import SharedCandles, grid, parse_space, random_search, run_sweep, save_results
+from test_indicators import random_history
+
+
+def test_grid_and_random_search():
+    base = StrategyParams(risk_pct=0.02)
+    configs = grid({"lookback": [14, 20], "stop_atr": [0.5, 1.0, 2.0]}, base)
+    assert len(configs) == 6
+    assert {(p.lookback, p.stop_atr) for p in configs} == {(l, s) for l in (14, 20) for s in (0.5, 1.0, 2.0)}
+    assert all(p.risk_pct == 0.02 and p.atr_factor == base.atr_factor for p in configs)
+
+    space = parse_space(["lookback=10:30", "target_atr=0.5:3", "entry_band=0.05,0.1"], ranges=True)
+    sampled = random_search(space, 200, seed=1)
+    assert all(10 <= p.lookback <= 30 and isinstance(p.lookback, int) for p in sampled)
+    assert all(0.5 <= p.target_atr <= 3 for p in sampled)
+    assert {p.entry_band for p in sampled} == {0.05, 0.1}
+    with pytest.raises(ValueError):
+        parse_space(["lookback=10:30"], ranges=False)
+    with pytest.raises(ValueError):
+        parse_space(["nonsense=1"], ranges=False)
+
+
+def test_shared_candles_round_trip():
+    df = random_history(500, 3)
+    with SharedCandles(df) as shared:
+        shm, columns = SharedCandles.attach(shared.spec)
+        np.testing.assert_array_equal(columns["ts"], df["ts"].to_numpy())
+        np.testing.assert_array_equal(columns["close"], df["close"].to_numpy())
+        del columns
+        shm.close()
+
+
+def test_sweep_matches_serial_backtests_and_is_ranked(tmp_path):
+    df = random_history(3000, 4)
+    configs = grid({"lookback": [14, 20], "atr_factor": [1.01, 1.2], "stop_atr": [1.0, 2.0]})
+    rows = run_sweep(df, configs, workers=2)
+    assert [r["pnl"] for r in rows] == sorted((r["pnl"] for r in rows), reverse=True)
+    for row in rows:
+        params = StrategyParams.from_dict({k: row[k] for k in ("lookback", "atr_factor", "stop_atr")})
+        expected = vectorised_backtest(Features.from_candles(df, params), params).summary()
+        assert (row["trades"], row["pnl"], row["drawdown"]) == (expected["trades"], expected["pnl"], expected["max_drawdown"])
+
+    db_file = str(tmp_path / "sweeps.db")
+    sweep_id = save_results(rows, db_file)
+    stored = sqlite3.connect(db_file).execute(
+        "SELECT rank, lookback, pnl FROM sweep_results WHERE sweep_id=? ORDER BY rank", (sweep_id,)
+    ).fetchall()
+    assert stored == [(i, r["lookback"], r["pnl"]) for i, r in enumerate(rows, 1)]
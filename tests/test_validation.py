@@ -0,0 +1,65 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import numpy as np
+import pytest
+from validation import check_candles, to_rows, validate_candles
+
+TF = 60_000
+
+
+def make_bars(n):
+    return [[i * TF, 100.0, 101.0, 99.0, 100.5, 1.0] for i in range(n)]
+
+
+def test_clean_bars_pass_all_policies():
+    bars = make_bars(50)
+    for policy in ("reject", "drop", "ffill", "refetch"):
+        clean, report = check_candles(bars, TF, policy=policy)
+        assert report.ok
+        assert to_rows(clean) == bars
+
+
+def test_report_finds_every_problem():
+    bars = make_bars(20)
+    bars[3][4] = None
+    bars[5] = [bars[4][0], 100.0, 101.0, 99.0, 100.5, 1.0]  # duplicate of bar 4
+    bars[7][3] = 102.0  # low above open/close
+    del bars[10:15]  # five missing bars
+    report = validate_candles(np.array(bars, dtype=float), TF)
+    assert list(report.nulls) == [3]
+    assert list(report.duplicates) == [5]
+    assert list(report.bad_ohlc) == [7]
+    assert report.long_gaps == [(10 * TF, 15 * TF)]
+    assert (5 * TF, 6 * TF) in report.gaps
+    with pytest.raises(ValueError, match="duplicate"):
+        check_candles(bars, TF)
+
+
+def test_small_gaps_and_last_ts():
+    bars = make_bars(10)
+    del bars[4:7]
+    assert check_candles(bars, TF)[1].ok
+    _, report = check_candles(bars, TF, last_ts=-5 * TF, policy="drop")
+    assert report.long_gaps == [(-4 * TF, 0)]
+
+
+def test_repair_policies():
+    bars = make_bars(12)
+    bars[2][1] = None
+    bars[4][2] = 50.0  # high below open/close
+    bars[6] = list(bars[5])
+    del bars[8:11]
+    bars.insert(0, list(bars[3]))  # out of order
+
+    clean, report = check_candles(bars, TF, policy="drop")
+    assert len(report.out_of_order) == 1
+    assert [int(t) for t in clean[:, 0]] == [0, TF, 3 * TF, 5 * TF, 7 * TF, 11 * TF]
+
+    clean, _ = check_candles(bars, TF, policy="ffill")
+    assert [int(t) for t in clean[:, 0]] == [i * TF for i in range(12)]
+    assert clean[2, 1] == 100.5 and clean[4, 2] == 100.5
+    assert (clean[:, 3] <= np.minimum(clean[:, 1], clean[:, 4])).all()
+    assert (clean[8:11, 5] == 0).all()
+
+    _, report = check_candles(bars, TF, max_gap_bars=2, policy="refetch")
+    assert report.refetch == [(2 * TF, 3 * TF), (4 * TF, 5 * TF), (8 * TF, 11 * TF)]
@@ -0,0 +1,52 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import sqlite3
+import numpy as np
+import pytest
+from backtest import Features, vectorised_backtest
+from bot import StrategyParams
+from sweep import grid
+from test_indicators import random_history
+from walkforward import Fold, bars, make_folds, save_results, summarise, walk_forward
+
+
+def test_make_folds():
+    folds = make_folds(100, 40, 20)
+    assert folds == [Fold(0, 0, 40, 60), Fold(1, 20, 60, 80), Fold(2, 40, 80, 100)]
+    assert make_folds(100, 40, 30, step=50) == [Fold(0, 0, 40, 70), Fold(1, 50, 90, 100)]
+    assert make_folds(40, 40, 10) == []
+    assert bars("1D", 900_000) == 96
+    with pytest.raises(ValueError):
+        make_folds(100, 0, 10)
+
+
+def test_features_window_matches_features_of_the_slice():
+    df = random_history(2000, 5)
+    params = StrategyParams()
+    window = Features.from_candles(df).window(700, 1500)
+    direct = Features.from_candles(df.iloc[700:1500])
+    warm = params.lookback + 1
+    for name in ("codes", "atr", "high20", "low20"):
+        np.testing.assert_array_equal(getattr(window, name)[warm:], getattr(direct, name)[warm:])
+
+
+def test_walk_forward_picks_the_in_sample_best(tmp_path):
+    df = random_history(4000, 6)
+    configs = grid({"lookback": [14, 20], "stop_atr": [0.5, 1.0, 2.0], "target_atr": [1.0, 2.0]})
+    rows = walk_forward(df, configs, train_bars=1500, test_bars=500, workers=2)
+    assert [r["fold"] for r in rows] == [0, 1, 2, 3, 4]
+
+    features = {p.lookback: Features.from_candles(df, p) for p in configs}
+    for row, fold in zip(rows, make_folds(len(df), 1500, 500)):
+        scores = [vectorised_backtest(features[p.lookback].window(fold.train_start, fold.train_stop), p).total_pnl for p in configs]
+        best = configs[int(np.argmax(scores))]
+        assert row["in_sample_score"] == pytest.approx(max(scores), abs=1e-6)
+        assert (row["lookback"], row["stop_atr"], row["target_atr"]) == (best.lookback, best.stop_atr, best.target_atr)
+        oos = vectorised_backtest(features[best.lookback].window(fold.train_stop, fold.test_stop), best)
+        assert (row["trades"], row["test_start"], row["test_end"]) == (len(oos.trades), int(df["ts"][fold.train_stop]), int(df["ts"][fold.test_stop - 1]))
+
+    summary = summarise(rows)
+    assert summary["folds"] == 5 and summary["trades"] == sum(r["trades"] for r in rows)
+    run_id = save_results(rows, str(tmp_path / "wf.db"))
+    stored = sqlite3.connect(str(tmp_path / "wf.db")).execute("SELECT COUNT(*) FROM walkforward_results WHERE run_id=?", (run_id,)).fetchone()
+    assert stored == (5,)
@@ -0,0 +1,184 @@
+"""Vectorised candle integrity checks.
+
+Candles arrive as ``[ts, open, high, low, close, volume]`` rows, either a
+handful per live tick or hundreds of thousands from a backfill. Both go
+through :func:`check_candles`, which converts them to a float array once and
+runs every check as a NumPy expression:
+
+* nulls – any missing field
+* order – timestamps that go backwards
+* duplicates – repeated timestamps
+* gaps – missing bars, fatal when longer than ``max_gap_bars``
+* OHLC sanity – ``low <= open, close <= high``
+
+What happens to offending bars depends on the policy:
+
+``reject``   raise ``ValueError`` describing the problems (the historical behaviour)
+``drop``     discard bad bars and keep the rest, sorted and de-duplicated
+``ffill``    repair bad bars from the previous close and fill gaps with flat bars
+``refetch``  like ``drop``, with the affected ranges left in ``report.refetch`` for the caller
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+POLICIES = ("reject", "drop", "ffill", "refetch")
+
+
+@dataclass
+class CandleReport:
+    bars: int
+    nulls: np.ndarray
+    out_of_order: np.ndarray
+    duplicates: np.ndarray
+    bad_ohlc: np.ndarray
+    gaps: List[Tuple[int, int]]
+    max_gap_bars: int
+    timeframe_ms: int
+    refetch: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def long_gaps(self) -> List[Tuple[int, int]]:
+        limit = self.max_gap_bars * self.timeframe_ms
+        return [(start, end) for start, end in self.gaps if end - start > limit]
+
+    @property
+    def ok(self) -> bool:
+        return not (
+            len(self.nulls) or len(self.out_of_order) or len(self.duplicates) or len(self.bad_ohlc) or self.long_gaps
+        )
+
+    def summary(self) -> str:
+        problems = []
+        if len(self.nulls):
+            problems.append(f"{len(self.nulls)} bars with NULL values")
+        if len(self.out_of_order):
+            problems.append(f"{len(self.out_of_order)} out-of-order timestamps")
+        if len(self.duplicates):
+            problems.append(f"{len(self.duplicates)} duplicate timestamps")
+        if len(self.bad_ohlc):
+            problems.append(f"{len(self.bad_ohlc)} bars with inconsistent OHLC")
+        if self.long_gaps:
+            problems.append(f"{len(self.long_gaps)} data gaps greater than {self.max_gap_bars} bars")
+        return "; ".join(problems) or "ok"
+
+
+def to_array(bars: Sequence[Sequence]) -> np.ndarray:
+    """Return ``bars`` as an ``(n, 6)`` float array with NaN for missing values."""
+    if isinstance(bars, np.ndarray):
+        return bars.astype(np.float64, copy=False)
+    if not len(bars):
+        return np.empty((0, 6), dtype=np.float64)
+    # None converts to NaN under a float dtype
+    return np.array(bars, dtype=np.float64)[:, :6]
+
+
+def to_rows(arr: np.ndarray) -> List[list]:
+    """Return an array from :func:`to_array` as rows with integer timestamps."""
+    rows = arr.tolist()
+    for row in rows:
+        row[0] = int(row[0])
+    return rows
+
+
+def validate_candles(arr: np.ndarray, timeframe_ms: int, last_ts: int = 0, max_gap_bars: int = 3) -> CandleReport:
+    """Check ``arr`` (see :func:`to_array`) and report offending row indices.
+
+    ``last_ts`` is the newest stored bar, so a gap between it and the first
+    new bar is reported too. Gaps are ``(first_missing_ts, next_present_ts)``.
+    """
+    ts = arr[:, 0]
+    nulls = np.flatnonzero(np.isnan(arr).any(axis=1))
+    out_of_order = np.flatnonzero(np.diff(ts) < 0) + 1
+
+    order = np.argsort(ts, kind="stable")
+    sorted_ts = ts[order]
+    repeated = np.zeros(len(ts), dtype=bool)
+    repeated[1:] = sorted_ts[1:] == sorted_ts[:-1]
+    duplicates = np.sort(order[repeated])
+
+    o, h, l, c = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]
+    bad_ohlc = np.flatnonzero((l > np.minimum(o, c)) | (h < np.maximum(o, c)))
+
+    present = sorted_ts[~repeated & ~np.isnan(sorted_ts)]
+    if last_ts:
+        present = np.concatenate(([last_ts], present[present > last_ts]))
+    steps = np.diff(present)
+    at = np.flatnonzero(steps > timeframe_ms)
+    gaps = [(int(present[i]) + timeframe_ms, int(present[i + 1])) for i in at]
+
+    return CandleReport(len(arr), nulls, out_of_order, duplicates, bad_ohlc, gaps, max_gap_bars, timeframe_ms)
+
+
+def _forward_fill(arr: np.ndarray, report: CandleReport, timeframe_ms: int) -> np.ndarray:
+    out = arr.copy()
+    prices = out[:, 1:5]
+    missing = np.isnan(prices)
+    # carry the previous close into missing price fields
+    close = out[:, 4].copy()
+    valid = ~np.isnan(close)
+    idx = np.where(valid, np.arange(len(close)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    prev_close = close[idx]
+    prices[missing] = np.broadcast_to(prev_close[:, None], prices.shape)[missing]
+    volume = out[:, 5]
+    volume[np.isnan(volume)] = 0.0
+    out = out[~np.isnan(out).any(axis=1)]
+    # clamp high/low around open/close
+    out[:, 2] = out[:, 1:5].max(axis=1)
+    out[:, 3] = out[:, 1:5].min(axis=1)
+    if report.gaps:
+        filler = []
+        for start, end in report.gaps:
+            before = out[out[:, 0] < start]
+            if not len(before):
+                continue
+            price = before[-1, 4]
+            for ts in range(start, end, timeframe_ms):
+                filler.append([ts, price, price, price, price, 0.0])
+        if filler:
+            out = np.concatenate((out, np.array(filler, dtype=np.float64)))
+            out = out[np.argsort(out[:, 0], kind="stable")]
+    return out
+
+
+def check_candles(
+    bars: Sequence[Sequence],
+    timeframe_ms: int,
+    last_ts: int = 0,
+    policy: str = "reject",
+    max_gap_bars: int = 3,
+) -> Tuple[np.ndarray, CandleReport]:
+    """Validate ``bars`` and return ``(clean_array, report)`` under ``policy``."""
+    if policy not in POLICIES:
+        raise ValueError(f"unknown candle policy {policy!r}")
+    arr = to_array(bars)
+    report = validate_candles(arr, timeframe_ms, last_ts, max_gap_bars)
+    if report.ok:
+        return arr, report
+    if policy == "reject":
+        raise ValueError(report.summary())
+
+    ts = arr[:, 0]
+    keep = ~np.isnan(ts)
+    keep[report.duplicates] = False
+    if policy == "ffill":
+        arr = arr[keep]
+        arr = arr[np.argsort(arr[:, 0], kind="stable")]
+        report.gaps = validate_candles(arr, timeframe_ms, last_ts, max_gap_bars).gaps
+        return _forward_fill(arr, report, timeframe_ms), report
+
+    keep[report.nulls] = False
+    keep[report.bad_ohlc] = False
+    clean = arr[keep]
+    clean = clean[np.argsort(clean[:, 0], kind="stable")]
+    if policy == "refetch":
+        bad_ts = ts[np.concatenate((report.nulls, report.bad_ohlc))]
+        bad_ts = bad_ts[~np.isnan(bad_ts)].astype(np.int64)
+        ranges = [(int(t), int(t) + timeframe_ms) for t in np.unique(bad_ts)]
+        report.refetch = sorted(ranges + report.long_gaps)
+    return clean, report
@@ -0,0 +1,251 @@
+"""Walk-forward optimisation of the strategy parameters.
+
+The history is cut into folds: an in-sample window on which every candidate
+configuration is backtested and the best one (by ``--rank-by``) chosen,
+followed by the out-of-sample window on which that choice is then traded.
+Windows roll forward by ``--step`` (default: the out-of-sample length).
+
+Folds run in parallel on a process pool sharing the candles through
+:class:`sweep.SharedCandles`. Regimes, ATR and breakout levels are causal, so
+each worker builds them once over the whole history per regime setting and
+every fold slices them with :meth:`backtest.Features.window`; nothing is
+recomputed between folds, and out-of-sample windows start with warmed-up
+indicators rather than ``lookback`` bars of chaos.
+
+Usage::
+
+    $ python walkforward.py --train 180D --test 30D --grid lookback=14,20,30 stop_atr=0.5,1,2
+    $ python walkforward.py --archive archive/ --random 300 --grid target_atr=0.5:3 --rank-by pnl_per_drawdown
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import sweep
+from backtest import CAPITAL, load_candles, vectorised_backtest
+from bot import DB_FILE, DEFAULT_PARAMS, PAIR, TIMEFRAME, TIMEFRAME_MS, StrategyParams, exchange, parse_date
+from fills import FillModel
+from indicators import RunningATR
+from sweep import (
+    INTEGER_COLUMNS,
+    METRIC_COLUMNS,
+    PARAM_COLUMNS,
+    RANKINGS,
+    RESULTS_DB,
+    SharedCandles,
+    grid,
+    parse_space,
+    random_search,
+    result_row,
+)
+
+FOLD_COLUMNS = ("train_start", "train_end", "test_start", "test_end", "in_sample_score")
+
+RESULTS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS walkforward_results (
+    run_id TEXT NOT NULL,
+    fold INTEGER NOT NULL,
+    {", ".join(f"{name} {'REAL' if name == 'in_sample_score' else 'INTEGER'}" for name in FOLD_COLUMNS)},
+    {", ".join(f"{name} {'INTEGER' if name in INTEGER_COLUMNS else 'REAL'}" for name in PARAM_COLUMNS + METRIC_COLUMNS)},
+    PRIMARY KEY (run_id, fold)
+) WITHOUT ROWID
+"""
+
+
+@dataclass(frozen=True)
+class Fold:
+    """Bar index ranges ``[train_start, train_stop)`` and ``[train_stop, test_stop)``."""
+
+    index: int
+    train_start: int
+    train_stop: int
+    test_stop: int
+
+
+def make_folds(n: int, train_bars: int, test_bars: int, step: Optional[int] = None) -> List[Fold]:
+    """Rolling folds over ``n`` bars; the last out-of-sample window may be short."""
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("train and test windows must be positive")
+    step = step or test_bars
+    folds = []
+    start = 0
+    while start + train_bars < n:
+        folds.append(Fold(len(folds), start, start + train_bars, min(start + train_bars + test_bars, n)))
+        start += step
+    return folds
+
+
+_configs: List[StrategyParams] = []
+_rank_by = "pnl"
+
+
+def _init_worker(
+    spec: tuple,
+    configs: List[StrategyParams],
+    rank_by: str,
+    atr_method: str,
+    capital: float,
+    fills: Optional[FillModel] = None,
+) -> None:
+    global _configs, _rank_by
+    # every fold visits every regime setting, so keep all of them
+    regimes = len({(p.lookback, p.atr_factor) for p in configs})
+    sweep._init_worker(spec, atr_method, capital, cache_size=regimes, fills=fills)
+    _configs, _rank_by = configs, rank_by
+
+
+def _run_fold(fold: Fold) -> dict:
+    rank = RANKINGS[_rank_by]
+    best, best_score = None, -math.inf
+    for params in _configs:
+        train = sweep._features_for(params).window(fold.train_start, fold.train_stop)
+        score = rank(result_row(params, vectorised_backtest(train, params, sweep._capital, sweep._fills).summary()))
+        if score > best_score:
+            best, best_score = params, score
+    features = sweep._features_for(best)
+    test = features.window(fold.train_stop, fold.test_stop)
+    row = result_row(best, vectorised_backtest(test, best, sweep._capital, sweep._fills).summary())
+    ts = features.ts
+    return {
+        "fold": fold.index,
+        "train_start": int(ts[fold.train_start]),
+        "train_end": int(ts[fold.train_stop - 1]),
+        "test_start": int(ts[fold.train_stop]),
+        "test_end": int(ts[fold.test_stop - 1]),
+        "in_sample_score": float(best_score),
+        **row,
+    }
+
+
+def walk_forward(
+    candles,
+    configs: Sequence[StrategyParams],
+    train_bars: int,
+    test_bars: int,
+    step: Optional[int] = None,
+    workers: Optional[int] = None,
+    rank_by: str = "pnl",
+    atr_method: str = "simple",
+    capital: float = CAPITAL,
+    fills: Optional[FillModel] = None,
+) -> List[dict]:
+    """Optimise on each in-sample window and trade the winner out of sample.
+
+    Returns one row per fold, in order: the window bounds (candle
+    timestamps), the chosen parameters, their in-sample score and their
+    out-of-sample metrics.
+    """
+    folds = make_folds(len(candles["ts"]), train_bars, test_bars, step)
+    if not folds:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(folds))
+    ordered = sorted(configs, key=lambda p: (p.lookback, p.atr_factor))
+    with SharedCandles(candles) as shared:
+        initargs = (shared.spec, ordered, rank_by, atr_method, capital, fills)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            return list(pool.map(_run_fold, folds))
+
+
+def summarise(rows: List[dict], capital: float = CAPITAL) -> dict:
+    """Out-of-sample totals; ``oos_return`` compounds the fold returns."""
+    returns = np.array([row["final_equity"] / capital - 1 if row["final_equity"] is not None else 0.0 for row in rows])
+    return {
+        "folds": len(rows),
+        "trades": int(sum(row["trades"] for row in rows)),
+        "oos_pnl": round(float(sum(row["pnl"] for row in rows)), 6),
+        "oos_return": round(float(np.prod(1 + returns) - 1), 6),
+        "profitable_folds": int(sum(row["pnl"] > 0 for row in rows)),
+        "worst_drawdown": round(max((row["drawdown"] for row in rows), default=0.0), 6),
+    }
+
+
+def save_results(rows: List[dict], db_file: str = RESULTS_DB, run_id: Optional[str] = None) -> str:
+    """Store the fold rows under a new run id and return it."""
+    run_id = run_id or time.strftime("%Y%m%dT%H%M%S-") + uuid.uuid4().hex[:6]
+    names = FOLD_COLUMNS + PARAM_COLUMNS + METRIC_COLUMNS
+    con = sqlite3.connect(db_file)
+    with con:
+        con.execute(RESULTS_SCHEMA)
+        con.executemany(
+            f"INSERT INTO walkforward_results (run_id, fold, {', '.join(names)}) VALUES ({', '.join('?' * (len(names) + 2))})",
+            [(run_id, row["fold"], *(row[name] for name in names)) for row in rows],
+        )
+    con.close()
+    return run_id
+
+
+def bars(duration: str, timeframe_ms: int = TIMEFRAME_MS) -> int:
+    """Number of candles in a pandas duration such as ``90D`` or ``12W``."""
+    return int(pd.Timedelta(duration).total_seconds() * 1000 // timeframe_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward optimisation with the vectorised backtest")
+    parser.add_argument("--train", default="180D", help="in-sample window, e.g. 180D")
+    parser.add_argument("--test", default="30D", help="out-of-sample window, e.g. 30D")
+    parser.add_argument("--step", help="roll-forward step (default: --test)")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=VALUES", help="values per parameter: v1,v2,... or low:high with --random")
+    parser.add_argument("--random", type=int, metavar="N", help="sample N configurations instead of the full grid")
+    parser.add_argument("--seed", type=int, help="random search seed")
+    parser.add_argument("--params", metavar="FILE", help="base parameters as a JSON object")
+    parser.add_argument("--rank-by", choices=RANKINGS, default="pnl", help="in-sample objective")
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--out", default=RESULTS_DB, help="SQLite file for the fold results")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database holding candles")
+    parser.add_argument("--archive", metavar="DIR", help="read candles from a Parquet archive instead")
+    parser.add_argument("--pair", default=PAIR)
+    parser.add_argument("--timeframe", default=TIMEFRAME)
+    parser.add_argument("--since", help="first candle, ISO date")
+    parser.add_argument("--until", help="end of the range, ISO date")
+    parser.add_argument("--capital", type=float, default=CAPITAL, help="starting USDC balance per fold")
+    parser.add_argument("--atr", choices=RunningATR.METHODS, default="simple", help="ATR smoothing")
+    parser.add_argument("--fills", metavar="FILE", help="fees and slippage as a JSON object (default: free fills at the close)")
+    parser.add_argument("--loglevel", default="WARNING", help="logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.loglevel.upper(), logging.WARNING), format="%(asctime)s %(levelname)s %(message)s")
+
+    base = StrategyParams.load(args.params) if args.params else DEFAULT_PARAMS
+    space = parse_space(args.grid, ranges=args.random is not None)
+    configs = random_search(space, args.random, args.seed, base) if args.random else grid(space, base)
+    candles = load_candles(
+        args.db,
+        args.archive,
+        args.pair,
+        args.timeframe,
+        parse_date(args.since) if args.since else None,
+        parse_date(args.until) if args.until else None,
+    )
+    timeframe_ms = exchange.parse_timeframe(args.timeframe) * 1000
+    started = time.perf_counter()
+    rows = walk_forward(
+        candles,
+        configs,
+        bars(args.train, timeframe_ms),
+        bars(args.test, timeframe_ms),
+        bars(args.step, timeframe_ms) if args.step else None,
+        args.workers,
+        args.rank_by,
+        args.atr,
+        args.capital,
+        FillModel.load(args.fills) if args.fills else None,
+    )
+    seconds = time.perf_counter() - started
+    run_id = save_results(rows, args.out)
+    for row in rows:
+        print(json.dumps(row))
+    print(json.dumps({"run_id": run_id, "configs": len(configs), "seconds": round(seconds, 3), **summarise(rows, args.capital)}))